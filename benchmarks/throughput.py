@@ -0,0 +1,192 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from tests._util import MockKafkaConsumer, FakeInfluxDB
+import ew
+import ew_lib
+import influxdb
+import argparse
+import datetime
+import resource
+import tracemalloc
+import logging
+import random
+import time
+
+time_formats = (None, "%Y-%m-%dT%H:%M:%S.%fZ", "%d.%m.%Y %H:%M:%S")
+cast_choices = (None, ":integer", ":number", ":string", "string:boolean")
+
+logger = logging.getLogger("ew-benchmark")
+logger.disabled = True
+
+
+class BenchKafkaConsumer(MockKafkaConsumer):
+    def store_offsets(self, offsets):
+        pass
+
+
+def gen_exports(num_exports, num_databases, max_fields, rng):
+    exports = list()
+    for i in range(num_exports):
+        exports.append(
+            {
+                "id": f"export-{i}",
+                "db_name": f"db_{i % num_databases}",
+                "casts": [rng.choice(cast_choices) for _ in range(rng.randint(1, max_fields))],
+                "time_format": rng.choice(time_formats)
+            }
+        )
+    return exports
+
+
+def gen_filters(exports):
+    filters = list()
+    for i, export in enumerate(exports):
+        mappings = {"device_id:extra": "device_id", "time:extra": "timestamp"}
+        args = {"db_name": export["db_name"], "time_key": "time"}
+        type_casts = dict()
+        for j, cast in enumerate(export["casts"]):
+            mappings[f"f{j}:data"] = f"v{j}"
+            if cast:
+                type_casts[f"f{j}"] = cast
+        if type_casts:
+            args["type_casts"] = type_casts
+        if export["time_format"]:
+            args["time_format"] = export["time_format"]
+        filters.append(
+            {
+                "method": "put",
+                "payload": {
+                    "source": "bench",
+                    "identifiers": [{"key": "device_id", "value": f"device-{i}"}],
+                    "mappings": mappings,
+                    "id": export["id"],
+                    "args": args
+                },
+                "timestamp": int(time.time())
+            }
+        )
+    return filters
+
+
+def gen_value(cast, rng):
+    if cast == ":integer":
+        return str(rng.randint(0, 10000))
+    if cast == "string:boolean":
+        return rng.choice(("true", "false"))
+    if cast == ":string":
+        return rng.randint(0, 10000)
+    return rng.random() * 100
+
+
+def gen_messages(exports, num_messages, rng):
+    start = datetime.datetime(2022, 1, 1)
+    messages = list()
+    for n in range(num_messages):
+        i = rng.randrange(len(exports))
+        export = exports[i]
+        timestamp = start + datetime.timedelta(seconds=n, microseconds=rng.randint(0, 999999))
+        message = {"device_id": f"device-{i}", "timestamp": timestamp.strftime(export["time_format"]) if export["time_format"] else f"{timestamp.isoformat()}Z"}
+        for j, cast in enumerate(export["casts"]):
+            message[f"v{j}"] = gen_value(cast, rng)
+        messages.append(message)
+    return messages
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    exports = gen_exports(num_exports=args.exports, num_databases=args.databases, max_fields=args.fields, rng=rng)
+    filter_consumer = MockKafkaConsumer(data=gen_filters(exports), sources=False)
+    point_builders = ew.PointBuilders()
+    filter_client = ew_lib.FilterClient(kafka_consumer=filter_consumer, filter_topic="filter", validator=point_builders.validate_filter, logger=logger)
+    data_consumer = BenchKafkaConsumer(data={"bench": gen_messages(exports=exports, num_messages=args.messages, rng=rng)})
+    offset_tracker = ew.OffsetTracker(kafka_consumer=data_consumer)
+    data_client = ew_lib.DataClient(kafka_consumer=offset_tracker, filter_client=filter_client, handle_offsets=False, logger=logger)
+    fake_influxdb = FakeInfluxDB()
+    fake_influxdb.start()
+    influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port)
+    writer_pool = ew.WriterPool(influxdb_clients=[influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port) for _ in range(args.writers)]) if args.writers > 1 else None
+    export_worker = ew.ExportWorker(
+        influxdb_client=influxdb_client,
+        data_client=data_client,
+        filter_client=filter_client,
+        get_data_timeout=1.0,
+        get_data_limit=args.limit,
+        offset_tracker=offset_tracker,
+        writer_pool=writer_pool,
+        point_builders=point_builders,
+        gzip_level=args.gzip_level
+    )
+    filter_client.start()
+    while not filter_consumer.empty():
+        time.sleep(0.1)
+    filter_client.stop()
+    filter_client.join()
+    latencies = list()
+    gen_peaks = list()
+    write_peaks = list()
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    while not data_consumer.empty():
+        batch_start = time.perf_counter()
+        exports_batch, offsets = export_worker._get_exports_batch()
+        if exports_batch:
+            if args.trace_memory:
+                tracemalloc.reset_peak()
+            points_batch = export_worker._gen_points_batch(exports_batch=exports_batch)
+            exports_batch = None
+            if args.trace_memory:
+                gen_peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            export_worker._write_points_batch(points_batch=points_batch)
+            if args.trace_memory:
+                write_peaks.append(tracemalloc.get_traced_memory()[1])
+            points_batch = None
+        export_worker._store_offsets(offsets=offsets)
+        latencies.append(time.perf_counter() - batch_start)
+    total = time.perf_counter() - start
+    if args.trace_memory:
+        tracemalloc.stop()
+    points = fake_influxdb.points
+    print(f"exports={args.exports} databases={args.databases} fields<={args.fields} messages={offset_tracker.consumed} limit={args.limit} writers={args.writers} gzip_level={args.gzip_level}")
+    print(f"time={total:.2f}s msgs/s={offset_tracker.consumed / total:.0f} points/s={points / total:.0f} requests={fake_influxdb.requests} request_bytes={fake_influxdb.bytes}")
+    print(f"batches={len(latencies)} latency_p50={percentile(latencies, 0.5) * 1000:.1f}ms latency_p99={percentile(latencies, 0.99) * 1000:.1f}ms peak_rss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MiB")
+    if args.trace_memory:
+        print(f"traced_peak_gen={max(gen_peaks, default=0) / 2 ** 20:.1f}MiB traced_peak_write={max(write_peaks, default=0) / 2 ** 20:.1f}MiB (tracing slows the run down, compare timings without --trace-memory)")
+    if writer_pool:
+        writer_pool.close()
+    influxdb_client.close()
+    fake_influxdb.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline export worker throughput benchmark.")
+    parser.add_argument("--exports", type=int, default=1000)
+    parser.add_argument("--databases", type=int, default=10)
+    parser.add_argument("--fields", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--gzip-level", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="report traced allocation peaks of the gen and write stages")
+    run(parser.parse_args())
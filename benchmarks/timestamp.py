@@ -0,0 +1,61 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import ew.util
+import influxdb.line_protocol
+import datetime
+import random
+import time
+import sys
+
+formats = (
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%A, %d-%b-%y %H:%M:%S UTC",
+    "%d.%m.%Y %H:%M:%S"
+)
+
+
+def gen_timestamps(fmt, num):
+    start = datetime.datetime(2020, 1, 1)
+    return [(start + datetime.timedelta(seconds=random.randint(0, 10 ** 8), microseconds=random.randint(0, 999999))).strftime(fmt) for _ in range(num)]
+
+
+def old_convert_timestamp(timestamp, fmt, precision):
+    time_obj = datetime.datetime.strptime(timestamp, fmt)
+    return int(influxdb.line_protocol._convert_timestamp(f"{time_obj.isoformat()}Z", precision))
+
+
+def new_convert_timestamp(timestamp, fmt, precision):
+    return ew.util.convert_timestamp(timestamp=timestamp, fmt=fmt, precision=precision)
+
+
+def measure(func, timestamps, fmt, precision):
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        func(timestamp, fmt, precision)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    random.seed(0)
+    for fmt in formats:
+        timestamps = gen_timestamps(fmt, num)
+        for timestamp in timestamps[:1000]:
+            assert old_convert_timestamp(timestamp, fmt, "ms") == new_convert_timestamp(timestamp, fmt, "ms")
+        old = measure(old_convert_timestamp, timestamps, fmt, "ms")
+        new = measure(new_convert_timestamp, timestamps, fmt, "ms")
+        print(f"{fmt!r}: timestamps={num} old={old:.2f}s ({num / old:.0f}/s) new={new:.2f}s ({num / new:.0f}/s) speedup={old / new:.1f}x")
@@ -15,4 +15,20 @@
 """
 
 from .worker import *
+from .offsets import *
+from .writer import *
+from .builder import PointBuilders
+from .filters import *
+from .dead_letter import *
+from .metrics import ExportMetrics
+from .batching import *
+from .buffer import *
+from .snapshot import *
+from .spool import *
+from .retry import *
+from .databases import *
+from .aio import *
+from .profiling import *
+from .cache import *
+from .aggregation import WindowAggregator, WindowState
 from .util import validate_filter
@@ -0,0 +1,284 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("WindowAggregator", "WindowState", "Aggregation", "compile_aggregation")
+
+from .util import *
+from .model import *
+import util
+import threading
+import typing
+import json
+import time
+import os
+
+
+class Aggregation(typing.NamedTuple):
+    window: int
+    window_seconds: float
+    delay: int
+    delay_seconds: float
+    functions: typing.Tuple[str, ...]
+    time_key: typing.Optional[str]
+    casts: typing.Optional[typing.Dict]
+    convert: typing.Callable[[typing.Any], int]
+    build_batch: typing.Callable[..., typing.List[typing.Union[bytes, Exception]]]
+
+
+def compile_aggregation(export_id: str, export_args: typing.Dict) -> Aggregation:
+    aggregation = export_args[ExportArgs.aggregation]
+    cast_map = export_args.get(ExportArgs.type_casts)
+    time_key = export_args.get(ExportArgs.time_key)
+    time_precision = export_args.get(ExportArgs.time_precision)
+    return Aggregation(
+        window=max(int(aggregation[AggregationArgs.window] * 10 ** 9) // precision_divisors[time_precision], 1),
+        window_seconds=aggregation[AggregationArgs.window],
+        delay=int(aggregation.get(AggregationArgs.delay, 0) * 10 ** 9) // precision_divisors[time_precision],
+        delay_seconds=aggregation.get(AggregationArgs.delay, 0),
+        functions=tuple(aggregation.get(AggregationArgs.functions) or ("mean", )),
+        time_key=time_key,
+        casts={key: type_casts[val] for key, val in cast_map.items()} if cast_map else None,
+        convert=compile_time_converter(time_format=export_args.get(ExportArgs.time_format), time_precision=time_precision),
+        build_batch=compile_batch_point_builder(export_id=export_id, cast_map=cast_map, time_key=time_key or "time", time_precision=time_precision)
+    )
+
+
+def is_numeric(val) -> bool:
+    return isinstance(val, (int, float)) and not isinstance(val, bool)
+
+
+class Window:
+    __slots__ = ("seq", "updated", "series")
+
+    def __init__(self, seq: int, updated: float):
+        self.seq = seq
+        self.updated = updated
+        self.series: typing.Dict[typing.FrozenSet, typing.Dict[str, typing.List]] = dict()
+
+
+class WindowState:
+    __log_msg_prefix = "window state"
+    __log_err_msg_prefix = f"{__log_msg_prefix} error"
+
+    def __init__(self, path: str):
+        self.__path = path
+        self.__sources: typing.Dict[int, typing.Dict[str, int]] = dict()
+        self.__saved: typing.Dict[str, int] = dict()
+        self.__lock = threading.Lock()
+
+    def load(self) -> typing.Dict[str, int]:
+        if not os.path.exists(self.__path):
+            return dict()
+        try:
+            with open(self.__path, "r") as file:
+                markers = json.load(file)
+            util.logger.info(f"{WindowState.__log_msg_prefix}: loaded '{self.__path}': exports={len(markers)}")
+            return markers
+        except Exception as ex:
+            util.logger.error(f"{WindowState.__log_err_msg_prefix}: loading '{self.__path}' failed: reason={get_exception_str(ex)}")
+            return dict()
+
+    def save(self, source: int, markers: typing.Dict[str, int]):
+        with self.__lock:
+            self.__sources[source] = markers
+            # partition lanes close windows independently, the earliest marker never drops rows of a window that is still open elsewhere
+            merged = dict()
+            for source_markers in self.__sources.values():
+                for export_id, closed in source_markers.items():
+                    if export_id not in merged or closed < merged[export_id]:
+                        merged[export_id] = closed
+            if merged == self.__saved:
+                return
+            try:
+                tmp_path = f"{self.__path}.tmp"
+                with open(tmp_path, "w") as file:
+                    json.dump(merged, file, separators=(',', ':'))
+                os.replace(tmp_path, self.__path)
+                self.__saved = merged
+            except Exception as ex:
+                util.logger.error(f"{WindowState.__log_err_msg_prefix}: writing '{self.__path}' failed: reason={get_exception_str(ex)}")
+
+
+class WindowAggregator:
+    def __init__(self, retention: float = 600.0, state: typing.Optional[WindowState] = None, source: int = 0):
+        self.__retention = retention
+        self.__state = state
+        self.__source = source
+        self.__windows: typing.Dict[str, typing.Dict[int, Window]] = dict()
+        self.__builders = dict()
+        self.__watermarks: typing.Dict[str, int] = dict()
+        # rows before the closed marker are dropped and counted as late, markers are persisted once the offsets of their
+        # windows are stored so replayed rows never overwrite a complete aggregate, without a state they only live in memory
+        self.__closed: typing.Dict[str, int] = state.load() if state else dict()
+        self.__updated: typing.Dict[str, float] = dict.fromkeys(self.__closed, time.monotonic())
+        self.__releases: typing.List[typing.Tuple[typing.Dict[typing.Tuple[str, int], int], typing.Dict[str, int]]] = list()
+        self.__stored: typing.Dict[typing.Tuple[str, int], int] = dict()
+        self.__next_eviction = 0.0
+        self.__offsets = list()
+        self.__seq = 0
+        self.__late = 0
+        self.__lock = threading.Lock()
+
+    def add(self, export_id: str, builder, rows: typing.List[typing.Tuple[typing.Dict, typing.Dict]]) -> typing.List[typing.Optional[Exception]]:
+        aggregation: Aggregation = builder.aggregation
+        casts = aggregation.casts
+        time_key = aggregation.time_key
+        errors = [None] * len(rows)
+        now = time.monotonic()
+        timestamp = None if time_key else time.time_ns() // precision_divisors[builder.time_precision]
+        with self.__lock:
+            self.__builders[export_id] = builder
+            self.__updated[export_id] = now
+            if export_id not in self.__windows:
+                self.__windows[export_id] = dict()
+            windows = self.__windows[export_id]
+            closed = self.__closed.get(export_id)
+            watermark = self.__watermarks.get(export_id)
+            for i, (export_data, export_extra) in enumerate(rows):
+                try:
+                    if time_key:
+                        timestamp = aggregation.convert(export_extra[time_key])
+                        series = frozenset([item for item in export_extra.items() if item[0] != time_key])
+                    else:
+                        series = frozenset(export_extra.items())
+                    start = timestamp - timestamp % aggregation.window
+                    if closed is not None and start < closed:
+                        self.__late += 1
+                        continue
+                    values = [(key, casts[key](val) if casts and key in casts else val) for key, val in export_data.items() if val is not None]
+                except Exception as ex:
+                    errors[i] = ex
+                    continue
+                if watermark is None or timestamp > watermark:
+                    watermark = timestamp
+                window = windows.get(start)
+                if window is None:
+                    window = windows[start] = Window(seq=self.__seq + 1, updated=now)
+                window.updated = now
+                if series not in window.series:
+                    window.series[series] = dict()
+                stats = window.series[series]
+                for key, val in values:
+                    if key not in stats:
+                        # count, numeric count, sum, min, max, last
+                        stats[key] = [0, 0, 0, None, None, None]
+                    field = stats[key]
+                    field[0] += 1
+                    field[5] = val
+                    if is_numeric(val):
+                        field[1] += 1
+                        field[2] += val
+                        if field[3] is None or val < field[3]:
+                            field[3] = val
+                        if field[4] is None or val > field[4]:
+                            field[4] = val
+            if watermark is not None:
+                self.__watermarks[export_id] = watermark
+            if not windows:
+                del self.__windows[export_id]
+        return errors
+
+    def __gen_rows(self, aggregation: Aggregation, start: int, window: Window) -> typing.List[typing.Tuple[typing.Dict, typing.Dict]]:
+        rows = list()
+        for series, stats in window.series.items():
+            export_data = dict()
+            for key, (count, num_count, total, minimum, maximum, last) in stats.items():
+                for function in aggregation.functions:
+                    if function == "count":
+                        export_data[f"count_{key}"] = count
+                    elif function == "last":
+                        export_data[f"last_{key}"] = last
+                    elif num_count:
+                        if function == "mean":
+                            export_data[f"mean_{key}"] = total / num_count
+                        elif function == "min":
+                            export_data[f"min_{key}"] = minimum
+                        elif function == "max":
+                            export_data[f"max_{key}"] = maximum
+            export_extra = dict(series)
+            export_extra[aggregation.time_key or "time"] = start
+            rows.append((export_data, export_extra))
+        return rows
+
+    def __evict(self, now: float):
+        for export_id, updated in list(self.__updated.items()):
+            builder = self.__builders.get(export_id)
+            retention = max(self.__retention, builder.aggregation.window_seconds + builder.aggregation.delay_seconds) if builder else self.__retention
+            if export_id not in self.__windows and now - updated >= retention:
+                del self.__updated[export_id]
+                self.__builders.pop(export_id, None)
+                self.__watermarks.pop(export_id, None)
+                self.__closed.pop(export_id, None)
+        self.__next_eviction = now + self.__retention / 10
+
+    def pop(self, offsets: typing.Optional[typing.List], force: bool = False) -> typing.Tuple[typing.Dict, typing.Optional[typing.List]]:
+        now = time.monotonic()
+        closed_rows = dict()
+        with self.__lock:
+            if now >= self.__next_eviction:
+                self.__evict(now)
+            if not self.__windows and not self.__offsets:
+                return closed_rows, offsets
+            self.__seq += 1
+            if offsets:
+                self.__offsets.append((self.__seq, offsets))
+            for export_id in list(self.__windows):
+                windows = self.__windows[export_id]
+                builder = self.__builders[export_id]
+                aggregation: Aggregation = builder.aggregation
+                watermark = self.__watermarks.get(export_id) if aggregation.time_key else time.time_ns() // precision_divisors[builder.time_precision]
+                rows = list()
+                for start in sorted(windows):
+                    window = windows[start]
+                    # windows close in order so later messages for an earlier window are never split across points
+                    if not (force or (watermark is not None and watermark >= start + aggregation.window + aggregation.delay) or now - window.updated >= aggregation.window_seconds + aggregation.delay_seconds):
+                        break
+                    rows.extend(self.__gen_rows(aggregation, start, windows.pop(start)))
+                    self.__closed[export_id] = max(self.__closed.get(export_id, start), start + aggregation.window)
+                if rows:
+                    closed_rows[export_id] = (builder, rows)
+                if not windows:
+                    del self.__windows[export_id]
+            pending_seq = min((window.seq for windows in self.__windows.values() for window in windows.values()), default=self.__seq + 1)
+            offsets = dict()
+            while self.__offsets and self.__offsets[0][0] < pending_seq:
+                for tp in self.__offsets.pop(0)[1]:
+                    offsets[(tp.topic, tp.partition)] = tp
+            if offsets and self.__state and not force:
+                self.__releases.append(({key: tp.offset for key, tp in offsets.items()}, dict(self.__closed)))
+        return {export_id: (builder, builder.aggregation.build_batch(rows)) for export_id, (builder, rows) in closed_rows.items()}, list(offsets.values()) or None
+
+    def commit(self, offsets: typing.List):
+        # called after the points of released offsets were written and before the offsets are stored
+        if not self.__state:
+            return
+        with self.__lock:
+            for tp in offsets:
+                self.__stored[(tp.topic, tp.partition)] = max(tp.offset, self.__stored.get((tp.topic, tp.partition), tp.offset))
+            markers = None
+            while self.__releases and all(self.__stored.get(key, offset - 1) >= offset for key, offset in self.__releases[0][0].items()):
+                markers = self.__releases.pop(0)[1]
+        if markers is not None:
+            self.__state.save(source=self.__source, markers=markers)
+
+    @property
+    def pending(self) -> int:
+        with self.__lock:
+            return sum(len(window.series) for windows in self.__windows.values() for window in windows.values())
+
+    @property
+    def late(self) -> int:
+        return self.__late
@@ -0,0 +1,158 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("AsyncWriter", )
+
+from .line_protocol import write_headers, join_lines
+import util
+import urllib.parse
+import threading
+import base64
+import typing
+import gzip
+
+influxdb = util.lazy_import("influxdb")
+asyncio = util.lazy_import("asyncio")
+
+
+class Connection(typing.NamedTuple):
+    reader: "asyncio.StreamReader"
+    writer: "asyncio.StreamWriter"
+
+
+class AsyncWriter:
+    __log_msg_prefix = "async writer"
+
+    def __init__(self, host: str = "localhost", port: int = 8086, username: typing.Optional[str] = None, password: typing.Optional[str] = None, timeout: float = 10, max_in_flight: int = 16):
+        self.__host = host
+        self.__port = port
+        self.__timeout = timeout
+        self.__max_in_flight = max_in_flight
+        self.__auth = f"Basic {base64.b64encode(f'{username}:{password}'.encode()).decode()}" if username is not None and password is not None else None
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, name="influxdb-async-writer", daemon=True)
+        self.__idle: typing.List[Connection] = list()
+        self.__semaphore: typing.Optional["asyncio.Semaphore"] = None
+        self.__thread.start()
+
+    def run(self, coro: typing.Coroutine):
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+    async def __get_connection(self) -> typing.Tuple[Connection, bool]:
+        while self.__idle:
+            connection = self.__idle.pop()
+            if not connection.reader.at_eof():
+                return connection, True
+            connection.writer.close()
+        reader, writer = await asyncio.open_connection(self.__host, self.__port)
+        return Connection(reader, writer), False
+
+    async def __read_response(self, reader: "asyncio.StreamReader") -> typing.Tuple[int, bytes, bool]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        status = int(status_line.split(b" ", 2)[1])
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            return status, bytes(body), keep_alive
+        if "content-length" in headers:
+            return status, await reader.readexactly(int(headers["content-length"])), keep_alive
+        if status == 204:
+            return status, b"", keep_alive
+        return status, await reader.read(), False
+
+    async def __send(self, connection: Connection, method: str, path: str, body: typing.Union[bytes, bytearray], headers: typing.Dict[str, str]) -> typing.Tuple[int, bytes, bool]:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.__host}:{self.__port}", f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        if self.__auth:
+            lines.append(f"Authorization: {self.__auth}")
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        connection.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        connection.writer.write(body)
+        await connection.writer.drain()
+        return await self.__read_response(connection.reader)
+
+    async def __exchange(self, method: str, path: str, body: typing.Union[bytes, bytearray], headers: typing.Dict[str, str]) -> typing.Tuple[int, bytes]:
+        connection, reused = await self.__get_connection()
+        try:
+            try:
+                status, response_body, keep_alive = await self.__send(connection=connection, method=method, path=path, body=body, headers=headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # idle keep-alive connections may have been closed by the server in the meantime
+                if not reused:
+                    raise
+                connection.writer.close()
+                connection = Connection(*(await asyncio.open_connection(self.__host, self.__port)))
+                status, response_body, keep_alive = await self.__send(connection=connection, method=method, path=path, body=body, headers=headers)
+        except BaseException:
+            connection.writer.close()
+            raise
+        if keep_alive:
+            self.__idle.append(connection)
+        else:
+            connection.writer.close()
+        return status, response_body
+
+    async def request(self, method: str, url: str, params: typing.Dict, data: typing.Union[bytes, bytearray] = b"", headers: typing.Optional[typing.Dict[str, str]] = None, expected_response_code: int = 204) -> bytes:
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.__max_in_flight)
+        async with self.__semaphore:
+            # covers connecting, sending and reading, a blackholed host must not stall the worker
+            status, body = await asyncio.wait_for(self.__exchange(method=method, path=f"/{url}?{urllib.parse.urlencode(params)}", body=data, headers=headers or dict()), self.__timeout)
+        if 500 <= status < 600:
+            raise influxdb.exceptions.InfluxDBServerError(body)
+        if status != expected_response_code:
+            raise influxdb.exceptions.InfluxDBClientError(body.decode(errors="replace"), status)
+        return body
+
+    async def write_lines(self, lines: typing.List[bytes], database: str, time_precision: typing.Optional[str] = None, gzip_level: int = 0) -> int:
+        params = {"db": database}
+        if time_precision:
+            params["precision"] = time_precision
+        headers = dict(write_headers)
+        data = join_lines(lines)
+        if gzip_level:
+            headers["Content-Encoding"] = "gzip"
+            data = gzip.compress(data, compresslevel=gzip_level)
+        await self.request(method="POST", url="write", params=params, data=data, headers=headers, expected_response_code=204)
+        return len(data)
+
+    async def create_database(self, dbname: str):
+        await self.request(method="POST", url="query", params={"q": f"CREATE DATABASE {influxdb.line_protocol.quote_ident(dbname)}"}, expected_response_code=200)
+
+    async def __close(self):
+        while self.__idle:
+            self.__idle.pop().writer.close()
+
+    def close(self):
+        self.run(self.__close())
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        util.logger.debug(f"{AsyncWriter.__log_msg_prefix}: closed")
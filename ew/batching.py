@@ -0,0 +1,84 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("BatchController", )
+
+import util
+import threading
+
+
+class BatchController:
+    __log_msg_prefix = "batch controller"
+
+    def __init__(self, limit: int, timeout: float, min_limit: int, max_limit: int, min_timeout: float, max_timeout: float, target_latency: float, increase: float = 1.5, decrease: float = 0.7, smoothing: float = 0.3):
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__min_timeout = min_timeout
+        self.__max_timeout = max_timeout
+        self.__target_latency = target_latency
+        self.__increase = increase
+        self.__decrease = decrease
+        self.__smoothing = smoothing
+        self.__limit = min(max(limit, min_limit), max_limit)
+        self.__timeout = min(max(timeout, min_timeout), max_timeout)
+        self.__fill_ratio = None
+        self.__latency = None
+        self.__lock = threading.Lock()
+
+    def __smooth(self, old, new):
+        return new if old is None else old + self.__smoothing * (new - old)
+
+    @property
+    def limit(self) -> int:
+        return self.__limit
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def fill_ratio(self) -> float:
+        return self.__fill_ratio or 0.0
+
+    @property
+    def latency(self) -> float:
+        return self.__latency or 0.0
+
+    def observe_fetch(self, consumed: int, limit: int):
+        with self.__lock:
+            self.__fill_ratio = self.__smooth(self.__fill_ratio, consumed / limit if limit else 0.0)
+
+    def observe_processing(self, seconds: float):
+        with self.__lock:
+            self.__latency = self.__smooth(self.__latency, seconds)
+            limit = self.__limit
+            if self.__latency > self.__target_latency:
+                limit = max(int(limit * self.__decrease), self.__min_limit)
+            elif self.__fill_ratio is not None and self.__fill_ratio >= 0.9 and self.__latency < self.__target_latency / 2:
+                limit = min(int(limit * self.__increase) + 1, self.__max_limit)
+            timeout = min(max(self.__target_latency - self.__latency, self.__min_timeout), self.__max_timeout)
+            if self.__fill_ratio is not None:
+                # waiting longer only pays off if batches fill up, underfilled batches shorten the linger towards min_timeout
+                if self.__fill_ratio < 0.5:
+                    timeout = min(max(self.__timeout * self.__decrease, self.__min_timeout), timeout)
+                elif self.__fill_ratio < 0.9:
+                    timeout = min(self.__timeout, timeout)
+                else:
+                    timeout = min(self.__timeout * self.__increase, timeout)
+            if limit != self.__limit:
+                util.logger.debug(f"{BatchController.__log_msg_prefix}: limit={limit} timeout={timeout:.3f} fill_ratio={self.fill_ratio:.2f} latency={self.__latency:.3f}")
+            self.__limit = limit
+            self.__timeout = timeout
@@ -0,0 +1,84 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("WriteBuffer", )
+
+import threading
+import typing
+import time
+
+
+class BufferedPoints:
+    __slots__ = ("lines", "size", "seq", "deadline")
+
+    def __init__(self, seq: int, deadline: float):
+        self.lines = list()
+        self.size = 0
+        self.seq = seq
+        self.deadline = deadline
+
+
+class WriteBuffer:
+    def __init__(self, max_points: int = 5000, max_bytes: int = 0, max_linger: float = 1.0):
+        self.__max_points = max_points
+        self.__max_bytes = max_bytes
+        self.__max_linger = max_linger
+        self.__buffers: typing.Dict[typing.Tuple[str, str], BufferedPoints] = dict()
+        self.__offsets = list()
+        self.__seq = 0
+        self.__lock = threading.Lock()
+
+    def __is_due(self, buffer: BufferedPoints, now: float) -> bool:
+        return (self.__max_points and len(buffer.lines) >= self.__max_points) or (self.__max_bytes and buffer.size >= self.__max_bytes) or now >= buffer.deadline
+
+    def put(self, points_batch: typing.Optional[typing.Dict], offsets: typing.Optional[typing.List]):
+        with self.__lock:
+            self.__seq += 1
+            if points_batch:
+                deadline = time.monotonic() + self.__max_linger
+                for db_name, batch in points_batch.items():
+                    for time_precision, points in batch.items():
+                        if not points:
+                            continue
+                        key = (db_name, time_precision)
+                        if key not in self.__buffers:
+                            self.__buffers[key] = BufferedPoints(seq=self.__seq, deadline=deadline)
+                        buffer = self.__buffers[key]
+                        buffer.lines.extend(points)
+                        buffer.size += sum(len(point) for point in points)
+            if offsets:
+                self.__offsets.append((self.__seq, offsets))
+
+    def pop(self, force: bool = False) -> typing.Tuple[typing.Dict, typing.Optional[typing.List]]:
+        now = time.monotonic()
+        points_batch = dict()
+        with self.__lock:
+            for key in [key for key, buffer in self.__buffers.items() if force or self.__is_due(buffer, now)]:
+                db_name, time_precision = key
+                if db_name not in points_batch:
+                    points_batch[db_name] = dict()
+                points_batch[db_name][time_precision] = self.__buffers.pop(key).lines
+            pending_seq = min((buffer.seq for buffer in self.__buffers.values()), default=self.__seq + 1)
+            offsets = dict()
+            while self.__offsets and self.__offsets[0][0] < pending_seq:
+                for tp in self.__offsets.pop(0)[1]:
+                    offsets[(tp.topic, tp.partition)] = tp
+        return points_batch, list(offsets.values()) or None
+
+    @property
+    def size(self) -> int:
+        with self.__lock:
+            return sum(len(buffer.lines) for buffer in self.__buffers.values())
@@ -0,0 +1,73 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("PointBuilders", "gen_point_builder")
+
+from .util import *
+from .model import *
+from .databases import KnownDatabases
+from .cache import TagSetCache
+from .aggregation import Aggregation, compile_aggregation
+import typing
+
+
+class PointBuilder(typing.NamedTuple):
+    db_name: str
+    time_precision: typing.Optional[str]
+    build_batch: typing.Callable[..., typing.List[typing.Union[bytes, Exception]]]
+    aggregation: typing.Optional[Aggregation] = None
+
+
+def gen_point_builder(export_id: str, export_args: typing.Dict, tag_cache: typing.Optional[TagSetCache] = None) -> PointBuilder:
+    builder_args = dict(
+        export_id=export_id,
+        cast_map=export_args.get(ExportArgs.type_casts),
+        time_key=export_args.get(ExportArgs.time_key),
+        time_format=export_args.get(ExportArgs.time_format),
+        time_precision=export_args.get(ExportArgs.time_precision)
+    )
+    return PointBuilder(
+        db_name=export_args[ExportArgs.db_name],
+        time_precision=export_args.get(ExportArgs.time_precision),
+        build_batch=compile_batch_point_builder(**builder_args, tag_cache=tag_cache),
+        aggregation=compile_aggregation(export_id=export_id, export_args=export_args) if export_args.get(ExportArgs.aggregation) else None
+    )
+
+
+class PointBuilders:
+    def __init__(self, known_databases: typing.Optional[KnownDatabases] = None, tag_cache: typing.Optional[TagSetCache] = None):
+        self.__builders: typing.Dict[str, PointBuilder] = dict()
+        self.__known_databases = known_databases
+        self.__tag_cache = tag_cache
+
+    def validate_filter(self, filter: dict):
+        if validate_filter(filter):
+            builder = self.put(export_id=filter["id"], export_args=filter["args"])
+            if self.__known_databases:
+                self.__known_databases.try_ensure(db_name=builder.db_name)
+            return True
+        return False
+
+    def put(self, export_id: str, export_args: typing.Dict) -> PointBuilder:
+        builder = gen_point_builder(export_id=export_id, export_args=export_args, tag_cache=self.__tag_cache)
+        self.__builders[export_id] = builder
+        return builder
+
+    def get(self, export_id: str) -> typing.Optional[PointBuilder]:
+        return self.__builders.get(export_id)
+
+    def delete(self, export_id: str):
+        self.__builders.pop(export_id, None)
@@ -0,0 +1,61 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("TagSetCache", )
+
+import collections
+import threading
+import typing
+
+
+class TagSetCache:
+    def __init__(self, max_size: int = 100000):
+        self.__max_size = max_size
+        self.__items: typing.OrderedDict[typing.Hashable, str] = collections.OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def get_many(self, keys: typing.Iterable[typing.Hashable]) -> typing.List[typing.Optional[str]]:
+        values = list()
+        with self.__lock:
+            for key in keys:
+                value = self.__items.get(key)
+                if value is not None:
+                    self.__items.move_to_end(key)
+                values.append(value)
+            misses = values.count(None)
+            self.__hits += len(values) - misses
+            self.__misses += misses
+        return values
+
+    def put_many(self, items: typing.Dict[typing.Hashable, str]):
+        with self.__lock:
+            self.__items.update(items)
+            while len(self.__items) > self.__max_size:
+                self.__items.popitem(last=False)
+
+    @property
+    def size(self) -> int:
+        return len(self.__items)
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
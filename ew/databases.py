@@ -0,0 +1,107 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("KnownDatabases", )
+
+from .util import get_exception_str
+import util
+import threading
+import typing
+import queue
+import time
+
+influxdb = util.lazy_import("influxdb")
+
+
+class KnownDatabases:
+    __log_msg_prefix = "known databases"
+    __log_err_msg_prefix = f"{__log_msg_prefix} error"
+
+    def __init__(self, influxdb_client: "influxdb.InfluxDBClient", retry_interval: float = 30.0):
+        self.__influxdb_client = influxdb_client
+        self.__retry_interval = retry_interval
+        self.__databases: typing.Set[str] = set()
+        self.__pending: typing.Set[str] = set()
+        self.__failed: typing.Dict[str, float] = dict()
+        self.__creating: typing.Dict[str, threading.Lock] = dict()
+        self.__queue = queue.Queue()
+        self.__thread: typing.Optional[threading.Thread] = None
+        self.__lock = threading.Lock()
+
+    def load(self):
+        with self.__lock:
+            self.__databases.update(item["name"] for item in self.__influxdb_client.get_list_database())
+        util.logger.info(f"{KnownDatabases.__log_msg_prefix}: loaded {len(self.__databases)} databases")
+
+    def ensure(self, db_name: str):
+        if db_name in self.__databases:
+            return
+        with self.__lock:
+            if db_name in self.__databases:
+                return
+            if db_name not in self.__creating:
+                self.__creating[db_name] = threading.Lock()
+            creating = self.__creating[db_name]
+        # only writers of the same database wait for the request, creating a database is idempotent so a stale marker is harmless
+        try:
+            with creating:
+                if db_name not in self.__databases:
+                    self.__influxdb_client.create_database(dbname=db_name)
+                    self.__databases.add(db_name)
+                    util.logger.debug(f"{KnownDatabases.__log_msg_prefix}: created '{db_name}'")
+        finally:
+            with self.__lock:
+                self.__creating.pop(db_name, None)
+
+    def __create(self):
+        while True:
+            db_name = self.__queue.get()
+            if db_name is None:
+                return
+            try:
+                self.ensure(db_name=db_name)
+            except Exception as ex:
+                self.__failed[db_name] = time.monotonic()
+                util.logger.warning(f"{KnownDatabases.__log_err_msg_prefix}: creating '{db_name}' failed: reason={get_exception_str(ex)}")
+            self.__pending.discard(db_name)
+
+    def try_ensure(self, db_name: str):
+        # called from the filter consumer, creation happens in the background so filter sync is never blocked by InfluxDB
+        if db_name in self.__databases or db_name in self.__pending:
+            return
+        if db_name in self.__failed and time.monotonic() - self.__failed[db_name] < self.__retry_interval:
+            return
+        self.__failed.pop(db_name, None)
+        self.__pending.add(db_name)
+        if not self.__thread:
+            self.__thread = threading.Thread(target=self.__create, name="database-creator", daemon=True)
+            self.__thread.start()
+        self.__queue.put(db_name)
+
+    def add(self, db_name: str):
+        self.__databases.add(db_name)
+
+    def discard(self, db_name: str):
+        self.__databases.discard(db_name)
+
+    def __contains__(self, db_name: str) -> bool:
+        return db_name in self.__databases
+
+    def close(self):
+        if self.__thread:
+            self.__queue.put(None)
+            self.__thread.join()
+        self.__influxdb_client.close()
@@ -0,0 +1,85 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("DeadLetterSink", "DeadLetterFile", "DeadLetterTopic")
+
+from .util import get_measurement
+import util
+import confluent_kafka
+import threading
+import typing
+import json
+import time
+
+
+class DeadLetterSink:
+    __log_msg_prefix = "dead letter sink"
+
+    def __init__(self):
+        self.__counts = dict()
+        self.__lock = threading.Lock()
+
+    def _gen_record(self, line: bytes, db_name: str, time_precision: typing.Optional[str], reason: str) -> str:
+        return json.dumps({"db_name": db_name, "time_precision": time_precision, "reason": reason, "line": line.decode(), "time": time.time()}, separators=(',', ':'))
+
+    def _put(self, records: typing.List[str]):
+        pass
+
+    def put(self, lines: typing.List[bytes], db_name: str, time_precision: typing.Optional[str], reason: str):
+        with self.__lock:
+            self.__counts[db_name] = self.__counts.get(db_name, 0) + len(lines)
+        util.logger.error(f"{DeadLetterSink.__log_msg_prefix}: dropping points: reason={reason} db_name={db_name} measurements={set(get_measurement(line) for line in lines)}")
+        self._put([self._gen_record(line=line, db_name=db_name, time_precision=time_precision, reason=reason) for line in lines])
+
+    @property
+    def counts(self) -> typing.Dict[str, int]:
+        with self.__lock:
+            return dict(self.__counts)
+
+    def close(self):
+        pass
+
+
+class DeadLetterFile(DeadLetterSink):
+    def __init__(self, path: str):
+        super().__init__()
+        self.__file = open(path, "a")
+        self.__lock = threading.Lock()
+
+    def _put(self, records: typing.List[str]):
+        with self.__lock:
+            for record in records:
+                self.__file.write(record + "\n")
+            self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+
+class DeadLetterTopic(DeadLetterSink):
+    def __init__(self, kafka_producer: confluent_kafka.Producer, topic: str):
+        super().__init__()
+        self.__kafka_producer = kafka_producer
+        self.__topic = topic
+
+    def _put(self, records: typing.List[str]):
+        for record in records:
+            self.__kafka_producer.produce(topic=self.__topic, value=record)
+        self.__kafka_producer.poll(0)
+
+    def close(self):
+        self.__kafka_producer.flush()
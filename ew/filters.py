@@ -0,0 +1,67 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("FilterDeleteHook", )
+
+import confluent_kafka
+import typing
+import json
+
+delete_method = "delete"
+
+
+def parse_filter_message(msg) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+    key = msg.key().decode() if msg.key() is not None else None
+    if msg.value() is None:
+        return key, delete_method
+    try:
+        value = json.loads(msg.value())
+        if key is None:
+            payload = value.get("payload")
+            if isinstance(payload, dict) and payload.get("id") is not None:
+                key = str(payload["id"])
+            elif value.get("id") is not None:
+                key = str(value["id"])
+        return key, value.get("method")
+    except Exception:
+        return key, None
+
+
+class FilterDeleteHook:
+    def __init__(self, kafka_consumer: confluent_kafka.Consumer, on_delete: typing.Callable[[str], None]):
+        self.__kafka_consumer = kafka_consumer
+        self.__on_delete = on_delete
+
+    def __getattr__(self, item):
+        return getattr(self.__kafka_consumer, item)
+
+    def __observe(self, msg):
+        if msg.error() is None:
+            key, method = parse_filter_message(msg)
+            if method == delete_method and key is not None:
+                self.__on_delete(key)
+
+    def consume(self, num_messages: int = 1, *args, **kwargs):
+        msgs = self.__kafka_consumer.consume(num_messages, *args, **kwargs)
+        for msg in msgs:
+            self.__observe(msg)
+        return msgs
+
+    def poll(self, *args, **kwargs):
+        msg = self.__kafka_consumer.poll(*args, **kwargs)
+        if msg is not None:
+            self.__observe(msg)
+        return msg
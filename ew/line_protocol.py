@@ -0,0 +1,137 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import util
+import gzip
+import datetime
+import typing
+import re
+
+influxdb = util.lazy_import("influxdb")
+dateutil = util.lazy_import("dateutil")
+
+epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+precision_divisors = {
+    None: 1,
+    "n": 1,
+    "u": 10 ** 3,
+    "ms": 10 ** 6,
+    "s": 10 ** 9,
+    "m": 60 * 10 ** 9,
+    "h": 3600 * 10 ** 9
+}
+
+write_headers = {"Content-Type": "application/octet-stream"}
+
+key_escape_table = str.maketrans({"\\": "\\\\", " ": "\\ ", ",": "\\,", "=": "\\=", "\n": "\\n"})
+str_field_escape_table = str.maketrans({"\\": "\\\\", "\"": "\\\"", "\n": "\\n"})
+
+measurement_regex = re.compile(rb"^((?:[^,\\ ]|\\.)*)")
+
+
+def escape_key(key) -> str:
+    return str(key).translate(key_escape_table)
+
+
+def escape_tag_value(value) -> str:
+    return str(value).translate(key_escape_table)
+
+
+def encode_field_value(value) -> typing.Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return f"\"{value.translate(str_field_escape_table)}\""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def datetime_to_timestamp(time_obj: datetime.datetime, precision: typing.Optional[str]) -> int:
+    if time_obj.tzinfo is None:
+        time_obj = time_obj.replace(tzinfo=datetime.timezone.utc)
+    delta = time_obj - epoch
+    return ((delta.days * 86400 + delta.seconds) * 10 ** 9 + delta.microseconds * 10 ** 3) // precision_divisors[precision]
+
+
+def convert_time(time, precision: typing.Optional[str]) -> int:
+    if isinstance(time, int) and not isinstance(time, bool):
+        return time
+    if isinstance(time, str):
+        try:
+            time = datetime.datetime.fromisoformat(time)
+        except ValueError:
+            time = dateutil.parser.parse(time)
+    if isinstance(time, datetime.datetime):
+        return datetime_to_timestamp(time_obj=time, precision=precision)
+    raise ValueError(time)
+
+
+def get_measurement(line: bytes) -> str:
+    return measurement_regex.match(line).group(1).decode()
+
+
+def chunk_lines(lines: typing.List[bytes], max_bytes: int = 0, max_lines: int = 0) -> typing.Generator[typing.List[bytes], None, None]:
+    if not max_bytes and not max_lines:
+        yield lines
+        return
+    chunk = list()
+    chunk_size = 0
+    for line in lines:
+        line_size = len(line) + 1
+        if chunk and ((max_bytes and chunk_size + line_size > max_bytes) or (max_lines and len(chunk) >= max_lines)):
+            yield chunk
+            chunk = list()
+            chunk_size = 0
+        chunk.append(line)
+        chunk_size += line_size
+    if chunk:
+        yield chunk
+
+
+def join_lines(lines: typing.List[bytes], chunk_size: int = 1024) -> bytearray:
+    # joining in chunks avoids bytes.join allocating a buffer descriptor per line for the whole request at once
+    data = bytearray()
+    for i in range(0, len(lines), chunk_size):
+        data += b"\n".join(lines[i:i + chunk_size])
+        data += b"\n"
+    return data
+
+
+def write_lines(influxdb_client: "influxdb.InfluxDBClient", lines: typing.List[bytes], database: str, time_precision: typing.Optional[str] = None, gzip_level: int = 0) -> int:
+    params = {"db": database}
+    if time_precision:
+        params["precision"] = time_precision
+    headers = dict(write_headers)
+    if gzip_level:
+        headers["Content-Encoding"] = "gzip"
+        data = gzip.compress(join_lines(lines), compresslevel=gzip_level)
+    else:
+        data = b"\n".join(lines) + b"\n"
+    influxdb_client.request(
+        url="write",
+        method="POST",
+        params=params,
+        data=data,
+        expected_response_code=204,
+        headers=headers
+    )
+    return len(data)
@@ -0,0 +1,204 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("Counter", "Gauge", "Histogram", "Metrics", "ExportMetrics")
+
+import util
+import http.server
+import urllib.parse
+import threading
+import bisect
+import typing
+
+latency_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+size_buckets = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+label_escape_table = str.maketrans({"\\": "\\\\", "\"": "\\\"", "\n": "\\n"})
+
+
+def format_labels(label_names: typing.Tuple, label_values: typing.Tuple, extra: str = "") -> str:
+    labels = [f"{name}=\"{str(value).translate(label_escape_table)}\"" for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: typing.Tuple = (), callback: typing.Optional[typing.Callable[[], typing.Dict[typing.Tuple, typing.Union[int, float]]]] = None):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = dict()
+        self._lock = threading.Lock()
+        self.__callback = callback
+
+    def _samples(self) -> typing.List[str]:
+        if self.__callback:
+            try:
+                values = self.__callback()
+            except Exception as ex:
+                util.logger.warning(f"metrics: collecting '{self.name}' failed: reason={ex}")
+                values = dict()
+            with self._lock:
+                self._values = values
+        with self._lock:
+            return [f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in self._values.items()]
+
+    def expose(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"] + self._samples())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, value: typing.Union[int, float] = 1, labels: typing.Tuple = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def inc_many(self, values: typing.Dict[typing.Tuple, typing.Union[int, float]]):
+        with self._lock:
+            for labels, value in values.items():
+                self._values[labels] = self._values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: typing.Union[int, float], labels: typing.Tuple = ()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: typing.Tuple = (), buckets: typing.Tuple = latency_buckets):
+        super().__init__(name=name, description=description, label_names=label_names)
+        self.__buckets = buckets
+
+    def observe(self, value: typing.Union[int, float], labels: typing.Tuple = ()):
+        with self._lock:
+            if labels not in self._values:
+                self._values[labels] = [[0] * (len(self.__buckets) + 1), 0, 0]
+            hist = self._values[labels]
+            hist[0][bisect.bisect_left(self.__buckets, value)] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def _samples(self) -> typing.List[str]:
+        samples = list()
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bucket, bucket_count in zip(self.__buckets + ("+Inf", ), counts):
+                    cumulative += bucket_count
+                    le = f"le=\"{bucket}\""
+                    samples.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}")
+                samples.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+                samples.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return samples
+
+
+class Metrics:
+    __log_msg_prefix = "metrics"
+
+    def __init__(self):
+        self.__metrics: typing.List[Metric] = list()
+        self.__routes: typing.Dict[str, typing.Callable[[typing.Dict[str, typing.List[str]]], typing.Tuple[int, bytes]]] = dict()
+        self.__server: typing.Optional[http.server.ThreadingHTTPServer] = None
+        self.__thread: typing.Optional[threading.Thread] = None
+
+    def add(self, metric: Metric) -> Metric:
+        self.__metrics.append(metric)
+        return metric
+
+    def add_route(self, path: str, handler: typing.Callable[[typing.Dict[str, typing.List[str]]], typing.Tuple[int, bytes]]):
+        self.__routes[path] = handler
+
+    def expose(self) -> str:
+        return "\n".join(metric.expose() for metric in self.__metrics) + "\n"
+
+    def start(self, port: int, host: str = ""):
+        metrics = self
+        routes = self.__routes
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                if path in routes:
+                    code, body = routes[path](urllib.parse.parse_qs(query))
+                    self.send_response(code)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.expose().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="metrics-server", daemon=True)
+        self.__thread.start()
+        util.logger.info(f"{Metrics.__log_msg_prefix}: serving on port {port}")
+
+    def stop(self):
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+
+
+class ExportMetrics(Metrics):
+    def __init__(self, export_labels: bool = False):
+        super().__init__()
+        self.export_labels = export_labels
+        self.batch_size = self.add(Histogram("ew_batch_size", "Filter results per consumed batch.", buckets=size_buckets))
+        self.fetch_time = self.add(Histogram("ew_fetch_seconds", "Time spent fetching a batch."))
+        self.gen_time = self.add(Histogram("ew_gen_seconds", "Time spent generating points for a batch."))
+        self.points = self.add(Counter("ew_points_generated_total", "Points generated.", ("db_name", "export_id") if export_labels else ("db_name", )))
+        self.point_errors = self.add(Counter("ew_point_errors_total", "Points that could not be generated."))
+        self.write_time = self.add(Histogram("ew_write_seconds", "Latency of InfluxDB write requests.", ("db_name", )))
+        self.write_bytes = self.add(Histogram("ew_write_request_bytes", "Size of InfluxDB write request bodies.", buckets=size_buckets))
+        self.write_errors = self.add(Counter("ew_write_errors_total", "Failed InfluxDB write requests.", ("db_name", "code")))
+        self.retries = self.add(Counter("ew_write_retries_total", "Write retries after creating a missing database.", ("db_name", )))
+        self.transient_retries = self.add(Counter("ew_write_transient_retries_total", "Write retries after a transient error.", ("db_name", )))
+        self.splits = self.add(Counter("ew_write_splits_total", "Write requests split after a 400/413 response.", ("db_name", "code")))
+        self.store_time = self.add(Histogram("ew_store_offsets_seconds", "Time spent storing offsets."))
+
+    def add_offset_tracker(self, offset_tracker):
+        self.add(Counter("ew_messages_consumed_total", "Kafka messages consumed.", callback=lambda: {(): offset_tracker.consumed}))
+        self.add(Gauge("ew_consumer_lag", "Messages between the consumer position and the high watermark per partition.", ("topic", "partition"), callback=offset_tracker.get_lag))
+        if offset_tracker.partition_batches:
+            self.add(Gauge("ew_partition_buffered_messages", "Messages held back until their partition's next batch.", callback=lambda: {(): offset_tracker.buffered}))
+
+    def add_dead_letter_sink(self, dead_letter_sink):
+        self.add(Counter("ew_dead_letter_points_total", "Points handed to the dead letter sink.", ("db_name", ), callback=lambda: {(db_name, ): count for db_name, count in dead_letter_sink.counts.items()}))
+
+    def add_tag_cache(self, tag_cache):
+        self.add(Counter("ew_tag_cache_hits_total", "Series key lookups served from the tag set cache.", callback=lambda: {(): tag_cache.hits}))
+        self.add(Counter("ew_tag_cache_misses_total", "Series key lookups that required encoding tags.", callback=lambda: {(): tag_cache.misses}))
+        self.add(Gauge("ew_tag_cache_size", "Series keys held in the tag set cache.", callback=lambda: {(): tag_cache.size}))
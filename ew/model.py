@@ -22,10 +22,11 @@ class ExportArgs:
     time_format = "time_format"
     time_precision = "time_precision"
     utc = "utc"
+    aggregation = "aggregation"
 
 
-class InfluxDBPoint:
-    measurement = "measurement"
-    fields = "fields"
-    tags = "tags"
-    time = "time"
+class AggregationArgs:
+    window = "window"
+    functions = "functions"
+    delay = "delay"
+
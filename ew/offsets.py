@@ -0,0 +1,160 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("OffsetTracker", )
+
+import util
+import confluent_kafka
+import collections
+import threading
+import typing
+
+
+class OffsetTracker:
+    __log_msg_prefix = "offset tracker"
+
+    def __init__(self, kafka_consumer: confluent_kafka.Consumer, partition_batches: bool = False):
+        self.__kafka_consumer = kafka_consumer
+        self.__partition_batches = partition_batches
+        self.__offsets = dict()
+        self.__consumed = 0
+        self.__buffered: typing.Dict[typing.Tuple[str, int], collections.deque] = dict()
+        self.__pinned: typing.Optional[typing.Tuple[str, int]] = None
+        self.__lock = threading.Lock()
+
+    def __getattr__(self, item):
+        return getattr(self.__kafka_consumer, item)
+
+    def __track(self, msg):
+        self.__consumed += 1
+        if msg.error() is None:
+            self.__offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+
+    def __prune(self):
+        assignment = set((tp.topic, tp.partition) for tp in self.__kafka_consumer.assignment())
+        for key in list(self.__buffered):
+            if key not in assignment:
+                del self.__buffered[key]
+
+    def __take(self, num_messages: int) -> typing.List:
+        if self.__pinned is None:
+            if not self.__buffered:
+                return list()
+            self.__prune()
+            if not self.__buffered:
+                return list()
+            self.__pinned = next(iter(self.__buffered))
+        buffered = self.__buffered.get(self.__pinned)
+        if not buffered:
+            return list()
+        msgs = [buffered.popleft() for _ in range(min(num_messages, len(buffered)))]
+        if not buffered:
+            del self.__buffered[self.__pinned]
+        return msgs
+
+    def __route(self, msgs: typing.List) -> typing.List:
+        routed = list()
+        for msg in msgs:
+            if msg.error() is not None:
+                routed.append(msg)
+                continue
+            key = (msg.topic(), msg.partition())
+            if self.__pinned is None:
+                self.__pinned = key
+            if key == self.__pinned:
+                routed.append(msg)
+            else:
+                if key not in self.__buffered:
+                    self.__buffered[key] = collections.deque()
+                self.__buffered[key].append(msg)
+        return routed
+
+    def __consume_partition(self, num_messages: int, *args, **kwargs):
+        with self.__lock:
+            msgs = self.__take(num_messages)
+            if msgs or self.__buffered:
+                for msg in msgs:
+                    self.__track(msg)
+                return msgs
+        msgs = self.__kafka_consumer.consume(num_messages, *args, **kwargs)
+        with self.__lock:
+            msgs = self.__route(msgs)
+            for msg in msgs:
+                self.__track(msg)
+        return msgs
+
+    def consume(self, num_messages: int = 1, *args, **kwargs):
+        if self.__partition_batches:
+            return self.__consume_partition(num_messages, *args, **kwargs)
+        msgs = self.__kafka_consumer.consume(num_messages, *args, **kwargs)
+        with self.__lock:
+            for msg in msgs:
+                self.__track(msg)
+        return msgs
+
+    def poll(self, *args, **kwargs):
+        if self.__partition_batches:
+            msgs = self.__consume_partition(1, *args, **kwargs)
+            return msgs[0] if msgs else None
+        msg = self.__kafka_consumer.poll(*args, **kwargs)
+        if msg is not None:
+            with self.__lock:
+                self.__track(msg)
+        return msg
+
+    def pop_offsets(self) -> typing.List[confluent_kafka.TopicPartition]:
+        with self.__lock:
+            offsets = [confluent_kafka.TopicPartition(topic=topic, partition=partition, offset=offset) for (topic, partition), offset in self.__offsets.items()]
+            self.__offsets.clear()
+            if self.__pinned in self.__buffered:
+                self.__buffered[self.__pinned] = self.__buffered.pop(self.__pinned)
+            self.__pinned = None
+        return offsets
+
+    def store_offsets(self, offsets: typing.List[confluent_kafka.TopicPartition]):
+        # a rebalance can revoke a partition while its batch is in flight, the new owner consumes it again from the committed offset
+        assignment = set((tp.topic, tp.partition) for tp in self.__kafka_consumer.assignment())
+        offsets = [tp for tp in offsets if (tp.topic, tp.partition) in assignment]
+        if not offsets:
+            return
+        try:
+            self.__kafka_consumer.store_offsets(offsets=offsets)
+        except confluent_kafka.KafkaException as ex:
+            if ex.args[0].code() != confluent_kafka.KafkaError._STATE:
+                raise
+            util.logger.warning(f"{OffsetTracker.__log_msg_prefix}: storing offsets of revoked partitions skipped: offsets={[(tp.topic, tp.partition, tp.offset) for tp in offsets]}")
+
+    @property
+    def partition_batches(self) -> bool:
+        return self.__partition_batches
+
+    @property
+    def buffered(self) -> int:
+        with self.__lock:
+            return sum(len(msgs) for msgs in self.__buffered.values())
+
+    @property
+    def consumed(self) -> int:
+        return self.__consumed
+
+    def get_lag(self) -> typing.Dict[typing.Tuple[str, int], int]:
+        # cached watermarks are kept up to date by fetch responses, no broker round-trip per partition
+        lag = dict()
+        for tp in self.__kafka_consumer.position(self.__kafka_consumer.assignment()):
+            _, high = self.__kafka_consumer.get_watermark_offsets(tp, cached=True)
+            if tp.offset >= 0 and high >= 0:
+                lag[(tp.topic, tp.partition)] = max(high - tp.offset, 0)
+        return lag
@@ -0,0 +1,133 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("StageTimer", "Profiler")
+
+from .metrics import Metrics, Histogram
+from .util import get_exception_str
+import util
+import collections
+import threading
+import random
+import typing
+import time
+import sys
+import os
+
+
+class StageTimer:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.steps: typing.Dict[str, float] = dict()
+        self.__start = time.perf_counter()
+        self.__last = self.__start
+        self.total = 0.0
+
+    def mark(self, step: str):
+        now = time.perf_counter()
+        self.steps[step] = self.steps.get(step, 0.0) + now - self.__last
+        self.__last = now
+
+    def stop(self):
+        self.total = time.perf_counter() - self.__start
+
+
+def format_frame(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+class Profiler:
+    __log_msg_prefix = "profiler"
+    __log_err_msg_prefix = f"{__log_msg_prefix} error"
+
+    def __init__(self, sample_rate: float = 0.01, dump_path: str = "/tmp", dump_seconds: float = 30, dump_interval: float = 0.01, max_dump_seconds: float = 300, metrics: typing.Optional[Metrics] = None):
+        self.__sample_rate = sample_rate
+        self.__dump_path = dump_path
+        self.__dump_seconds = dump_seconds
+        self.__dump_interval = dump_interval
+        self.__max_dump_seconds = max_dump_seconds
+        self.stage_time = Histogram("ew_stage_seconds", "Sampled time spent per worker stage and step.", ("stage", "step"))
+        if metrics:
+            metrics.add(self.stage_time)
+        self.__dump_thread: typing.Optional[threading.Thread] = None
+        self.__lock = threading.Lock()
+
+    def start(self, stage: str) -> typing.Optional[StageTimer]:
+        return StageTimer(stage) if random.random() < self.__sample_rate else None
+
+    def stop(self, timer: typing.Optional[StageTimer]):
+        if timer:
+            timer.stop()
+            self.stage_time.observe(timer.total, labels=(timer.stage, "total"))
+            for step, seconds in timer.steps.items():
+                self.stage_time.observe(seconds, labels=(timer.stage, step))
+
+    def __sample_stacks(self, seconds: float, path: str):
+        stacks = collections.Counter()
+        own_ident = threading.get_ident()
+        end = time.monotonic() + seconds
+        samples = 0
+        while time.monotonic() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = list()
+                while frame:
+                    stack.append(format_frame(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(self.__dump_interval)
+        with open(path, "w") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        util.logger.info(f"{Profiler.__log_msg_prefix}: wrote {samples} stack samples to '{path}'")
+
+    def __dump(self, seconds: float, path: str):
+        try:
+            self.__sample_stacks(seconds=seconds, path=path)
+        except Exception as ex:
+            util.logger.error(f"{Profiler.__log_err_msg_prefix}: dumping profile failed: reason={get_exception_str(ex)}")
+
+    def dump(self, seconds: typing.Optional[float] = None) -> typing.Optional[str]:
+        with self.__lock:
+            if self.__dump_thread and self.__dump_thread.is_alive():
+                return None
+            path = os.path.join(self.__dump_path, f"ew-profile-{os.getpid()}-{int(time.time())}.folded")
+            self.__dump_thread = threading.Thread(target=self.__dump, args=(seconds or self.__dump_seconds, path), name="profiler", daemon=True)
+            self.__dump_thread.start()
+        util.logger.info(f"{Profiler.__log_msg_prefix}: sampling stacks for {seconds or self.__dump_seconds}s ...")
+        return path
+
+    def handle_request(self, query: typing.Dict[str, typing.List[str]]) -> typing.Tuple[int, bytes]:
+        try:
+            seconds = float(query["seconds"][0]) if "seconds" in query else None
+        except ValueError:
+            return 400, b"invalid seconds\n"
+        if seconds is not None:
+            if not seconds > 0:
+                return 400, b"invalid seconds\n"
+            seconds = min(seconds, self.__max_dump_seconds)
+        path = self.dump(seconds=seconds)
+        if path is None:
+            return 409, b"profile already running\n"
+        return 202, f"{path}\n".encode()
+
+    def join(self):
+        if self.__dump_thread:
+            self.__dump_thread.join()
@@ -0,0 +1,153 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("RetryPolicy", "RetryPolicies", "CircuitBreakers", "ParkedPoints")
+
+import util
+import threading
+import typing
+import random
+import time
+
+influxdb = util.lazy_import("influxdb")
+requests = util.lazy_import("requests")
+asyncio = util.lazy_import("asyncio")
+
+
+closed_state = "closed"
+open_state = "open"
+half_open_state = "half-open"
+
+
+def is_transient(ex: Exception) -> bool:
+    if isinstance(ex, (influxdb.exceptions.InfluxDBServerError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    # raised by the async writer, which talks to InfluxDB over plain asyncio streams
+    return isinstance(ex, (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError))
+
+
+class RetryPolicy(typing.NamedTuple):
+    retries: int = 0
+    min_backoff: float = 0.5
+    max_backoff: float = 10.0
+
+    def get_backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.min_backoff * 2 ** attempt, self.max_backoff))
+
+
+class RetryPolicies:
+    def __init__(self, default: RetryPolicy, overrides: typing.Optional[typing.Dict[str, typing.Dict]] = None):
+        self.__default = default
+        self.__overrides = {db_name: default._replace(**args) for db_name, args in overrides.items()} if overrides else dict()
+
+    def get(self, db_name: str) -> RetryPolicy:
+        return self.__overrides.get(db_name, self.__default)
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.state = closed_state
+        self.failures = 0
+        self.opened = 0.0
+        self.trips = 0
+
+
+class CircuitBreakers:
+    __log_msg_prefix = "circuit breaker"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.__failure_threshold = failure_threshold
+        self.__reset_timeout = reset_timeout
+        self.__breakers: typing.Dict[str, CircuitBreaker] = dict()
+        self.__lock = threading.Lock()
+
+    def __get(self, db_name: str) -> CircuitBreaker:
+        if db_name not in self.__breakers:
+            self.__breakers[db_name] = CircuitBreaker()
+        return self.__breakers[db_name]
+
+    def allow(self, db_name: str) -> bool:
+        with self.__lock:
+            breaker = self.__get(db_name)
+            if breaker.state == closed_state:
+                return True
+            if breaker.state == open_state and time.monotonic() - breaker.opened >= self.__reset_timeout:
+                breaker.state = half_open_state
+                return True
+            return False
+
+    def success(self, db_name: str):
+        with self.__lock:
+            breaker = self.__get(db_name)
+            if breaker.state != closed_state:
+                util.logger.info(f"{CircuitBreakers.__log_msg_prefix}: closed: db_name={db_name}")
+            breaker.state = closed_state
+            breaker.failures = 0
+
+    def failure(self, db_name: str):
+        with self.__lock:
+            breaker = self.__get(db_name)
+            breaker.failures += 1
+            if breaker.state == half_open_state or breaker.failures >= self.__failure_threshold:
+                if breaker.state != open_state:
+                    breaker.trips += 1
+                    util.logger.warning(f"{CircuitBreakers.__log_msg_prefix}: opened: db_name={db_name} failures={breaker.failures}")
+                breaker.state = open_state
+                breaker.opened = time.monotonic()
+
+    @property
+    def states(self) -> typing.Dict[str, str]:
+        with self.__lock:
+            return {db_name: breaker.state for db_name, breaker in self.__breakers.items()}
+
+    @property
+    def trips(self) -> typing.Dict[str, int]:
+        with self.__lock:
+            return {db_name: breaker.trips for db_name, breaker in self.__breakers.items() if breaker.trips}
+
+
+class ParkedPoints:
+    def __init__(self, max_points: int = 100000):
+        self.__max_points = max_points
+        self.__points: typing.Dict[str, typing.List[typing.Tuple[typing.Optional[str], typing.List[bytes]]]] = dict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+    def put(self, points: typing.List[bytes], db_name: str, time_precision: typing.Optional[str]) -> bool:
+        with self.__lock:
+            if self.__size + len(points) > self.__max_points:
+                return False
+            self.__points.setdefault(db_name, list()).append((time_precision, points))
+            self.__size += len(points)
+            return True
+
+    def pop(self, db_name: str) -> typing.List[typing.Tuple[typing.Optional[str], typing.List[bytes]]]:
+        with self.__lock:
+            parked = self.__points.pop(db_name, list())
+            self.__size -= sum(len(points) for _, points in parked)
+            return parked
+
+    def pop_all(self) -> typing.Dict[str, typing.List[typing.Tuple[typing.Optional[str], typing.List[bytes]]]]:
+        with self.__lock:
+            parked = self.__points
+            self.__points = dict()
+            self.__size = 0
+            return parked
+
+    @property
+    def counts(self) -> typing.Dict[str, int]:
+        with self.__lock:
+            return {db_name: sum(len(points) for _, points in parked) for db_name, parked in self.__points.items()}
@@ -0,0 +1,192 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("FilterSnapshot", )
+
+from .util import get_exception_str
+from .filters import parse_filter_message, delete_method
+import util
+import confluent_kafka
+import typing
+import json
+import time
+import os
+
+
+class SnapshotMessage:
+    def __init__(self, topic: str, partition: int, offset: int, key: typing.Optional[bytes], value: bytes):
+        self.__topic = topic
+        self.__partition = partition
+        self.__offset = offset
+        self.__key = key
+        self.__value = value
+
+    def topic(self):
+        return self.__topic
+
+    def partition(self):
+        return self.__partition
+
+    def offset(self):
+        return self.__offset
+
+    def key(self):
+        return self.__key
+
+    def value(self):
+        return self.__value
+
+    def error(self):
+        return None
+
+    def headers(self):
+        return None
+
+    def timestamp(self):
+        return confluent_kafka.TIMESTAMP_NOT_AVAILABLE, -1
+
+
+class FilterSnapshot:
+    __log_msg_prefix = "filter snapshot"
+    __log_err_msg_prefix = f"{__log_msg_prefix} error"
+
+    def __init__(self, kafka_consumer: confluent_kafka.Consumer, path: str, interval: float = 60):
+        self.__kafka_consumer = kafka_consumer
+        self.__path = path
+        self.__interval = interval
+        self.__messages: typing.Dict[typing.Union[str, int], typing.List] = dict()
+        self.__offsets: typing.Dict[typing.Tuple[str, int], int] = dict()
+        self.__replay: typing.List[SnapshotMessage] = list()
+        self.__unkeyed = 0
+        self.__changed = False
+        self.__last_save = time.monotonic()
+        self.__load()
+
+    def __getattr__(self, item):
+        return getattr(self.__kafka_consumer, item)
+
+    def __load(self):
+        if not os.path.exists(self.__path):
+            return
+        try:
+            with open(self.__path, "r") as file:
+                snapshot = json.load(file)
+            for topic, partition, offset in snapshot["offsets"]:
+                self.__offsets[(topic, partition)] = offset
+            for key, topic, partition, offset, msg_key, value in snapshot["messages"]:
+                if key is None:
+                    key = self.__unkeyed
+                    self.__unkeyed += 1
+                self.__messages[key] = [topic, partition, offset, msg_key, value]
+            util.logger.info(f"{FilterSnapshot.__log_msg_prefix}: loaded '{self.__path}': messages={len(self.__messages)} offsets={self.__offsets}")
+        except Exception as ex:
+            util.logger.error(f"{FilterSnapshot.__log_err_msg_prefix}: loading '{self.__path}' failed: reason={get_exception_str(ex)}")
+            self.__messages.clear()
+            self.__offsets.clear()
+
+    def __save(self):
+        tmp_path = f"{self.__path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(
+                {
+                    "offsets": [[topic, partition, offset] for (topic, partition), offset in self.__offsets.items()],
+                    "messages": [[key if isinstance(key, str) else None] + msg for key, msg in self.__messages.items()]
+                },
+                file,
+                separators=(',', ':')
+            )
+        os.replace(tmp_path, self.__path)
+        self.__changed = False
+        self.__last_save = time.monotonic()
+
+    def __record(self, msg):
+        if msg.error() is not None or isinstance(msg, SnapshotMessage):
+            return
+        self.__offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        self.__changed = True
+        key, method = parse_filter_message(msg)
+        if method == delete_method:
+            # replaying starts from an empty filter set, deleted exports are simply left out
+            if key is not None:
+                self.__messages.pop(key, None)
+            return
+        if key is None:
+            key = self.__unkeyed
+            self.__unkeyed += 1
+        self.__messages.pop(key, None)
+        self.__messages[key] = [msg.topic(), msg.partition(), msg.offset(), msg.key().decode() if msg.key() is not None else None, msg.value().decode()]
+
+    def __maybe_save(self):
+        if self.__changed and time.monotonic() - self.__last_save >= self.__interval:
+            try:
+                self.__save()
+            except Exception as ex:
+                util.logger.error(f"{FilterSnapshot.__log_err_msg_prefix}: writing '{self.__path}' failed: reason={get_exception_str(ex)}")
+
+    def __set_offsets(self, partitions: typing.List[confluent_kafka.TopicPartition]):
+        for tp in partitions:
+            tp.offset = self.__offsets.get((tp.topic, tp.partition), confluent_kafka.OFFSET_BEGINNING)
+
+    def subscribe(self, topics: typing.List[str], *args, **kwargs):
+        for key in [key for key, msg in self.__messages.items() if msg[0] not in topics]:
+            del self.__messages[key]
+        for key in [key for key in self.__offsets if key[0] not in topics]:
+            del self.__offsets[key]
+        if self.__offsets:
+            self.__replay = [SnapshotMessage(topic, partition, offset, msg_key.encode() if msg_key is not None else None, value.encode()) for topic, partition, offset, msg_key, value in self.__messages.values()]
+            on_assign = kwargs.get("on_assign")
+
+            def on_assign_snapshot(consumer, partitions):
+                if on_assign:
+                    on_assign(consumer, partitions)
+                self.__set_offsets(partitions)
+                consumer.assign(partitions)
+
+            kwargs["on_assign"] = on_assign_snapshot
+        return self.__kafka_consumer.subscribe(topics, *args, **kwargs)
+
+    def assign(self, partitions: typing.List[confluent_kafka.TopicPartition]):
+        if self.__offsets:
+            self.__set_offsets(partitions)
+        return self.__kafka_consumer.assign(partitions)
+
+    def consume(self, num_messages: int = 1, *args, **kwargs):
+        if self.__replay:
+            msgs = self.__replay[:num_messages]
+            del self.__replay[:num_messages]
+            return msgs
+        msgs = self.__kafka_consumer.consume(num_messages, *args, **kwargs)
+        for msg in msgs:
+            self.__record(msg)
+        self.__maybe_save()
+        return msgs
+
+    def poll(self, *args, **kwargs):
+        if self.__replay:
+            return self.__replay.pop(0)
+        msg = self.__kafka_consumer.poll(*args, **kwargs)
+        if msg is not None:
+            self.__record(msg)
+        self.__maybe_save()
+        return msg
+
+    def close(self, *args, **kwargs):
+        if self.__changed:
+            try:
+                self.__save()
+            except Exception as ex:
+                util.logger.error(f"{FilterSnapshot.__log_err_msg_prefix}: writing '{self.__path}' failed: reason={get_exception_str(ex)}")
+        return self.__kafka_consumer.close(*args, **kwargs)
@@ -0,0 +1,188 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("WriteSpool", "SpoolFullError")
+
+from .util import get_exception_str
+import util
+import collections
+import threading
+import typing
+import struct
+import zlib
+import json
+import os
+
+record_header = struct.Struct("!4sII")
+record_magic = b"EWS1"
+
+
+class SpoolFullError(Exception):
+    def __init__(self, size: int, max_bytes: int):
+        super().__init__(f"spool full: size={size} max_bytes={max_bytes}")
+
+
+def encode_record(lines: typing.List[bytes], db_name: str, time_precision: typing.Optional[str]) -> bytes:
+    payload = json.dumps({"db_name": db_name, "time_precision": time_precision}, separators=(',', ':')).encode() + b"\n" + b"\n".join(lines)
+    return record_header.pack(record_magic, len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path: str) -> typing.Generator[typing.Tuple[typing.List[bytes], str, typing.Optional[str]], None, None]:
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(record_header.size)
+            if not header:
+                return
+            if len(header) < record_header.size:
+                raise ValueError(f"truncated record header in '{path}'")
+            magic, length, checksum = record_header.unpack(header)
+            if magic != record_magic:
+                raise ValueError(f"invalid record in '{path}'")
+            payload = file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                raise ValueError(f"corrupt record in '{path}'")
+            meta, _, data = payload.partition(b"\n")
+            meta = json.loads(meta)
+            yield data.split(b"\n"), meta["db_name"], meta["time_precision"]
+
+
+class WriteSpool:
+    __log_msg_prefix = "write spool"
+    __log_err_msg_prefix = f"{__log_msg_prefix} error"
+
+    def __init__(self, path: str, max_bytes: int = 1024 ** 3, segment_bytes: int = 64 * 1024 ** 2, min_backoff: float = 1.0, max_backoff: float = 60.0):
+        os.makedirs(path, exist_ok=True)
+        self.__path = path
+        self.__max_bytes = max_bytes
+        self.__segment_bytes = segment_bytes
+        self.__min_backoff = min_backoff
+        self.__max_backoff = max_backoff
+        self.__segments = collections.deque(sorted(int(name[:-4]) for name in os.listdir(path) if name.endswith(".seg")))
+        self.__size = sum(os.path.getsize(self.__segment_path(seq)) for seq in self.__segments)
+        self.__next_seq = self.__segments[-1] + 1 if self.__segments else 0
+        self.__recovered = set(self.__segments)
+        self.__records = dict()
+        self.__active = None
+        self.__active_seq = None
+        self.__active_size = 0
+        self.__lock = threading.Lock()
+        self.__data_event = threading.Event()
+        self.__stop_event = threading.Event()
+        self.__thread = None
+        if self.__segments:
+            util.logger.warning(f"{WriteSpool.__log_msg_prefix}: found spooled points: segments={len(self.__segments)} size={self.__size}")
+
+    def __segment_path(self, seq: int) -> str:
+        return os.path.join(self.__path, f"{seq:012d}.seg")
+
+    def __close_active(self):
+        if self.__active:
+            self.__active.close()
+            self.__active = None
+            self.__active_seq = None
+
+    @property
+    def pending(self) -> bool:
+        with self.__lock:
+            return bool(self.__segments)
+
+    def is_pending(self, db_name: str) -> bool:
+        with self.__lock:
+            return bool(self.__recovered) or any(db_name in records for records in self.__records.values())
+
+    @property
+    def size(self) -> int:
+        with self.__lock:
+            return self.__size
+
+    def put(self, lines: typing.List[bytes], db_name: str, time_precision: typing.Optional[str]):
+        record = encode_record(lines=lines, db_name=db_name, time_precision=time_precision)
+        with self.__lock:
+            if self.__max_bytes and self.__size + len(record) > self.__max_bytes:
+                raise SpoolFullError(size=self.__size, max_bytes=self.__max_bytes)
+            if self.__active is None or self.__active_size >= self.__segment_bytes:
+                self.__close_active()
+                self.__active_seq = self.__next_seq
+                self.__next_seq += 1
+                self.__active = open(self.__segment_path(self.__active_seq), "ab")
+                self.__active_size = 0
+                self.__segments.append(self.__active_seq)
+            self.__active.write(record)
+            self.__active.flush()
+            os.fsync(self.__active.fileno())
+            self.__active_size += len(record)
+            self.__size += len(record)
+            records = self.__records.setdefault(self.__active_seq, dict())
+            records[db_name] = records.get(db_name, 0) + 1
+        self.__data_event.set()
+
+    def __write(self, write: typing.Callable, lines: typing.List[bytes], db_name: str, time_precision: typing.Optional[str]) -> bool:
+        backoff = self.__min_backoff
+        while not self.__stop_event.is_set():
+            try:
+                write(lines, db_name, time_precision)
+                return True
+            except Exception as ex:
+                util.logger.warning(f"{WriteSpool.__log_msg_prefix}: draining points failed, retrying in {backoff}s: reason={get_exception_str(ex)}")
+                self.__stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.__max_backoff)
+        return False
+
+    def __drained(self, seq: int, db_name: str):
+        with self.__lock:
+            records = self.__records.get(seq)
+            if records and db_name in records:
+                records[db_name] -= 1
+                if records[db_name] <= 0:
+                    del records[db_name]
+
+    def __drain(self, write: typing.Callable[[typing.List[bytes], str, typing.Optional[str]], None]):
+        while not self.__stop_event.is_set():
+            with self.__lock:
+                seq = self.__segments[0] if self.__segments else None
+                if seq is not None and seq == self.__active_seq:
+                    self.__close_active()
+            if seq is None:
+                self.__data_event.wait(1)
+                self.__data_event.clear()
+                continue
+            path = self.__segment_path(seq)
+            try:
+                for lines, db_name, time_precision in read_records(path):
+                    if not self.__write(write=write, lines=lines, db_name=db_name, time_precision=time_precision):
+                        return
+                    self.__drained(seq=seq, db_name=db_name)
+            except Exception as ex:
+                util.logger.error(f"{WriteSpool.__log_err_msg_prefix}: reading segment failed, dropping remaining points: reason={get_exception_str(ex)} segment={path}")
+            with self.__lock:
+                self.__size -= os.path.getsize(path)
+                os.remove(path)
+                self.__segments.popleft()
+                self.__recovered.discard(seq)
+                self.__records.pop(seq, None)
+                if not self.__segments:
+                    util.logger.info(f"{WriteSpool.__log_msg_prefix}: drained")
+
+    def start(self, write: typing.Callable[[typing.List[bytes], str, typing.Optional[str]], None]):
+        self.__thread = threading.Thread(target=self.__drain, args=(write, ), name="spool-drain", daemon=True)
+        self.__thread.start()
+
+    def close(self):
+        self.__stop_event.set()
+        if self.__thread:
+            self.__thread.join()
+        with self.__lock:
+            self.__close_active()
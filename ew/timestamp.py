@@ -0,0 +1,165 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("get_timestamp_parser", )
+
+import calendar
+import datetime
+import typing
+import re
+
+iso_date_time_t = r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d"
+iso_date_time_space = r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d"
+iso_fraction = r"\.\d{1,6}"
+iso_offset = r"(?:Z|[+-]\d\d:?\d\d)"
+
+# format: (timezone aware, shape accepted by both datetime.fromisoformat and datetime.strptime)
+iso_formats = {
+    "%Y-%m-%dT%H:%M:%S": (False, iso_date_time_t),
+    "%Y-%m-%dT%H:%M:%S.%f": (False, iso_date_time_t + iso_fraction),
+    "%Y-%m-%d %H:%M:%S": (False, iso_date_time_space),
+    "%Y-%m-%d %H:%M:%S.%f": (False, iso_date_time_space + iso_fraction),
+    "%Y-%m-%dT%H:%M:%SZ": (True, iso_date_time_t + "Z"),
+    "%Y-%m-%dT%H:%M:%S.%fZ": (True, iso_date_time_t + iso_fraction + "Z"),
+    "%Y-%m-%dT%H:%M:%S%z": (True, iso_date_time_t + iso_offset),
+    "%Y-%m-%dT%H:%M:%S.%f%z": (True, iso_date_time_t + iso_fraction + iso_offset)
+}
+
+# same patterns as used by _strptime.TimeRE
+directive_patterns = {
+    "d": r"(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])",
+    "f": r"(?P<f>[0-9]{1,6})",
+    "H": r"(?P<H>2[0-3]|[0-1]\d|\d)",
+    "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "M": r"(?P<M>[0-5]\d|\d)",
+    "S": r"(?P<S>6[0-1]|[0-5]\d|\d)",
+    "y": r"(?P<y>\d\d)",
+    "Y": r"(?P<Y>\d\d\d\d)",
+    "z": r"(?P<z>[+-]\d\d:?[0-5]\d(:?[0-5]\d(\.\d{1,6})?)?|(?-i:Z))",
+    "A": "(?P<A>" + "|".join(calendar.day_name) + ")",
+    "a": "(?P<a>" + "|".join(calendar.day_abbr) + ")",
+    "B": "(?P<B>" + "|".join(calendar.month_name[1:]) + ")",
+    "b": "(?P<b>" + "|".join(calendar.month_abbr[1:]) + ")",
+    "%": "%"
+}
+
+month_numbers = {name.lower(): num for num, name in enumerate(calendar.month_name) if name}
+month_numbers.update({name.lower(): num for num, name in enumerate(calendar.month_abbr) if name})
+
+directive_regex = re.compile(r"%(.)")
+whitespace_regex = re.compile(r"\s+")
+
+parsers: typing.Dict[str, typing.Callable[[str], datetime.datetime]] = dict()
+
+
+def gen_iso_parser(fmt: str, tz_aware: bool, shape: str):
+    shape_regex = re.compile(shape)
+
+    def parse(timestamp: str) -> datetime.datetime:
+        # fromisoformat accepts more than strptime, only take the fast path for inputs of the exact shape
+        if shape_regex.fullmatch(timestamp):
+            try:
+                time_obj = datetime.datetime.fromisoformat(timestamp)
+                if (time_obj.tzinfo is not None) is tz_aware:
+                    return time_obj
+            except ValueError:
+                pass
+        return datetime.datetime.strptime(timestamp, fmt)
+
+    return parse
+
+
+def literal_pattern(text: str) -> str:
+    return r"\s+".join(re.escape(part) for part in whitespace_regex.split(text))
+
+
+def compile_format(fmt: str) -> typing.Optional[re.Pattern]:
+    pattern = list()
+    pos = 0
+    for match in directive_regex.finditer(fmt):
+        if match.group(1) not in directive_patterns:
+            return None
+        pattern.append(literal_pattern(fmt[pos:match.start()]))
+        pattern.append(directive_patterns[match.group(1)])
+        pos = match.end()
+    pattern.append(literal_pattern(fmt[pos:]))
+    try:
+        return re.compile("".join(pattern), re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def gen_regex_parser(fmt: str, regex: re.Pattern):
+    def parse(timestamp: str) -> datetime.datetime:
+        match = regex.fullmatch(timestamp)
+        if not match:
+            raise ValueError(f"time data {timestamp!r} does not match format {fmt!r}")
+        values = match.groupdict()
+        if values.get("Y"):
+            year = int(values["Y"])
+        elif values.get("y"):
+            year = int(values["y"])
+            year += 2000 if year <= 68 else 1900
+        else:
+            year = 1900
+        if values.get("m"):
+            month = int(values["m"])
+        elif values.get("B") or values.get("b"):
+            month = month_numbers[(values.get("B") or values["b"]).lower()]
+        else:
+            month = 1
+        tz = None
+        if values.get("z"):
+            z = values["z"]
+            if z == "Z":
+                tz = datetime.timezone.utc
+            else:
+                z, _, micro = z.replace(":", "").partition(".")
+                offset = datetime.timedelta(hours=int(z[1:3]), minutes=int(z[3:5]), seconds=int(z[5:7] or 0), microseconds=int(micro.ljust(6, "0")) if micro else 0)
+                tz = datetime.timezone(-offset if z[0] == "-" else offset)
+        return datetime.datetime(
+            year,
+            month,
+            int(values.get("d") or 1),
+            int(values.get("H") or 0),
+            int(values.get("M") or 0),
+            int(values.get("S") or 0),
+            int(values["f"].ljust(6, "0")) if values.get("f") else 0,
+            tz
+        )
+
+    return parse
+
+
+def gen_strptime_parser(fmt: str):
+    def parse(timestamp: str) -> datetime.datetime:
+        return datetime.datetime.strptime(timestamp, fmt)
+
+    return parse
+
+
+def get_timestamp_parser(fmt: str) -> typing.Callable[[str], datetime.datetime]:
+    try:
+        return parsers[fmt]
+    except KeyError:
+        pass
+    if fmt in iso_formats:
+        parser = gen_iso_parser(fmt, *iso_formats[fmt])
+    else:
+        regex = compile_format(fmt)
+        parser = gen_regex_parser(fmt=fmt, regex=regex) if regex else gen_strptime_parser(fmt=fmt)
+    parsers[fmt] = parser
+    return parser
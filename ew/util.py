@@ -16,22 +16,30 @@
 
 from .model import *
 from .converter import *
+from .line_protocol import *
+from .timestamp import *
+import itertools
 import traceback
-import datetime
 import typing
 
+builder_ids = itertools.count()
+
 influxdb_time_precision_values = ("s", "m", "ms", "u")
 
+aggregate_functions = ("mean", "min", "max", "last", "count")
+
 
 class WritePointsError(Exception):
     def __init__(self, points, ex):
         pts = dict()
         for point in points:
-            if point[InfluxDBPoint.measurement] not in pts:
-                pts[point[InfluxDBPoint.measurement]] = 1
+            measurement = get_measurement(point)
+            if measurement not in pts:
+                pts[measurement] = 1
             else:
-                pts[point[InfluxDBPoint.measurement]] += 1
+                pts[measurement] += 1
         super().__init__(f"writing points failed: reason={get_exception_str(ex)} points_per_measurement={pts}")
+        self.ex = ex
 
 
 class ValidateFilterError(Exception):
@@ -56,6 +64,21 @@ def validate_filter(filter: dict):
             for val in filter["args"][ExportArgs.type_casts].values():
                 if val not in type_casts:
                     return False
+        if ExportArgs.aggregation in filter["args"]:
+            aggregation = filter["args"][ExportArgs.aggregation]
+            window = aggregation[AggregationArgs.window]
+            if isinstance(window, bool) or not isinstance(window, (int, float)) or window <= 0:
+                return False
+            if AggregationArgs.delay in aggregation:
+                delay = aggregation[AggregationArgs.delay]
+                if isinstance(delay, bool) or not isinstance(delay, (int, float)) or delay < 0:
+                    return False
+            if AggregationArgs.functions in aggregation:
+                if not aggregation[AggregationArgs.functions]:
+                    return False
+                for val in aggregation[AggregationArgs.functions]:
+                    if val not in aggregate_functions:
+                        return False
         return True
     except Exception as ex:
         raise ValidateFilterError(ex)
@@ -65,28 +88,130 @@ def cast_type(key, val, cast_map):
     return type_casts[cast_map[key]](val) if key in cast_map and val is not None else val
 
 
-def convert_timestamp(timestamp: str, fmt: str, utc: bool):
-    time_obj = datetime.datetime.strptime(timestamp, fmt)
-    if utc:
-        return f"{time_obj.isoformat()}Z"
+def convert_timestamp(timestamp: str, fmt: str, precision: typing.Optional[str] = None) -> int:
+    return datetime_to_timestamp(time_obj=get_timestamp_parser(fmt)(timestamp), precision=precision)
+
+
+def encode_columns(rows: typing.List[typing.Dict], casts: typing.Optional[typing.Dict], time_key: typing.Optional[str], encode_value: typing.Callable, errors: typing.List[typing.Optional[Exception]]) -> typing.List[str]:
+    keys = set()
+    for row in rows:
+        keys.update(row)
+    keys.discard(time_key)
+    columns = list()
+    for key in sorted(keys):
+        escaped_key = escape_key(key)
+        prefix = f"{escaped_key}=" if escaped_key else None
+        cast = casts.get(key) if casts else None
+        column = [None] * len(rows)
+        for i, row in enumerate(rows):
+            val = row.get(key)
+            if val is not None:
+                try:
+                    if cast:
+                        val = cast(val)
+                    val = encode_value(val)
+                except Exception as ex:
+                    if errors[i] is None:
+                        errors[i] = ex
+                    continue
+                if prefix and val:
+                    column[i] = prefix + val
+        columns.append(column)
+    if not columns:
+        return [""] * len(rows)
+    return [",".join([item for item in items if item is not None]) for items in zip(*columns)]
+
+
+def compile_time_converter(time_format: typing.Optional[str] = None, time_precision: typing.Optional[str] = None) -> typing.Callable[[typing.Any], int]:
+    if time_format:
+        parse_timestamp = get_timestamp_parser(time_format)
+
+        def convert(timestamp):
+            return datetime_to_timestamp(parse_timestamp(timestamp), time_precision)
     else:
-        return f"{time_obj.isoformat()}"
-
-
-def gen_point(export_id, export_data, export_extra, cast_map: typing.Optional[typing.Dict] = None, time_key: typing.Optional[str] = None, time_format: typing.Optional[str] = None, utc: typing.Optional[bool] = None) -> typing.Dict:
-    point = {
-        InfluxDBPoint.measurement: export_id,
-        InfluxDBPoint.fields: {key: cast_type(key=key, val=val, cast_map=cast_map) for key, val in export_data.items()} if cast_map else export_data
-    }
-    if time_key:
-        if utc is None:
-            utc = True
-        point[InfluxDBPoint.time] = convert_timestamp(timestamp=export_extra[time_key], fmt=time_format, utc=utc) if time_format else export_extra[time_key]
-    if len(export_extra) > 1 and time_key:
-        point[InfluxDBPoint.tags] = {key: cast_type(key=key, val=val, cast_map=cast_map) for key, val in export_extra.items() if key != time_key} if cast_map else {key: val for key, val in export_extra.items() if key != time_key}
-    elif export_extra and not time_key:
-        point[InfluxDBPoint.tags] = {key: cast_type(key=key, val=val, cast_map=cast_map) for key, val in export_extra.items()} if cast_map else export_extra
-    return point
+        def convert(timestamp):
+            return convert_time(timestamp, time_precision)
+    return convert
+
+
+def encode_series_keys(rows: typing.List[typing.Dict], measurement: str, casts: typing.Optional[typing.Dict], time_key: typing.Optional[str], errors: typing.List[typing.Optional[Exception]]) -> typing.List[str]:
+    tags = encode_columns(rows, casts, time_key, escape_tag_value, errors)
+    return [f"{measurement},{tags[i]}" if tags[i] else measurement for i in range(len(rows))]
+
+
+def compile_batch_point_builder(export_id, cast_map: typing.Optional[typing.Dict] = None, time_key: typing.Optional[str] = None, time_format: typing.Optional[str] = None, time_precision: typing.Optional[str] = None, tag_cache=None) -> typing.Callable[..., typing.List[typing.Union[bytes, Exception]]]:
+    measurement = escape_key(export_id)
+    builder_id = (export_id, next(builder_ids))
+    casts = {key: type_casts[val] for key, val in cast_map.items()} if cast_map else None
+    convert = compile_time_converter(time_format=time_format if time_key else None, time_precision=time_precision)
+
+    def get_series_keys(extras, errors):
+        keys = list()
+        rows_by_key = dict()
+        unhashable = list()
+        for i, export_extra in enumerate(extras):
+            # value types are part of the key, 1, 1.0 and True compare equal but encode differently
+            key = (builder_id, tuple([(tag, type(val), val) for tag, val in export_extra.items() if tag != time_key]))
+            try:
+                rows_by_key.setdefault(key, i)
+            except TypeError:
+                key = None
+                unhashable.append(i)
+            keys.append(key)
+        unique_keys = list(rows_by_key)
+        cached = dict(zip(unique_keys, tag_cache.get_many(unique_keys)))
+        missing = [key for key in unique_keys if cached[key] is None]
+        if missing:
+            missing_errors = [None] * len(missing)
+            encoded = encode_series_keys([extras[rows_by_key[key]] for key in missing], measurement, casts, time_key, missing_errors)
+            new_items = dict()
+            for key, series_key, ex in zip(missing, encoded, missing_errors):
+                cached[key] = ex or series_key
+                if ex is None:
+                    new_items[key] = series_key
+            tag_cache.put_many(new_items)
+        series_keys = list()
+        for i, key in enumerate(keys):
+            series_key = cached.get(key)
+            if isinstance(series_key, Exception):
+                if errors[i] is None:
+                    errors[i] = series_key
+                series_key = None
+            series_keys.append(series_key)
+        if unhashable:
+            unhashable_errors = [None] * len(unhashable)
+            for i, series_key, ex in zip(unhashable, encode_series_keys([extras[i] for i in unhashable], measurement, casts, time_key, unhashable_errors), unhashable_errors):
+                series_keys[i] = series_key
+                if ex is not None and errors[i] is None:
+                    errors[i] = ex
+        return series_keys
+
+    def build_points(rows, timer=None):
+        errors = [None] * len(rows)
+        extras = [export_extra for _, export_extra in rows]
+        series_keys = get_series_keys(extras, errors) if tag_cache is not None else encode_series_keys(extras, measurement, casts, time_key, errors)
+        fields = encode_columns([export_data for export_data, _ in rows], casts, None, encode_field_value, errors)
+        if timer:
+            timer.mark("encode")
+        if time_key:
+            timestamps = list()
+            for i, (_, export_extra) in enumerate(rows):
+                try:
+                    timestamps.append(f" {convert(export_extra[time_key])}")
+                except Exception as ex:
+                    timestamps.append(None)
+                    if errors[i] is None:
+                        errors[i] = ex
+        else:
+            timestamps = [""] * len(rows)
+        if timer:
+            timer.mark("timestamps")
+        points = [errors[i] or f"{series_keys[i]} {fields[i]}{timestamps[i]}".encode() for i in range(len(rows))]
+        if timer:
+            timer.mark("lines")
+        return points
+
+    return build_points
 
 
 def get_exception_str(ex):
@@ -18,13 +18,30 @@ __all__ = ("ExportWorker", )
 
 from .util import *
 from .model import *
+from .offsets import OffsetTracker
+from .writer import WriterPool
+from .builder import PointBuilders, gen_point_builder
+from .dead_letter import DeadLetterSink
+from .metrics import ExportMetrics, Counter, Gauge
+from .batching import BatchController
+from .buffer import WriteBuffer
+from .spool import WriteSpool
+from .databases import KnownDatabases
+from .aio import AsyncWriter
+from .profiling import Profiler
+from .aggregation import WindowAggregator, WindowState
+from .retry import RetryPolicies, CircuitBreakers, ParkedPoints, is_transient
 import util
 import ew_lib
 import mf_lib
-import influxdb
 import threading
+import queue
 import typing
 import logging
+import time
+
+influxdb = util.lazy_import("influxdb")
+asyncio = util.lazy_import("asyncio")
 
 
 class ExportWorker:
@@ -32,72 +49,432 @@ class ExportWorker:
     __log_err_msg_prefix = f"{__log_msg_prefix} error"
     __influxdb_err_status_codes = (400, 413)
 
-    def __init__(self, influxdb_client: influxdb.InfluxDBClient, data_client: ew_lib.DataClient, filter_client: ew_lib.FilterClient, get_data_timeout: float = 5.0, get_data_limit: int = 10000):
+    def __init__(self, influxdb_client: "influxdb.InfluxDBClient", data_client: ew_lib.DataClient, filter_client: ew_lib.FilterClient, get_data_timeout: float = 5.0, get_data_limit: int = 10000, offset_tracker: typing.Optional[OffsetTracker] = None, pipeline_queue_size: int = 0, writer_pool: typing.Optional[WriterPool] = None, point_builders: typing.Optional[PointBuilders] = None, gzip_level: int = 0, max_request_bytes: int = 0, max_request_points: int = 0, dead_letter_sink: typing.Optional[DeadLetterSink] = None, metrics: typing.Optional[ExportMetrics] = None, batch_controller: typing.Optional[BatchController] = None, write_buffer: typing.Optional[WriteBuffer] = None, write_spool: typing.Optional[WriteSpool] = None, spool_influxdb_client: typing.Optional["influxdb.InfluxDBClient"] = None, retry_policies: typing.Optional[RetryPolicies] = None, circuit_breakers: typing.Optional[CircuitBreakers] = None, parked_points: typing.Optional[ParkedPoints] = None, known_databases: typing.Optional[KnownDatabases] = None, async_writer: typing.Optional[AsyncWriter] = None, partition_lanes: int = 0, window_aggregation: bool = False, window_retention: float = 600.0, window_state: typing.Optional[WindowState] = None, profiler: typing.Optional[Profiler] = None):
+        if pipeline_queue_size > 0 and not offset_tracker:
+            raise ValueError("pipelined export consumption requires an offset tracker")
+        if write_buffer and not offset_tracker:
+            raise ValueError("buffered writes require an offset tracker")
+        if partition_lanes > 0 and not (offset_tracker and offset_tracker.partition_batches):
+            raise ValueError("partition lanes require an offset tracker with partition batches")
+        if partition_lanes > 0 and write_buffer:
+            raise ValueError("partition lanes can not be combined with buffered writes")
+        if async_writer and (writer_pool or circuit_breakers):
+            raise ValueError("async writer can not be combined with a writer pool or circuit breakers")
+        if circuit_breakers and not write_spool:
+            # parked points already had their offsets stored, without a spool they would be lost on overflow or shutdown
+            raise ValueError("circuit breakers require a write spool")
+        if write_spool and not spool_influxdb_client:
+            raise ValueError("write spool requires a separate influxdb client for draining")
+        if window_aggregation and not offset_tracker:
+            raise ValueError("window aggregation requires an offset tracker")
         self.__influxdb_client = influxdb_client
         self.__data_client = data_client
         self.__filter_client = filter_client
         self.__filter_sync_event = threading.Event()
         self.__get_data_timeout = get_data_timeout
         self.__get_data_limit = get_data_limit
+        self.__offset_tracker = offset_tracker
+        self.__pipeline_queue_size = pipeline_queue_size
+        self.__writer_pool = writer_pool
+        self.__point_builders = point_builders
+        self.__gzip_level = gzip_level
+        self.__max_request_bytes = max_request_bytes
+        self.__max_request_points = max_request_points
+        self.__dead_letter_sink = dead_letter_sink or DeadLetterSink()
+        self.__metrics = metrics
+        self.__batch_controller = batch_controller
+        self.__write_buffer = write_buffer
+        self.__write_spool = write_spool
+        self.__spool_influxdb_client = spool_influxdb_client
+        self.__retry_policies = retry_policies
+        self.__circuit_breakers = circuit_breakers
+        self.__parked_points = parked_points or (ParkedPoints() if circuit_breakers else None)
+        self.__known_databases = known_databases
+        self.__async_writer = async_writer
+        self.__partition_lanes = partition_lanes
+        self.__profiler = profiler
+        # every partition lane keeps its own windows so released offsets always belong to the lane storing them
+        self.__window_aggregators = [WindowAggregator(retention=window_retention, state=window_state, source=num) for num in range(max(partition_lanes, 1))] if window_aggregation else list()
+        self.__window_aggregator = self.__window_aggregators[0] if self.__window_aggregators else None
+        self.__consumed = 0
+        if metrics:
+            if offset_tracker:
+                metrics.add_offset_tracker(offset_tracker)
+            metrics.add_dead_letter_sink(self.__dead_letter_sink)
+            if batch_controller:
+                metrics.add(Gauge("ew_batch_limit", "Current get_exports_batch limit.", callback=lambda: {(): batch_controller.limit}))
+                metrics.add(Gauge("ew_batch_timeout_seconds", "Current get_exports_batch timeout.", callback=lambda: {(): batch_controller.timeout}))
+            if circuit_breakers:
+                metrics.add(Gauge("ew_circuit_open", "Circuit breaker state per database (1 = open or half-open).", ("db_name", ), callback=lambda: {(db_name, ): int(state != "closed") for db_name, state in circuit_breakers.states.items()}))
+                metrics.add(Counter("ew_circuit_trips_total", "Circuit breaker transitions to open per database.", ("db_name", ), callback=lambda: {(db_name, ): count for db_name, count in circuit_breakers.trips.items()}))
+                metrics.add(Gauge("ew_parked_points", "Points parked in memory per database.", ("db_name", ), callback=lambda: {(db_name, ): count for db_name, count in self.__parked_points.counts.items()}))
+            if write_spool:
+                metrics.add(Gauge("ew_spool_bytes", "Bytes held in the write spool.", callback=lambda: {(): write_spool.size}))
+            if write_buffer:
+                metrics.add(Gauge("ew_buffered_points", "Points held in the write buffer.", callback=lambda: {(): write_buffer.size}))
+            if window_aggregation:
+                metrics.add(Gauge("ew_aggregation_open_series", "Series held in open aggregation windows.", callback=lambda: {(): sum(window_aggregator.pending for window_aggregator in self.__window_aggregators)}))
+                metrics.add(Counter("ew_aggregation_late_points_total", "Filter results dropped because their aggregation window was already closed.", callback=lambda: {(): sum(window_aggregator.late for window_aggregator in self.__window_aggregators)}))
         self.__filter_sync_err = False
         self.__stop = False
         self.__stopped = False
 
-    def _gen_points_batch(self, exports_batch: typing.List[mf_lib.FilterResult]):
-        points_batch = dict()
+    def __get_point_builder(self, export_id: str):
+        if self.__point_builders:
+            return self.__point_builders.get(export_id) or self.__point_builders.put(export_id=export_id, export_args=self.__filter_client.handler.get_filter_args(id=export_id))
+        return gen_point_builder(export_id=export_id, export_args=self.__filter_client.handler.get_filter_args(id=export_id))
+
+    def _gen_points_batch(self, exports_batch: typing.List[mf_lib.FilterResult], window_aggregator: typing.Optional[WindowAggregator] = None):
+        window_aggregator = window_aggregator or self.__window_aggregator
+        start = time.perf_counter()
+        timer = self.__profiler.start("gen") if self.__profiler else None
+        rows = dict()
+        slots = list()
         for result in exports_batch:
             if result.ex:
                 util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: generating points failed: reason={get_exception_str(result.ex)} export_ids={result.filter_ids}")
             else:
                 for export_id in result.filter_ids:
-                    try:
-                        export_args = self.__filter_client.handler.get_filter_args(id=export_id)
-                        db_name = export_args[ExportArgs.db_name]
-                        time_precision = export_args.get(ExportArgs.time_precision)
-                        if db_name not in points_batch:
-                            points_batch[db_name] = {time_precision: list()}
-                        if time_precision not in points_batch[db_name]:
-                            points_batch[db_name][time_precision] = list()
-                        points_batch[db_name][time_precision].append(gen_point(
-                            export_id=export_id,
-                            export_data=result.data,
-                            export_extra=result.extra,
-                            cast_map=export_args.get(ExportArgs.type_casts),
-                            time_key=export_args.get(ExportArgs.time_key),
-                            time_format=export_args.get(ExportArgs.time_format),
-                            utc=export_args.get(ExportArgs.utc)
-                        ))
-                    except Exception as ex:
-                        util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: generating point failed: reason={get_exception_str(ex)} export_id={export_id}")
+                    if export_id not in rows:
+                        rows[export_id] = list()
+                    slots.append((export_id, len(rows[export_id])))
+                    rows[export_id].append((result.data, result.extra))
+        if timer:
+            timer.mark("group")
+        builders = dict()
+        points = dict()
+        for export_id, export_rows in rows.items():
+            try:
+                builders[export_id] = self.__get_point_builder(export_id=export_id)
+                if timer:
+                    timer.mark("lookup")
+                if builders[export_id].aggregation:
+                    if not window_aggregator:
+                        raise RuntimeError("window aggregation is not enabled")
+                    points[export_id] = window_aggregator.add(export_id=export_id, builder=builders[export_id], rows=export_rows)
+                else:
+                    points[export_id] = builders[export_id].build_batch(export_rows, timer)
+            except Exception as ex:
+                points[export_id] = [ex] * len(export_rows)
+        points_batch = dict()
+        pts_count = dict() if self.__metrics else None
+        err_count = 0
+        for export_id, i in slots:
+            point = points[export_id][i]
+            if isinstance(point, Exception):
+                err_count += 1
+                util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: generating point failed: reason={get_exception_str(point)} export_id={export_id}")
+                continue
+            if point is None:
+                continue
+            builder = builders[export_id]
+            if builder.db_name not in points_batch:
+                points_batch[builder.db_name] = {builder.time_precision: list()}
+            if builder.time_precision not in points_batch[builder.db_name]:
+                points_batch[builder.db_name][builder.time_precision] = list()
+            points_batch[builder.db_name][builder.time_precision].append(point)
+            if pts_count is not None:
+                key = (builder.db_name, export_id) if self.__metrics.export_labels else (builder.db_name, )
+                pts_count[key] = pts_count.get(key, 0) + 1
+        if timer:
+            timer.mark("assemble")
+            self.__profiler.stop(timer)
+        if self.__metrics:
+            self.__metrics.points.inc_many(pts_count)
+            self.__metrics.point_errors.inc(err_count)
+            self.__metrics.gen_time.observe(time.perf_counter() - start)
         return points_batch
 
-    def _write_points(self, points: typing.List[typing.Dict], db_name: str, time_precision: str, is_retry=False):
+    def __close_windows(self, window_aggregator: typing.Optional[WindowAggregator], points_batch: typing.Optional[typing.Dict], offsets: typing.Optional[typing.List], force: bool = False):
+        if not window_aggregator:
+            return points_batch, offsets
+        closed, offsets = window_aggregator.pop(offsets=offsets, force=force)
+        if not closed:
+            return points_batch, offsets
+        if points_batch is None:
+            points_batch = dict()
+        for export_id, (builder, points) in closed.items():
+            count = 0
+            for point in points:
+                if isinstance(point, Exception):
+                    util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: generating aggregated point failed: reason={get_exception_str(point)} export_id={export_id}")
+                    continue
+                if builder.db_name not in points_batch:
+                    points_batch[builder.db_name] = {builder.time_precision: list()}
+                if builder.time_precision not in points_batch[builder.db_name]:
+                    points_batch[builder.db_name][builder.time_precision] = list()
+                points_batch[builder.db_name][builder.time_precision].append(point)
+                count += 1
+            if self.__metrics:
+                self.__metrics.points.inc(count, labels=(builder.db_name, export_id) if self.__metrics.export_labels else (builder.db_name, ))
+        return points_batch, offsets
+
+    def __flush_windows(self):
+        # partial windows are written for visibility, their offsets stay unstored so a restart rebuilds them in full
+        points_batch = None
+        for window_aggregator in self.__window_aggregators:
+            points_batch, _ = self.__close_windows(window_aggregator=window_aggregator, points_batch=points_batch, offsets=None, force=True)
+        if points_batch:
+            util.logger.info(f"{ExportWorker.__log_msg_prefix}: flushing open aggregation windows ...")
+            try:
+                self._write_points_batch(points_batch=points_batch)
+            except Exception as ex:
+                util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: flushing aggregation windows failed: reason={get_exception_str(ex)}")
+
+    def __write_lines(self, influxdb_client: "influxdb.InfluxDBClient", lines: typing.List[bytes], db_name: str, time_precision: str):
+        if not self.__metrics:
+            write_lines(influxdb_client=influxdb_client, lines=lines, database=db_name, time_precision=time_precision, gzip_level=self.__gzip_level)
+            return
+        start = time.perf_counter()
+        try:
+            self.__metrics.write_bytes.observe(write_lines(influxdb_client=influxdb_client, lines=lines, database=db_name, time_precision=time_precision, gzip_level=self.__gzip_level))
+        except influxdb.client.InfluxDBClientError as ex:
+            self.__metrics.write_errors.inc(labels=(db_name, ex.code))
+            raise
+        except Exception:
+            self.__metrics.write_errors.inc(labels=(db_name, None))
+            raise
+        finally:
+            self.__metrics.write_time.observe(time.perf_counter() - start, labels=(db_name, ))
+
+    def _write_points(self, points: typing.List[bytes], db_name: str, time_precision: str, is_retry=False, influxdb_client: typing.Optional["influxdb.InfluxDBClient"] = None):
+        influxdb_client = influxdb_client or self.__influxdb_client
         try:
-            self.__influxdb_client.write_points(points=points, time_precision=time_precision, database=db_name)
+            if self.__known_databases and not is_retry:
+                self.__known_databases.ensure(db_name=db_name)
+            self.__write_lines(influxdb_client=influxdb_client, lines=points, db_name=db_name, time_precision=time_precision)
         except influxdb.client.InfluxDBClientError as ex:
             if ex.code == 404:
                 if not is_retry:
-                    self.__influxdb_client.create_database(dbname=db_name)
-                    self._write_points(points=points, db_name=db_name, time_precision=time_precision, is_retry=True)
+                    try:
+                        influxdb_client.create_database(dbname=db_name)
+                    except Exception as create_ex:
+                        raise WritePointsError(points, create_ex)
+                    if self.__known_databases:
+                        self.__known_databases.add(db_name=db_name)
+                    if self.__metrics:
+                        self.__metrics.retries.inc(labels=(db_name, ))
+                    self._write_points(points=points, db_name=db_name, time_precision=time_precision, is_retry=True, influxdb_client=influxdb_client)
                 else:
                     raise WritePointsError(points, ex)
             elif ex.code in ExportWorker.__influxdb_err_status_codes:
-                util.logger.warning(f"{ExportWorker.__log_msg_prefix}: writing points batch failed, writing points per measurement ...")
-                groups = dict()
-                for point in points:
-                    if point[InfluxDBPoint.measurement] not in groups:
-                        groups[point[InfluxDBPoint.measurement]] = list()
-                    groups[point[InfluxDBPoint.measurement]].append(point)
-                for group in groups.values():
+                util.logger.warning(f"{ExportWorker.__log_msg_prefix}: writing points batch failed, bisecting points ...")
+                if self.__metrics:
+                    self.__metrics.splits.inc(labels=(db_name, ex.code))
+                self.__write_bisect(points=sorted(points, key=get_measurement), db_name=db_name, time_precision=time_precision, influxdb_client=influxdb_client, ex=ex)
+            else:
+                raise WritePointsError(points, ex)
+        except Exception as ex:
+            raise WritePointsError(points, ex)
+
+    def __write_bisect(self, points: typing.List[bytes], db_name: str, time_precision: str, influxdb_client: "influxdb.InfluxDBClient", ex: "influxdb.client.InfluxDBClientError"):
+        if len(points) == 1:
+            self.__dead_letter_sink.put(lines=points, db_name=db_name, time_precision=time_precision, reason=get_exception_str(ex))
+            return
+        mid = len(points) // 2
+        for half in (points[:mid], points[mid:]):
+            try:
+                self.__write_lines(influxdb_client=influxdb_client, lines=half, db_name=db_name, time_precision=time_precision)
+            except influxdb.client.InfluxDBClientError as half_ex:
+                if half_ex.code in ExportWorker.__influxdb_err_status_codes:
+                    if self.__metrics:
+                        self.__metrics.splits.inc(labels=(db_name, half_ex.code))
+                    self.__write_bisect(points=half, db_name=db_name, time_precision=time_precision, influxdb_client=influxdb_client, ex=half_ex)
+                else:
+                    raise WritePointsError(half, half_ex)
+            except Exception as half_ex:
+                raise WritePointsError(half, half_ex)
+
+    def __write_retry(self, points: typing.List[bytes], db_name: str, time_precision: str, influxdb_client: typing.Optional["influxdb.InfluxDBClient"] = None):
+        policy = self.__retry_policies.get(db_name) if self.__retry_policies else None
+        attempt = 0
+        while True:
+            try:
+                self._write_points(points=points, db_name=db_name, time_precision=time_precision, influxdb_client=influxdb_client)
+                return
+            except WritePointsError as ex:
+                if not policy or attempt >= policy.retries or not is_transient(ex.ex) or self.__stop:
+                    raise
+                backoff = policy.get_backoff(attempt)
+                util.logger.warning(f"{ExportWorker.__log_msg_prefix}: writing points failed, retrying in {backoff:.2f}s: reason={get_exception_str(ex.ex)} db_name={db_name}")
+                if self.__metrics:
+                    self.__metrics.transient_retries.inc(labels=(db_name, ))
+                time.sleep(backoff)
+                attempt += 1
+
+    def __park(self, points: typing.List[bytes], db_name: str, time_precision: str):
+        if not self.__parked_points.put(points=points, db_name=db_name, time_precision=time_precision):
+            self.__write_spool.put(lines=points, db_name=db_name, time_precision=time_precision)
+
+    def __write_chunk(self, points: typing.Optional[typing.List[bytes]], db_name: str, time_precision: str, influxdb_client: typing.Optional["influxdb.InfluxDBClient"] = None):
+        if self.__write_spool and self.__write_spool.is_pending(db_name):
+            if points:
+                self.__write_spool.put(lines=points, db_name=db_name, time_precision=time_precision)
+            return
+        if self.__circuit_breakers:
+            if not self.__circuit_breakers.allow(db_name):
+                if points:
+                    self.__park(points=points, db_name=db_name, time_precision=time_precision)
+                return
+            chunks = self.__parked_points.pop(db_name) + ([(time_precision, points)] if points else [])
+            for i, (chunk_time_precision, chunk) in enumerate(chunks):
+                try:
+                    self.__write_retry(points=chunk, db_name=db_name, time_precision=chunk_time_precision, influxdb_client=influxdb_client)
+                except WritePointsError as ex:
+                    self.__circuit_breakers.failure(db_name)
+                    util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: {ex}, parking points: db_name={db_name}")
+                    for parked_time_precision, parked in chunks[i:]:
+                        self.__park(points=parked, db_name=db_name, time_precision=parked_time_precision)
+                    return
+            self.__circuit_breakers.success(db_name)
+            return
+        try:
+            self.__write_retry(points=points, db_name=db_name, time_precision=time_precision, influxdb_client=influxdb_client)
+        except WritePointsError as ex:
+            if not self.__write_spool:
+                raise
+            util.logger.warning(f"{ExportWorker.__log_msg_prefix}: {ex}, spooling points ...")
+            self.__write_spool.put(lines=points, db_name=db_name, time_precision=time_precision)
+
+    def _drain_spool(self, points: typing.List[bytes], db_name: str, time_precision: str):
+        if self.__circuit_breakers and not self.__circuit_breakers.allow(db_name):
+            raise RuntimeError(f"circuit open: db_name={db_name}")
+        try:
+            self._write_points(points=points, db_name=db_name, time_precision=time_precision, influxdb_client=self.__spool_influxdb_client)
+        except WritePointsError as ex:
+            if is_transient(ex.ex):
+                if self.__circuit_breakers:
+                    self.__circuit_breakers.failure(db_name)
+                raise
+            # retrying a rejected record would block every segment behind it
+            util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: {ex}, dead-lettering spooled points: db_name={db_name}")
+            self.__dead_letter_sink.put(lines=points, db_name=db_name, time_precision=time_precision, reason=get_exception_str(ex.ex))
+            return
+        if self.__circuit_breakers:
+            self.__circuit_breakers.success(db_name)
+
+    def __release_parked(self):
+        for db_name, parked in self.__parked_points.pop_all().items():
+            for time_precision, points in parked:
+                try:
+                    self.__write_spool.put(lines=points, db_name=db_name, time_precision=time_precision)
+                except Exception as ex:
+                    util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: spooling parked points failed, dead-lettering points: reason={get_exception_str(ex)} db_name={db_name}")
+                    self.__dead_letter_sink.put(lines=points, db_name=db_name, time_precision=time_precision, reason=get_exception_str(ex))
+
+    async def __write_lines_async(self, lines: typing.List[bytes], db_name: str, time_precision: str):
+        if not self.__metrics:
+            await self.__async_writer.write_lines(lines=lines, database=db_name, time_precision=time_precision, gzip_level=self.__gzip_level)
+            return
+        start = time.perf_counter()
+        try:
+            self.__metrics.write_bytes.observe(await self.__async_writer.write_lines(lines=lines, database=db_name, time_precision=time_precision, gzip_level=self.__gzip_level))
+        except influxdb.client.InfluxDBClientError as ex:
+            self.__metrics.write_errors.inc(labels=(db_name, ex.code))
+            raise
+        except Exception:
+            self.__metrics.write_errors.inc(labels=(db_name, None))
+            raise
+        finally:
+            self.__metrics.write_time.observe(time.perf_counter() - start, labels=(db_name, ))
+
+    async def _write_points_async(self, points: typing.List[bytes], db_name: str, time_precision: str, is_retry=False):
+        try:
+            if self.__known_databases and not is_retry and db_name not in self.__known_databases:
+                await self.__async_writer.create_database(dbname=db_name)
+                self.__known_databases.add(db_name=db_name)
+            await self.__write_lines_async(lines=points, db_name=db_name, time_precision=time_precision)
+        except influxdb.client.InfluxDBClientError as ex:
+            if ex.code == 404:
+                if not is_retry:
                     try:
-                        self.__influxdb_client.write_points(points=group, time_precision=time_precision, database=db_name)
-                    except influxdb.client.InfluxDBClientError as ex:
-                        util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: {WritePointsError(group, ex)}")
+                        await self.__async_writer.create_database(dbname=db_name)
+                    except Exception as create_ex:
+                        raise WritePointsError(points, create_ex)
+                    if self.__known_databases:
+                        self.__known_databases.add(db_name=db_name)
+                    if self.__metrics:
+                        self.__metrics.retries.inc(labels=(db_name, ))
+                    await self._write_points_async(points=points, db_name=db_name, time_precision=time_precision, is_retry=True)
+                else:
+                    raise WritePointsError(points, ex)
+            elif ex.code in ExportWorker.__influxdb_err_status_codes:
+                util.logger.warning(f"{ExportWorker.__log_msg_prefix}: writing points batch failed, bisecting points ...")
+                if self.__metrics:
+                    self.__metrics.splits.inc(labels=(db_name, ex.code))
+                await self.__write_bisect_async(points=sorted(points, key=get_measurement), db_name=db_name, time_precision=time_precision, ex=ex)
             else:
                 raise WritePointsError(points, ex)
+        except WritePointsError:
+            raise
         except Exception as ex:
             raise WritePointsError(points, ex)
 
+    async def __write_bisect_async(self, points: typing.List[bytes], db_name: str, time_precision: str, ex: "influxdb.client.InfluxDBClientError"):
+        if len(points) == 1:
+            self.__dead_letter_sink.put(lines=points, db_name=db_name, time_precision=time_precision, reason=get_exception_str(ex))
+            return
+        mid = len(points) // 2
+        for half in (points[:mid], points[mid:]):
+            try:
+                await self.__write_lines_async(lines=half, db_name=db_name, time_precision=time_precision)
+            except influxdb.client.InfluxDBClientError as half_ex:
+                if half_ex.code in ExportWorker.__influxdb_err_status_codes:
+                    if self.__metrics:
+                        self.__metrics.splits.inc(labels=(db_name, half_ex.code))
+                    await self.__write_bisect_async(points=half, db_name=db_name, time_precision=time_precision, ex=half_ex)
+                else:
+                    raise WritePointsError(half, half_ex)
+            except Exception as half_ex:
+                raise WritePointsError(half, half_ex)
+
+    async def __spool_async(self, points: typing.List[bytes], db_name: str, time_precision: str):
+        # spooling syncs to disk, keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.__write_spool.put(lines=points, db_name=db_name, time_precision=time_precision))
+
+    async def __write_chunk_async(self, points: typing.List[bytes], db_name: str, time_precision: str):
+        if self.__write_spool and self.__write_spool.is_pending(db_name):
+            await self.__spool_async(points=points, db_name=db_name, time_precision=time_precision)
+            return
+        policy = self.__retry_policies.get(db_name) if self.__retry_policies else None
+        attempt = 0
+        while True:
+            try:
+                await self._write_points_async(points=points, db_name=db_name, time_precision=time_precision)
+                return
+            except WritePointsError as ex:
+                if policy and attempt < policy.retries and is_transient(ex.ex) and not self.__stop:
+                    backoff = policy.get_backoff(attempt)
+                    util.logger.warning(f"{ExportWorker.__log_msg_prefix}: writing points failed, retrying in {backoff:.2f}s: reason={get_exception_str(ex.ex)} db_name={db_name}")
+                    if self.__metrics:
+                        self.__metrics.transient_retries.inc(labels=(db_name, ))
+                    await asyncio.sleep(backoff)
+                    attempt += 1
+                    continue
+                if not self.__write_spool:
+                    raise
+                util.logger.warning(f"{ExportWorker.__log_msg_prefix}: {ex}, spooling points ...")
+                await self.__spool_async(points=points, db_name=db_name, time_precision=time_precision)
+                return
+
+    async def __write_points_batch_async(self, points_batch: typing.Dict):
+        coros = list()
+        for db_name, batch in points_batch.items():
+            for time_precision, points in batch.items():
+                for chunk in chunk_lines(lines=points, max_bytes=self.__max_request_bytes, max_lines=self.__max_request_points):
+                    coros.append(self.__write_chunk_async(points=chunk, db_name=db_name, time_precision=time_precision))
+        err = None
+        for result in await asyncio.gather(*coros, return_exceptions=True):
+            if isinstance(result, BaseException):
+                if not isinstance(result, WritePointsError):
+                    raise result
+                if err:
+                    util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: {result}")
+                else:
+                    err = result
+        if err:
+            raise err
+
     def _write_points_batch(self, points_batch: typing.Dict):
         if util.logger.level == logging.DEBUG:
             pts_total = 0
@@ -105,9 +482,234 @@ class ExportWorker:
                 for pts in b.values():
                     pts_total += len(pts)
             util.logger.debug(f"{ExportWorker.__log_msg_prefix}: writing points batch: points_total={pts_total}")
-        for db_name, batch in points_batch.items():
-            for time_precision, points in batch.items():
-                self._write_points(points=points, db_name=db_name, time_precision=time_precision)
+        timer = self.__profiler.start("write") if self.__profiler else None
+        if self.__circuit_breakers:
+            for db_name in self.__parked_points.counts:
+                if db_name not in points_batch:
+                    self.__write_chunk(points=None, db_name=db_name, time_precision=None)
+        if self.__async_writer:
+            self.__async_writer.run(self.__write_points_batch_async(points_batch=points_batch))
+        elif self.__writer_pool:
+            futures = list()
+            for db_name, batch in points_batch.items():
+                for time_precision, points in batch.items():
+                    for chunk in chunk_lines(lines=points, max_bytes=self.__max_request_bytes, max_lines=self.__max_request_points):
+                        futures.append(self.__writer_pool.submit(self.__write_chunk, points=chunk, db_name=db_name, time_precision=time_precision))
+            err = None
+            for future in futures:
+                try:
+                    future.result()
+                except WritePointsError as ex:
+                    if err:
+                        util.logger.error(f"{ExportWorker.__log_err_msg_prefix}: {ex}")
+                    else:
+                        err = ex
+            if err:
+                raise err
+        else:
+            for db_name, batch in points_batch.items():
+                for time_precision, points in batch.items():
+                    for chunk in chunk_lines(lines=points, max_bytes=self.__max_request_bytes, max_lines=self.__max_request_points):
+                        self.__write_chunk(points=chunk, db_name=db_name, time_precision=time_precision)
+        if timer:
+            self.__profiler.stop(timer)
+
+    def _get_exports_batch(self):
+        start = time.perf_counter()
+        timer = self.__profiler.start("fetch") if self.__profiler else None
+        limit = self.__batch_controller.limit if self.__batch_controller else self.__get_data_limit
+        exports_batch = self.__data_client.get_exports_batch(
+            timeout=self.__batch_controller.timeout if self.__batch_controller else self.__get_data_timeout,
+            limit=limit,
+            data_ignore_missing_keys=True
+        )
+        if timer:
+            self.__profiler.stop(timer)
+        if self.__batch_controller:
+            if self.__offset_tracker:
+                consumed = self.__offset_tracker.consumed
+                self.__batch_controller.observe_fetch(consumed=consumed - self.__consumed, limit=limit)
+                self.__consumed = consumed
+            else:
+                self.__batch_controller.observe_fetch(consumed=len(exports_batch[0]) if exports_batch else 0, limit=limit)
+        if self.__metrics:
+            self.__metrics.fetch_time.observe(time.perf_counter() - start)
+            self.__metrics.batch_size.observe(len(exports_batch[0]) if exports_batch else 0)
+        if exports_batch:
+            if exports_batch[1]:
+                raise RuntimeError(set(str(ex) for ex in exports_batch[1]))
+            return exports_batch[0], self.__offset_tracker.pop_offsets() if self.__offset_tracker else None
+        return None, None
+
+    def _store_offsets(self, offsets: typing.Optional[typing.List], window_aggregator: typing.Optional[WindowAggregator] = None):
+        start = time.perf_counter()
+        timer = self.__profiler.start("store") if self.__profiler else None
+        if self.__offset_tracker:
+            if offsets:
+                window_aggregator = window_aggregator or self.__window_aggregator
+                if window_aggregator:
+                    window_aggregator.commit(offsets=offsets)
+                self.__offset_tracker.store_offsets(offsets=offsets)
+        else:
+            self.__data_client.store_offsets()
+        if timer:
+            self.__profiler.stop(timer)
+        if self.__metrics:
+            self.__metrics.store_time.observe(time.perf_counter() - start)
+
+    def __write_buffered(self, points_batch: typing.Optional[typing.Dict], offsets: typing.Optional[typing.List]):
+        self.__write_buffer.put(points_batch=points_batch, offsets=offsets)
+        points_batch, offsets = self.__write_buffer.pop()
+        if points_batch:
+            self._write_points_batch(points_batch=points_batch)
+        if offsets:
+            self._store_offsets(offsets=offsets)
+
+    def __put(self, q: queue.Queue, item):
+        while not self.__stop:
+            try:
+                q.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def __get(self, q: queue.Queue):
+        while not self.__stop:
+            try:
+                return q.get(timeout=1)
+            except queue.Empty:
+                pass
+        raise queue.Empty
+
+    def __fetch_stage(self, out_q: queue.Queue):
+        try:
+            while not self.__stop:
+                exports, offsets = self._get_exports_batch()
+                if exports or offsets or self.__write_buffer or (self.__window_aggregator and self.__window_aggregator.pending):
+                    self.__put(out_q, (exports, offsets))
+                exports = None
+        except Exception as ex:
+            util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: consuming exports failed: reason={get_exception_str(ex)}")
+            self.__stop = True
+
+    def __gen_stage(self, in_q: queue.Queue, out_q: queue.Queue):
+        try:
+            while not self.__stop:
+                exports, offsets = self.__get(in_q)
+                start = time.perf_counter()
+                points_batch = self._gen_points_batch(exports_batch=exports) if exports else None
+                exports = None
+                points_batch, offsets = self.__close_windows(window_aggregator=self.__window_aggregator, points_batch=points_batch, offsets=offsets)
+                self.__put(out_q, (points_batch, offsets, time.perf_counter() - start))
+        except queue.Empty:
+            pass
+        except Exception as ex:
+            util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: generating points failed: reason={get_exception_str(ex)}")
+            self.__stop = True
+
+    def __run_serial(self):
+        while not self.__stop:
+            try:
+                exports, offsets = self._get_exports_batch()
+                start = time.perf_counter()
+                points_batch = self._gen_points_batch(exports_batch=exports) if exports else None
+                # filter results usually outweigh the encoded points, release them before writing
+                exports = None
+                points_batch, offsets = self.__close_windows(window_aggregator=self.__window_aggregator, points_batch=points_batch, offsets=offsets)
+                if self.__write_buffer:
+                    self.__write_buffered(points_batch=points_batch, offsets=offsets)
+                else:
+                    if points_batch is not None:
+                        self._write_points_batch(points_batch=points_batch)
+                    if points_batch is not None or offsets:
+                        self._store_offsets(offsets=offsets)
+                if points_batch is not None and self.__batch_controller:
+                    self.__batch_controller.observe_processing(time.perf_counter() - start)
+            except WritePointsError as ex:
+                util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: {ex}")
+                self.__stop = True
+            except Exception as ex:
+                util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: consuming exports failed: reason={get_exception_str(ex)}")
+                self.__stop = True
+
+    def __run_pipeline(self):
+        exports_q = queue.Queue(maxsize=self.__pipeline_queue_size)
+        points_q = queue.Queue(maxsize=self.__pipeline_queue_size)
+        stages = (
+            threading.Thread(target=self.__fetch_stage, args=(exports_q, ), name="fetch-stage", daemon=True),
+            threading.Thread(target=self.__gen_stage, args=(exports_q, points_q), name="gen-stage", daemon=True)
+        )
+        for stage in stages:
+            stage.start()
+        while not self.__stop:
+            try:
+                points_batch, offsets, gen_time = self.__get(points_q)
+                start = time.perf_counter()
+                if self.__write_buffer:
+                    self.__write_buffered(points_batch=points_batch, offsets=offsets)
+                else:
+                    if points_batch:
+                        self._write_points_batch(points_batch=points_batch)
+                    self._store_offsets(offsets=offsets)
+                if points_batch and self.__batch_controller:
+                    self.__batch_controller.observe_processing(gen_time + time.perf_counter() - start)
+            except queue.Empty:
+                pass
+            except WritePointsError as ex:
+                util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: {ex}")
+                self.__stop = True
+            except Exception as ex:
+                util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: writing points failed: reason={get_exception_str(ex)}")
+                self.__stop = True
+        for stage in stages:
+            stage.join()
+
+    def __lane(self, in_q: queue.Queue, window_aggregator: typing.Optional[WindowAggregator]):
+        try:
+            while not self.__stop:
+                exports, offsets = self.__get(in_q)
+                start = time.perf_counter()
+                points_batch = self._gen_points_batch(exports_batch=exports, window_aggregator=window_aggregator) if exports else None
+                exports = None
+                points_batch, offsets = self.__close_windows(window_aggregator=window_aggregator, points_batch=points_batch, offsets=offsets)
+                if points_batch is not None:
+                    self._write_points_batch(points_batch=points_batch)
+                self._store_offsets(offsets=offsets, window_aggregator=window_aggregator)
+                if points_batch is not None and self.__batch_controller:
+                    self.__batch_controller.observe_processing(time.perf_counter() - start)
+        except queue.Empty:
+            pass
+        except WritePointsError as ex:
+            util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: {ex}")
+            self.__stop = True
+        except Exception as ex:
+            util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: writing points failed: reason={get_exception_str(ex)}")
+            self.__stop = True
+
+    def __run_lanes(self):
+        lane_qs = [queue.Queue(maxsize=max(self.__pipeline_queue_size, 1)) for _ in range(self.__partition_lanes)]
+        lanes = [threading.Thread(target=self.__lane, args=(lane_q, self.__window_aggregators[num] if self.__window_aggregators else None), name=f"partition-lane-{num}", daemon=True) for num, lane_q in enumerate(lane_qs)]
+        for lane in lanes:
+            lane.start()
+        partitions = dict()
+        while not self.__stop:
+            try:
+                exports, offsets = self._get_exports_batch()
+                if offsets:
+                    key = (offsets[0].topic, offsets[0].partition)
+                    if key not in partitions:
+                        partitions[key] = len(partitions) % self.__partition_lanes
+                    self.__put(lane_qs[partitions[key]], (exports, offsets))
+                # idle lanes still have to close their windows
+                for lane_q, window_aggregator in zip(lane_qs, self.__window_aggregators):
+                    if window_aggregator.pending and lane_q.empty():
+                        self.__put(lane_q, (None, None))
+                exports = None
+            except Exception as ex:
+                util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: consuming exports failed: reason={get_exception_str(ex)}")
+                self.__stop = True
+        for lane in lanes:
+            lane.join()
 
     def set_filter_sync(self, err: bool):
         self.__filter_sync_err = err
@@ -124,23 +726,15 @@ class ExportWorker:
         self.__filter_sync_event.wait()
         if not self.__filter_sync_err:
             util.logger.info(f"{ExportWorker.__log_msg_prefix}: starting export consumption ...")
-            while not self.__stop:
-                try:
-                    exports_batch = self.__data_client.get_exports_batch(
-                        timeout=self.__get_data_timeout,
-                        limit=self.__get_data_limit,
-                        data_ignore_missing_keys=True
-                    )
-                    if exports_batch:
-                        if exports_batch[1]:
-                            raise RuntimeError(set(str(ex) for ex in exports_batch[1]))
-                        if exports_batch[0]:
-                            self._write_points_batch(points_batch=self._gen_points_batch(exports_batch=exports_batch[0]))
-                            self.__data_client.store_offsets()
-                except WritePointsError as ex:
-                    util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: {ex}")
-                    self.__stop = True
-                except Exception as ex:
-                    util.logger.critical(f"{ExportWorker.__log_err_msg_prefix}: consuming exports failed: reason={get_exception_str(ex)}")
-                    self.__stop = True
+            if self.__write_spool:
+                self.__write_spool.start(write=self._drain_spool)
+            if self.__partition_lanes > 0:
+                self.__run_lanes()
+            elif self.__pipeline_queue_size > 0:
+                self.__run_pipeline()
+            else:
+                self.__run_serial()
+            self.__flush_windows()
+            if self.__parked_points:
+                self.__release_parked()
         self.__stopped = True
@@ -0,0 +1,53 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("WriterPool", )
+
+import util
+import concurrent.futures
+import threading
+import queue
+import typing
+
+influxdb = util.lazy_import("influxdb")
+
+
+class WriterPool:
+    def __init__(self, influxdb_clients: typing.List["influxdb.InfluxDBClient"]):
+        self.__influxdb_clients = influxdb_clients
+        self.__client_queue = queue.SimpleQueue()
+        for client in influxdb_clients:
+            self.__client_queue.put(client)
+        self.__local = threading.local()
+        self.__executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(influxdb_clients),
+            thread_name_prefix="influxdb-writer",
+            initializer=self.__init_thread
+        )
+
+    def __init_thread(self):
+        self.__local.influxdb_client = self.__client_queue.get()
+
+    def __call(self, func, kwargs):
+        return func(influxdb_client=self.__local.influxdb_client, **kwargs)
+
+    def submit(self, func: typing.Callable, **kwargs) -> concurrent.futures.Future:
+        return self.__executor.submit(self.__call, func, kwargs)
+
+    def close(self):
+        self.__executor.shutdown(wait=True)
+        for client in self.__influxdb_clients:
+            client.close()
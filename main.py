@@ -14,42 +14,62 @@
    limitations under the License.
 """
 
+import time
+
+start_time = time.perf_counter()
+
 import util
 import ew
 import ew_lib
 import cncr_wdg
 import confluent_kafka
-import influxdb
+import multiprocessing
 import signal
+import typing
+import json
 
+influxdb = util.lazy_import("influxdb")
 
-if __name__ == '__main__':
-    util.print_init(name="kafka-to-influxdb-ew", git_info_file="git_commit")
-    config = util.Config(prefix="conf")
-    util.init_logger(config.logger_level)
-    util.logger.debug(f"export worker config: {config}")
-    influxdb_client = influxdb.InfluxDBClient(
-        host=config.influxdb.host,
-        port=config.influxdb.port,
-        username=config.influxdb.username,
-        password=config.influxdb.password,
-        retries=config.influxdb.retries,
-        timeout=config.influxdb.timeout
-    )
+
+def run_worker(config: util.Config, worker_id: int = 0, startup_profile: typing.Optional[util.StartupProfile] = None):
     kafka_filter_consumer_config = {
         "metadata.broker.list": config.kafka.metadata_broker_list,
-        "group.id": f"{config.kafka_filter_consumer_group_id}_{config.kafka.consumer_group_id_postfix}",
+        "group.id": f"{config.kafka_filter_consumer_group_id}_{config.kafka.consumer_group_id_postfix}" + (f"_{worker_id}" if config.processes > 1 else ""),
         "auto.offset.reset": "earliest",
     }
     util.logger.debug(f"kafka filter consumer config: {kafka_filter_consumer_config}")
     kafka_filter_consumer = confluent_kafka.Consumer(kafka_filter_consumer_config, logger=util.logger)
+    if config.kafka_filter_client.snapshot_path:
+        kafka_filter_consumer = ew.FilterSnapshot(
+            kafka_consumer=kafka_filter_consumer,
+            path=f"{config.kafka_filter_client.snapshot_path}.{worker_id}" if config.processes > 1 else config.kafka_filter_client.snapshot_path,
+            interval=config.kafka_filter_client.snapshot_interval
+        )
+    known_databases = ew.KnownDatabases(
+        influxdb_client=influxdb.InfluxDBClient(
+            host=config.influxdb.host,
+            port=config.influxdb.port,
+            username=config.influxdb.username,
+            password=config.influxdb.password,
+            retries=config.influxdb.retries,
+            timeout=config.influxdb.timeout
+        )
+    ) if config.influxdb.cache_databases else None
+    if known_databases:
+        try:
+            known_databases.load()
+        except Exception as ex:
+            util.logger.warning(f"loading known databases failed: reason={ew.util.get_exception_str(ex)}")
+    tag_cache = ew.TagSetCache(max_size=config.tag_cache.max_size) if config.tag_cache.enabled else None
+    point_builders = ew.PointBuilders(known_databases=known_databases, tag_cache=tag_cache)
+    kafka_filter_consumer = ew.FilterDeleteHook(kafka_consumer=kafka_filter_consumer, on_delete=point_builders.delete)
     filter_client = ew_lib.FilterClient(
         kafka_consumer=kafka_filter_consumer,
         filter_topic=config.kafka_filter_client.filter_topic,
         poll_timeout=config.kafka_filter_client.poll_timeout,
         time_format=config.kafka_filter_client.time_format,
         utc=config.kafka_filter_client.utc,
-        validator=ew.validate_filter,
+        validator=point_builders.validate_filter,
         logger=util.logger
     )
     kafka_data_consumer_config = {
@@ -61,32 +81,202 @@ if __name__ == '__main__':
     }
     util.logger.debug(f"kafka data consumer config: {kafka_data_consumer_config}")
     kafka_data_consumer = confluent_kafka.Consumer(kafka_data_consumer_config, logger=util.logger)
+    # offsets are only tracked per batch when a mode needs it, otherwise the data client keeps handling them
+    offset_tracker = ew.OffsetTracker(kafka_consumer=kafka_data_consumer, partition_batches=config.pipeline.partition_lanes > 0) if config.pipeline.enabled or config.pipeline.partition_lanes > 0 or config.write_buffer.enabled or config.aggregation.enabled or config.metrics.enabled else None
     data_client = ew_lib.DataClient(
-        kafka_consumer=kafka_data_consumer,
+        kafka_consumer=offset_tracker or kafka_data_consumer,
         filter_client=filter_client,
         subscribe_interval=config.kafka_data_client.subscribe_interval,
-        handle_offsets=True,
+        handle_offsets=not offset_tracker,
         kafka_msg_err_ignore=[int(e) for e in config.kafka_data_client.kafka_msg_err_ignore.split(",")] if isinstance(config.kafka_data_client.kafka_msg_err_ignore, str) and config.kafka_data_client.kafka_msg_err_ignore else [config.kafka_data_client.kafka_msg_err_ignore],
         logger=util.logger
     )
+    influxdb_client = influxdb.InfluxDBClient(
+        host=config.influxdb.host,
+        port=config.influxdb.port,
+        username=config.influxdb.username,
+        password=config.influxdb.password,
+        retries=config.influxdb.retries,
+        timeout=config.influxdb.timeout
+    )
+    writer_pool = ew.WriterPool(
+        influxdb_clients=[
+            influxdb.InfluxDBClient(
+                host=config.influxdb.host,
+                port=config.influxdb.port,
+                username=config.influxdb.username,
+                password=config.influxdb.password,
+                retries=config.influxdb.retries,
+                timeout=config.influxdb.timeout
+            ) for _ in range(config.influxdb.writers)
+        ]
+    ) if config.influxdb.writers > 1 and not config.influxdb.async_writer else None
+    async_writer = ew.AsyncWriter(
+        host=config.influxdb.host,
+        port=config.influxdb.port,
+        username=config.influxdb.username,
+        password=config.influxdb.password,
+        timeout=config.influxdb.timeout,
+        max_in_flight=config.influxdb.max_in_flight
+    ) if config.influxdb.async_writer else None
+    if config.dead_letter.topic:
+        dead_letter_sink = ew.DeadLetterTopic(
+            kafka_producer=confluent_kafka.Producer({"metadata.broker.list": config.kafka.metadata_broker_list}, logger=util.logger),
+            topic=config.dead_letter.topic
+        )
+    elif config.dead_letter.path:
+        dead_letter_sink = ew.DeadLetterFile(path=f"{config.dead_letter.path}.{worker_id}" if config.processes > 1 else config.dead_letter.path)
+    else:
+        dead_letter_sink = ew.DeadLetterSink()
+    batch_controller = ew.BatchController(
+        limit=config.get_data_limit,
+        timeout=config.get_data_timeout,
+        min_limit=config.adaptive_batch.min_limit,
+        max_limit=config.adaptive_batch.max_limit,
+        min_timeout=config.adaptive_batch.min_timeout,
+        max_timeout=config.adaptive_batch.max_timeout,
+        target_latency=config.adaptive_batch.target_latency
+    ) if config.adaptive_batch.enabled else None
+    write_buffer = ew.WriteBuffer(
+        max_points=config.write_buffer.max_points,
+        max_bytes=config.write_buffer.max_bytes,
+        max_linger=config.write_buffer.max_linger
+    ) if config.write_buffer.enabled else None
+    write_spool = ew.WriteSpool(
+        path=f"{config.spool.path}.{worker_id}" if config.processes > 1 else config.spool.path,
+        max_bytes=config.spool.max_bytes,
+        segment_bytes=config.spool.segment_bytes,
+        min_backoff=config.spool.min_backoff,
+        max_backoff=config.spool.max_backoff
+    ) if config.spool.path else None
+    spool_influxdb_client = influxdb.InfluxDBClient(
+        host=config.influxdb.host,
+        port=config.influxdb.port,
+        username=config.influxdb.username,
+        password=config.influxdb.password,
+        retries=config.influxdb.retries,
+        timeout=config.influxdb.timeout
+    ) if write_spool else None
+    retry_policies = ew.RetryPolicies(
+        default=ew.RetryPolicy(
+            retries=config.write_retry.max_retries,
+            min_backoff=config.write_retry.min_backoff,
+            max_backoff=config.write_retry.max_backoff
+        ),
+        overrides=json.loads(config.write_retry.overrides) if config.write_retry.overrides else None
+    ) if config.write_retry.max_retries or config.write_retry.overrides else None
+    circuit_breakers = ew.CircuitBreakers(
+        failure_threshold=config.circuit_breaker.failure_threshold,
+        reset_timeout=config.circuit_breaker.reset_timeout
+    ) if config.circuit_breaker.enabled else None
+    metrics = ew.ExportMetrics(export_labels=config.metrics.export_labels) if config.metrics.enabled else None
+    profiler = ew.Profiler(
+        sample_rate=config.profiler.sample_rate,
+        dump_path=config.profiler.dump_path,
+        dump_seconds=config.profiler.dump_seconds,
+        dump_interval=config.profiler.dump_interval,
+        max_dump_seconds=config.profiler.max_dump_seconds,
+        metrics=metrics
+    ) if config.profiler.enabled else None
+    if profiler:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.dump())
+        if metrics:
+            metrics.add_route("/profile", profiler.handle_request)
+    if metrics and tag_cache:
+        metrics.add_tag_cache(tag_cache)
     export_worker = ew.ExportWorker(
         influxdb_client=influxdb_client,
         data_client=data_client,
         filter_client=filter_client,
         get_data_timeout=config.get_data_timeout,
-        get_data_limit=config.get_data_limit
+        get_data_limit=config.get_data_limit,
+        offset_tracker=offset_tracker,
+        pipeline_queue_size=config.pipeline.queue_size if config.pipeline.enabled else 0,
+        writer_pool=writer_pool,
+        point_builders=point_builders,
+        gzip_level=config.influxdb.gzip_level,
+        max_request_bytes=config.influxdb.max_request_bytes,
+        max_request_points=config.influxdb.max_request_points,
+        dead_letter_sink=dead_letter_sink,
+        metrics=metrics,
+        batch_controller=batch_controller,
+        write_buffer=write_buffer,
+        write_spool=write_spool,
+        spool_influxdb_client=spool_influxdb_client,
+        retry_policies=retry_policies,
+        circuit_breakers=circuit_breakers,
+        parked_points=ew.ParkedPoints(max_points=config.circuit_breaker.max_parked_points) if circuit_breakers else None,
+        known_databases=known_databases,
+        async_writer=async_writer,
+        partition_lanes=config.pipeline.partition_lanes,
+        window_aggregation=config.aggregation.enabled,
+        window_retention=config.aggregation.retention,
+        window_state=(ew.WindowState(path=f"{config.aggregation.state_path}.{worker_id}" if config.processes > 1 else config.aggregation.state_path) if config.aggregation.state_path else None),
+        profiler=profiler
     )
-    filter_client.set_on_sync(callable=export_worker.set_filter_sync, sync_delay=config.kafka_filter_client.sync_delay)
+    on_sync = export_worker.set_filter_sync
+    if startup_profile:
+        startup_profile.mark("clients")
+
+        def on_sync(err: bool):
+            startup_profile.mark("filter_sync")
+            startup_profile.report()
+            export_worker.set_filter_sync(err)
+
+    filter_client.set_on_sync(callable=on_sync, sync_delay=config.kafka_filter_client.sync_delay)
     watchdog = cncr_wdg.Watchdog(
         monitor_callables=[export_worker.is_alive, filter_client.is_alive, data_client.is_alive],
         shutdown_callables=[export_worker.stop, data_client.stop, filter_client.stop],
-        join_callables=[data_client.join, filter_client.join, influxdb_client.close, kafka_data_consumer.close, kafka_filter_consumer.close],
+        join_callables=[data_client.join, filter_client.join] + ([write_spool.close, spool_influxdb_client.close] if write_spool else []) + ([known_databases.close] if known_databases else []) + [influxdb_client.close, kafka_data_consumer.close, kafka_filter_consumer.close, dead_letter_sink.close] + ([writer_pool.close] if writer_pool else []) + ([async_writer.close] if async_writer else []) + ([metrics.stop] if metrics else []),
         shutdown_signals=[signal.SIGTERM, signal.SIGINT, signal.SIGABRT],
         monitor_delay=config.watchdog.monitor_delay,
         logger=util.logger
     )
     watchdog.start(delay=config.watchdog.start_delay)
+    if metrics:
+        metrics.start(port=config.metrics.port + worker_id)
     filter_client.start()
     data_client.start()
+    if startup_profile:
+        startup_profile.mark("start")
     export_worker.run()
     watchdog.join()
+
+
+def start_worker(worker_id: int):
+    config = util.Config(prefix="conf")
+    util.init_logger(config.logger_level)
+    util.logger.info(f"export worker process {worker_id}: starting ...")
+    run_worker(config=config, worker_id=worker_id, startup_profile=util.StartupProfile(name=f"worker {worker_id}") if config.startup_profile else None)
+
+
+if __name__ == '__main__':
+    startup_profile = util.StartupProfile(start=start_time)
+    startup_profile.mark("imports")
+    preload = util.preload("influxdb", "dateutil.parser")
+    util.print_init(name="kafka-to-influxdb-ew", git_info_file="git_commit")
+    startup_profile.mark("init")
+    config = util.Config(prefix="conf")
+    util.init_logger(config.logger_level)
+    util.logger.debug(f"export worker config: {config}")
+    startup_profile.mark("config")
+    if config.processes > 1:
+        preload.join()
+        processes = [multiprocessing.Process(target=start_worker, args=(worker_id, ), name=f"export-worker-{worker_id}") for worker_id in range(config.processes)]
+        watchdog = cncr_wdg.Watchdog(
+            monitor_callables=[process.is_alive for process in processes],
+            shutdown_callables=[process.terminate for process in processes],
+            join_callables=[process.join for process in processes],
+            shutdown_signals=[signal.SIGTERM, signal.SIGINT, signal.SIGABRT],
+            monitor_delay=config.watchdog.monitor_delay,
+            logger=util.logger
+        )
+        for process in processes:
+            process.start()
+        if config.startup_profile:
+            startup_profile.mark("spawn")
+            startup_profile.report()
+        watchdog.start(delay=config.watchdog.start_delay)
+        watchdog.join()
+    else:
+        run_worker(config=config, startup_profile=startup_profile if config.startup_profile else None)
@@ -15,3 +15,14 @@
 """
 
 from .test_export_worker import *
+from .test_line_protocol import *
+from .test_timestamp import *
+from .test_metrics import *
+from .test_batching import *
+from .test_buffer import *
+from .test_snapshot import *
+from .test_spool import *
+from .test_startup import *
+from .test_profiling import *
+from .test_cache import *
+from .test_aggregation import *
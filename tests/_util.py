@@ -15,6 +15,11 @@
 """
 
 import confluent_kafka
+import influxdb
+import http.server
+import urllib.parse
+import threading
+import gzip
 import json
 import queue
 import typing
@@ -45,8 +50,9 @@ class MockKafkaError:
 
 
 class MockKafkaMessage:
-    def __init__(self, value=None, topic=None, err_obj=None, partition=0, offset=None):
+    def __init__(self, value=None, topic=None, err_obj=None, partition=0, offset=None, key=None):
         self.__value = value
+        self.__key = key
         self.__err_obj = err_obj
         self.__topic = topic
         self.__partition = partition
@@ -59,6 +65,9 @@ class MockKafkaMessage:
     def value(self):
         return self.__value
 
+    def key(self):
+        return self.__key
+
     def topic(self):
         return self.__topic
 
@@ -73,8 +82,9 @@ class MockKafkaMessage:
 
 
 class MockKafkaConsumer(confluent_kafka.Consumer):
-    def __init__(self, data: typing.Union[typing.Dict, typing.List], sources: bool = True, msg_error: bool = False, sub_topics=None):
+    def __init__(self, data: typing.Union[typing.Dict, typing.List], sources: bool = True, msg_error: bool = False, sub_topics=None, partitions: int = 1):
         self.__sources = sources
+        self.__partitions = set()
         self.__queue = queue.Queue()
         self.__offsets = dict()
         self.__sub_topics = {item: False for item in sub_topics} if sub_topics else sub_topics
@@ -85,10 +95,9 @@ class MockKafkaConsumer(confluent_kafka.Consumer):
         )
         if self.__sources:
             for source in data:
-                offset = 0
-                for message in data[source]:
-                    self.__queue.put(MockKafkaMessage(value=json.dumps(message), topic=source, offset=offset))
-                    offset += 1
+                for num, message in enumerate(data[source]):
+                    self.__queue.put(MockKafkaMessage(value=json.dumps(message), topic=source, partition=num % partitions, offset=num // partitions))
+                self.__partitions.update((source, partition) for partition in range(partitions))
                 if msg_error:
                     for err_obj in err_objs:
                         self.__queue.put(MockKafkaMessage(err_obj=err_obj, topic=source))
@@ -124,15 +133,231 @@ class MockKafkaConsumer(confluent_kafka.Consumer):
     def empty(self):
         return self.__queue.empty()
 
+    def assignment(self):
+        return [confluent_kafka.TopicPartition(topic=topic, partition=partition) for topic, partition in sorted(self.__partitions)]
+
+    def revoke(self, topic: str, partition: int):
+        self.__partitions.discard((topic, partition))
+
     def subscribed(self):
         return all(self.__sub_topics.values())
 
     def store_offsets(self, offsets):
         for tp in offsets:
             assert isinstance(tp, confluent_kafka.TopicPartition)
+            if self.__sources and (tp.topic, tp.partition) not in self.__partitions:
+                raise confluent_kafka.KafkaException(confluent_kafka.KafkaError(confluent_kafka.KafkaError._STATE))
             key = f"{tp.topic}{tp.partition}"
             if key not in self.__offsets:
                 assert tp.offset == 1
             else:
                 assert tp.offset == self.__offsets[key] + 1
             self.__offsets[key] = tp.offset
+
+
+class MockInfluxDBClient:
+    def __init__(self, poison: bytes = None, errors: typing.Optional[typing.List[Exception]] = None):
+        self.__poison = poison
+        self.__errors = errors or list()
+        self.requests = 0
+        self.written = list()
+
+    def request(self, url, method="GET", params=None, data=None, expected_response_code=200, headers=None, **kwargs):
+        self.requests += 1
+        if self.__errors:
+            raise self.__errors.pop(0)
+        lines = data.strip().split(b"\n")
+        if self.__poison and any(self.__poison in line for line in lines):
+            raise influxdb.client.InfluxDBClientError("partial write: field type conflict", 400)
+        self.written += lines
+
+
+def split_unescaped(text: str, sep: str, quotes: bool = False) -> typing.List[str]:
+    parts = list()
+    part = list()
+    quoted = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            part.append(text[i:i + 2])
+            i += 2
+            continue
+        if quotes and char == "\"":
+            quoted = not quoted
+        elif char == sep and not quoted:
+            parts.append("".join(part))
+            part = list()
+            i += 1
+            continue
+        part.append(char)
+        i += 1
+    if quoted:
+        raise ValueError("unbalanced quotes")
+    parts.append("".join(part))
+    return parts
+
+
+def parse_field_value(value: str) -> typing.Tuple[str, typing.Any]:
+    if len(value) > 1 and value[0] == "\"" and value[-1] == "\"":
+        return "string", value[1:-1]
+    if value in ("t", "T", "true", "True", "TRUE"):
+        return "boolean", True
+    if value in ("f", "F", "false", "False", "FALSE"):
+        return "boolean", False
+    if value.endswith("i"):
+        return "integer", int(value[:-1])
+    return "float", float(value)
+
+
+def parse_line(line: bytes) -> typing.Tuple[str, typing.Dict, typing.Dict, typing.Optional[int]]:
+    sections = [section for section in split_unescaped(line.decode(), " ", quotes=True) if section]
+    if len(sections) not in (2, 3):
+        raise ValueError(f"unable to parse '{line.decode()}': invalid number of sections")
+    series = split_unescaped(sections[0], ",")
+    if not series[0]:
+        raise ValueError(f"unable to parse '{line.decode()}': missing measurement")
+    tags = dict()
+    for tag in series[1:]:
+        key, _, value = tag.partition("=")
+        if not key or not value:
+            raise ValueError(f"unable to parse '{line.decode()}': missing tag key or value")
+        tags[key] = value
+    fields = dict()
+    for field in split_unescaped(sections[1], ",", quotes=True):
+        key, _, value = field.partition("=")
+        if not key or not value:
+            raise ValueError(f"unable to parse '{line.decode()}': missing field key or value")
+        try:
+            fields[key] = parse_field_value(value)
+        except ValueError:
+            raise ValueError(f"unable to parse '{line.decode()}': invalid field value")
+    try:
+        timestamp = int(sections[2]) if len(sections) == 3 else None
+    except ValueError:
+        raise ValueError(f"unable to parse '{line.decode()}': bad timestamp")
+    return series[0], tags, fields, timestamp
+
+
+class FakeInfluxDB:
+    def __init__(self, host: str = "localhost", port: int = 0, latency: float = 0.0, max_body_bytes: int = 0):
+        self.latency = latency
+        self.max_body_bytes = max_body_bytes
+        self.databases = set()
+        self.written = dict()
+        self.field_types = dict()
+        self.requests = 0
+        self.bytes = 0
+        self.queries = list()
+        self.__failures = list()
+        self.__lock = threading.Lock()
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def __reply(self, code: int, body: bytes = b""):
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("X-Influxdb-Version", "1.8.10")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                if url.path == "/ping":
+                    self.__reply(204)
+                elif url.path == "/query":
+                    self.__reply(*fake._query(query=urllib.parse.parse_qs(url.query).get("q", [""])[0]))
+                else:
+                    self.__reply(404)
+
+            def do_POST(self):
+                url = urllib.parse.urlparse(self.path)
+                params = urllib.parse.parse_qs(url.query)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if url.path == "/write":
+                    self.__reply(*fake._write(db_name=params.get("db", [None])[0], body=body, gzipped=self.headers.get("Content-Encoding") == "gzip"))
+                elif url.path == "/query":
+                    params.update(urllib.parse.parse_qs(body.decode()))
+                    self.__reply(*fake._query(query=params.get("q", [""])[0]))
+                else:
+                    self.__reply(404)
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    @property
+    def points(self) -> int:
+        with self.__lock:
+            return sum(len(lines) for lines in self.written.values())
+
+    def fail(self, code: int, count: int = 1, db_name: typing.Optional[str] = None):
+        with self.__lock:
+            self.__failures.append([code, count, db_name])
+
+    def __pop_failure(self, db_name: str) -> typing.Optional[int]:
+        for failure in self.__failures:
+            if failure[2] is None or failure[2] == db_name:
+                failure[1] -= 1
+                if failure[1] <= 0:
+                    self.__failures.remove(failure)
+                return failure[0]
+
+    def _write(self, db_name: str, body: bytes, gzipped: bool = False) -> typing.Tuple[int, bytes]:
+        with self.__lock:
+            self.requests += 1
+            self.bytes += len(body)
+            code = self.__pop_failure(db_name)
+            if code:
+                return code, json.dumps({"error": f"injected error {code}"}).encode()
+            if self.max_body_bytes and len(body) > self.max_body_bytes:
+                return 413, json.dumps({"error": "Request Entity Too Large"}).encode()
+            if db_name not in self.databases:
+                return 404, json.dumps({"error": f"database not found: \"{db_name}\""}).encode()
+            if gzipped:
+                body = gzip.decompress(body)
+            errors = list()
+            for line in body.split(b"\n"):
+                if not line:
+                    continue
+                try:
+                    measurement, _, fields, _ = parse_line(line)
+                    for key, (field_type, _) in fields.items():
+                        known_type = self.field_types.setdefault((db_name, measurement, key), field_type)
+                        if known_type != field_type:
+                            raise ValueError(f"field type conflict: input field \"{key}\" on measurement \"{measurement}\" is type {field_type}, already exists as type {known_type}")
+                except ValueError as ex:
+                    errors.append(str(ex))
+                    continue
+                self.written.setdefault(db_name, list()).append(line)
+        if errors:
+            return 400, json.dumps({"error": f"partial write: {errors[0]} dropped={len(errors)}"}).encode()
+        return 204, b""
+
+    def _query(self, query: str) -> typing.Tuple[int, bytes]:
+        statement = query.strip()
+        with self.__lock:
+            self.queries.append(statement)
+            if statement.upper().startswith("CREATE DATABASE"):
+                self.databases.add(statement[15:].strip().strip("\""))
+            elif statement.upper() == "SHOW DATABASES":
+                return 200, json.dumps({"results": [{"statement_id": 0, "series": [{"name": "databases", "columns": ["name"], "values": [[name] for name in sorted(self.databases)]}]}]}).encode()
+        return 200, json.dumps({"results": [{"statement_id": 0}]}).encode()
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
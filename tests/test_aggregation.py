@@ -0,0 +1,121 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import tempfile
+import confluent_kafka
+import ew.aggregation
+import ew.builder
+import ew.util
+import time
+
+
+def gen_offsets(*offsets):
+    return [confluent_kafka.TopicPartition(topic="test", partition=partition, offset=offset) for partition, offset in offsets]
+
+
+def gen_builder(**aggregation):
+    return ew.builder.gen_point_builder(
+        export_id="export-1",
+        export_args={"db_name": "db_1", "time_key": "time", "time_precision": "s", "type_casts": {"val": ":number"}, "aggregation": aggregation}
+    )
+
+
+class TestWindowAggregator(unittest.TestCase):
+    def test_windows(self):
+        builder = gen_builder(window=60, functions=["mean", "min", "max", "last", "count"])
+        aggregator = ew.aggregation.WindowAggregator()
+        errors = aggregator.add(export_id="export-1", builder=builder, rows=[
+            ({"val": 1, "state": "on"}, {"time": 60, "id": "a"}),
+            ({"val": "3", "state": None}, {"time": 90, "id": "a"}),
+            ({"val": 2}, {"time": 100, "id": "b"}),
+            ({"val": "x"}, {"time": 100, "id": "b"}),
+            ({"val": 2}, {"id": "b"})
+        ])
+        self.assertEqual([type(ex) for ex in errors], [type(None), type(None), type(None), ValueError, KeyError])
+        self.assertEqual(aggregator.pending, 2)
+        self.assertEqual(aggregator.pop(offsets=gen_offsets((0, 5))), (dict(), None))
+        aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 4}, {"time": 125, "id": "a"})])
+        closed, offsets = aggregator.pop(offsets=gen_offsets((0, 6)))
+        self.assertEqual(
+            closed["export-1"][1],
+            [
+                b"export-1,id=a count_state=1i,count_val=2i,last_state=\"on\",last_val=3.0,max_val=3.0,mean_val=2.0,min_val=1.0 60",
+                b"export-1,id=b count_val=1i,last_val=2.0,max_val=2.0,mean_val=2.0,min_val=2.0 60"
+            ]
+        )
+        self.assertEqual([(tp.partition, tp.offset) for tp in offsets], [(0, 5)])
+        aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 5}, {"time": 119, "id": "a"})])
+        self.assertEqual(aggregator.late, 1)
+        closed, offsets = aggregator.pop(offsets=None, force=True)
+        self.assertEqual(closed["export-1"][1], [b"export-1,id=a count_val=1i,last_val=4.0,max_val=4.0,mean_val=4.0,min_val=4.0 120"])
+        self.assertEqual([(tp.partition, tp.offset) for tp in offsets], [(0, 6)])
+        self.assertEqual(aggregator.pending, 0)
+
+    def test_idle_close(self):
+        builder = gen_builder(window=0.05)
+        aggregator = ew.aggregation.WindowAggregator()
+        aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 1}, {"time": 10, "id": "a"})])
+        self.assertEqual(aggregator.pop(offsets=gen_offsets((0, 1))), (dict(), None))
+        time.sleep(0.06)
+        closed, offsets = aggregator.pop(offsets=None)
+        self.assertEqual(closed["export-1"][1], [b"export-1,id=a mean_val=1.0 10"])
+        self.assertEqual([(tp.partition, tp.offset) for tp in offsets], [(0, 1)])
+
+    def test_evict_idle(self):
+        builder = gen_builder(window=0.05)
+        aggregator = ew.aggregation.WindowAggregator(retention=0.05)
+        aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 1}, {"time": 10, "id": "a"})])
+        time.sleep(0.06)
+        closed, _ = aggregator.pop(offsets=None)
+        self.assertIn("export-1", closed)
+        aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 2}, {"time": 10, "id": "a"})])
+        self.assertEqual(aggregator.late, 1)
+        time.sleep(0.06)
+        self.assertEqual(aggregator.pop(offsets=None), (dict(), None))
+        aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 3}, {"time": 10, "id": "a"})])
+        self.assertEqual(aggregator.late, 1)
+        self.assertEqual(aggregator.pending, 1)
+
+    def test_restart_replay(self):
+        builder = gen_builder(window=60, delay=30, functions=["count"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = f"{tmp_dir}/state.json"
+            aggregator = ew.aggregation.WindowAggregator(state=ew.aggregation.WindowState(path=path))
+            for rows, offset in (([({"val": 1}, {"time": 10, "id": "a"})], 1), ([({"val": 2}, {"time": 70, "id": "a"}), ({"val": 3}, {"time": 20, "id": "a"})], 2), ([({"val": 4}, {"time": 95, "id": "a"})], 3)):
+                aggregator.add(export_id="export-1", builder=builder, rows=rows)
+                closed, offsets = aggregator.pop(offsets=gen_offsets((0, offset)))
+            self.assertEqual(closed["export-1"][1], [b"export-1,id=a count_val=2i 0"])
+            self.assertEqual([(tp.partition, tp.offset) for tp in offsets], [(0, 1)])
+            aggregator.commit(offsets=offsets)
+            aggregator = ew.aggregation.WindowAggregator(state=ew.aggregation.WindowState(path=path))
+            aggregator.add(export_id="export-1", builder=builder, rows=[({"val": 2}, {"time": 70, "id": "a"}), ({"val": 3}, {"time": 20, "id": "a"}), ({"val": 4}, {"time": 95, "id": "a"})])
+            self.assertEqual(aggregator.late, 1)
+            closed, _ = aggregator.pop(offsets=None, force=True)
+            self.assertEqual(closed["export-1"][1], [b"export-1,id=a count_val=2i 60"])
+
+    def test_validate_filter(self):
+        filter = {"id": "export-1", "args": {"db_name": "db_1"}, "mappings": {}}
+        for aggregation, valid in (({"window": 60}, True), ({"window": 0.5, "functions": ["max", "count"]}, True), ({"window": 0}, False), ({"window": "1m"}, False), ({"window": 60, "functions": []}, False), ({"window": 60, "functions": ["median"]}, False), ({"window": 60, "delay": 5}, True), ({"window": 60, "delay": -1}, False)):
+            filter["args"]["aggregation"] = aggregation
+            self.assertIs(ew.util.validate_filter(filter), valid)
+        filter["args"]["aggregation"] = {"functions": ["mean"]}
+        with self.assertRaises(ew.util.ValidateFilterError):
+            ew.util.validate_filter(filter)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import ew.batching
+
+
+class TestBatchController(unittest.TestCase):
+    def _init_controller(self):
+        return ew.batching.BatchController(limit=1000, timeout=5.0, min_limit=100, max_limit=4000, min_timeout=0.1, max_timeout=5.0, target_latency=1.0)
+
+    def test_increase(self):
+        controller = self._init_controller()
+        for _ in range(10):
+            controller.observe_fetch(consumed=controller.limit, limit=controller.limit)
+            controller.observe_processing(0.1)
+        self.assertEqual(controller.limit, 4000)
+        self.assertAlmostEqual(controller.timeout, 0.9)
+
+    def test_decrease(self):
+        controller = self._init_controller()
+        for _ in range(10):
+            controller.observe_fetch(consumed=controller.limit, limit=controller.limit)
+            controller.observe_processing(2.0)
+        self.assertEqual(controller.limit, 100)
+        self.assertEqual(controller.timeout, 0.1)
+
+    def test_underfilled(self):
+        controller = self._init_controller()
+        for _ in range(10):
+            controller.observe_fetch(consumed=10, limit=controller.limit)
+            controller.observe_processing(0.1)
+        self.assertEqual(controller.limit, 1000)
+
+    def test_underfilled_timeout(self):
+        controller = ew.batching.BatchController(limit=1000, timeout=5.0, min_limit=100, max_limit=4000, min_timeout=0.1, max_timeout=5.0, target_latency=5.0)
+        controller.observe_fetch(consumed=10, limit=controller.limit)
+        controller.observe_processing(0.1)
+        self.assertLess(controller.timeout, 4.9)
+        for _ in range(20):
+            controller.observe_fetch(consumed=10, limit=controller.limit)
+            controller.observe_processing(0.1)
+        self.assertEqual(controller.timeout, 0.1)
+        for _ in range(20):
+            controller.observe_fetch(consumed=controller.limit, limit=controller.limit)
+            controller.observe_processing(0.1)
+        self.assertAlmostEqual(controller.timeout, 4.9)
@@ -0,0 +1,63 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import confluent_kafka
+import ew.buffer
+import time
+
+
+def gen_offsets(*offsets):
+    return [confluent_kafka.TopicPartition(topic="test", partition=partition, offset=offset) for partition, offset in offsets]
+
+
+class TestWriteBuffer(unittest.TestCase):
+    def test_size_flush(self):
+        write_buffer = ew.buffer.WriteBuffer(max_points=3, max_linger=60)
+        write_buffer.put(points_batch={"db_1": {None: [b"a", b"b"]}}, offsets=gen_offsets((0, 2)))
+        self.assertEqual(write_buffer.pop(), (dict(), None))
+        self.assertEqual(write_buffer.size, 2)
+        write_buffer.put(points_batch={"db_1": {None: [b"c"]}}, offsets=gen_offsets((0, 3)))
+        points_batch, offsets = write_buffer.pop()
+        self.assertEqual(points_batch, {"db_1": {None: [b"a", b"b", b"c"]}})
+        self.assertEqual([(tp.partition, tp.offset) for tp in offsets], [(0, 3)])
+        self.assertEqual(write_buffer.size, 0)
+
+    def test_linger_flush(self):
+        write_buffer = ew.buffer.WriteBuffer(max_points=0, max_linger=0.05)
+        write_buffer.put(points_batch={"db_1": {"s": [b"a"]}}, offsets=gen_offsets((0, 1)))
+        self.assertEqual(write_buffer.pop(), (dict(), None))
+        time.sleep(0.06)
+        points_batch, offsets = write_buffer.pop()
+        self.assertEqual(points_batch, {"db_1": {"s": [b"a"]}})
+        self.assertEqual([(tp.partition, tp.offset) for tp in offsets], [(0, 1)])
+
+    def test_partial_flush_offsets(self):
+        write_buffer = ew.buffer.WriteBuffer(max_points=2, max_linger=60)
+        write_buffer.put(points_batch={"db_1": {None: [b"a"]}}, offsets=gen_offsets((0, 1)))
+        write_buffer.put(points_batch={"db_2": {None: [b"b", b"c"]}}, offsets=gen_offsets((0, 3), (1, 5)))
+        points_batch, offsets = write_buffer.pop()
+        self.assertEqual(points_batch, {"db_2": {None: [b"b", b"c"]}})
+        self.assertIsNone(offsets)
+        write_buffer.put(points_batch=None, offsets=gen_offsets((1, 6)))
+        points_batch, offsets = write_buffer.pop(force=True)
+        self.assertEqual(points_batch, {"db_1": {None: [b"a"]}})
+        self.assertEqual(sorted((tp.partition, tp.offset) for tp in offsets), [(0, 3), (1, 6)])
+
+    def test_empty_batches_offsets(self):
+        write_buffer = ew.buffer.WriteBuffer()
+        write_buffer.put(points_batch=None, offsets=gen_offsets((0, 4)))
+        self.assertEqual([(tp.partition, tp.offset) for tp in write_buffer.pop()[1]], [(0, 4)])
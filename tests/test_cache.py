@@ -0,0 +1,66 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import ew.util
+import ew
+
+
+class TestTagSetCache(unittest.TestCase):
+    def test_lru(self):
+        tag_cache = ew.TagSetCache(max_size=2)
+        tag_cache.put_many({"a": "x,a=1", "b": "x,b=1"})
+        self.assertEqual(tag_cache.get_many(["a", "c"]), ["x,a=1", None])
+        tag_cache.put_many({"c": "x,c=1"})
+        self.assertEqual(tag_cache.size, 2)
+        self.assertEqual(tag_cache.get_many(["a", "b", "c"]), ["x,a=1", None, "x,c=1"])
+        self.assertEqual(tag_cache.hits, 3)
+        self.assertEqual(tag_cache.misses, 2)
+
+    def test_batch_point_builder(self):
+        args = dict(export_id="export 1", cast_map={"val_b": ":integer", "id_c": ":integer"}, time_key="time", time_precision="s")
+        rows = [
+            ({"val_b": "1", "val_c": 2.0}, {"time": "2022-02-09T10:01:01Z", "id_b": "b,1", "id_a": ""}),
+            ({"val_b": "2"}, {"time": "2022-02-09T10:01:02Z", "id_b": "b,1", "id_a": ""}),
+            ({"val_a": True}, {"time": "2022-02-09T10:01:02Z", "id_c": "x"}),
+            ({"val_a": "a"}, {"time": "2022-02-09T10:01:03Z", "id_c": "1"}),
+            ({"val_a": "b"}, {"time": "2022-02-09T10:01:03Z", "id_c": ["1"]}),
+            ({"val_a": "c"}, {"time": "2022-02-09T10:01:04Z"})
+        ]
+        tag_cache = ew.TagSetCache()
+        points = ew.util.compile_batch_point_builder(**args)(rows)
+        build_points = ew.util.compile_batch_point_builder(**args, tag_cache=tag_cache)
+        for _ in range(2):
+            cached_points = build_points(rows)
+            self.assertEqual([point if isinstance(point, bytes) else type(point) for point in cached_points], [point if isinstance(point, bytes) else type(point) for point in points])
+        self.assertIsInstance(cached_points[2], ValueError)
+        self.assertEqual(tag_cache.size, 3)
+        self.assertEqual(tag_cache.misses, 5)
+        self.assertEqual(tag_cache.hits, 3)
+        args["cast_map"] = None
+        points = ew.util.compile_batch_point_builder(**args, tag_cache=tag_cache)(rows[2:4])
+        self.assertEqual(points[0], b"export\\ 1,id_c=x val_a=True 1644400862")
+        self.assertEqual(points[1], b"export\\ 1,id_c=1 val_a=\"a\" 1644400863")
+
+    def test_batch_point_builder_value_types(self):
+        build_points = ew.util.compile_batch_point_builder(export_id="export-1", tag_cache=ew.TagSetCache())
+        rows = [({"val": 1}, {"id": True}), ({"val": 1}, {"id": 1}), ({"val": 1}, {"id": 1.0})]
+        for _ in range(2):
+            self.assertEqual(build_points(rows), [b"export-1,id=True val=1i", b"export-1,id=1 val=1i", b"export-1,id=1.0 val=1i"])
+
+
+if __name__ == '__main__':
+    unittest.main()
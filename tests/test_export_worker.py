@@ -16,7 +16,12 @@
 
 from ._util import *
 import unittest
+import tempfile
+import threading
 import influxdb
+import requests
+import asyncio
+import socket
 import json
 import ew_lib
 import ew
@@ -36,24 +41,25 @@ with open("tests/resources/points_batch_results_l3.json") as file:
 
 
 class TestInfluxDBWorker(unittest.TestCase):
-    def _init_export_worker(self, msg_error=False):
+    def _init_export_worker(self, msg_error=False, pipeline_queue_size=0, point_builders=None, influxdb_port=8086, partition_lanes=0):
         mock_kafka_consumer_filter = MockKafkaConsumer(data=filters, sources=False)
         filter_client = ew_lib.FilterClient(
             kafka_consumer=mock_kafka_consumer_filter,
             filter_topic="filter",
-            validator=ew.validate_filter,
+            validator=point_builders.validate_filter if point_builders else ew.validate_filter,
             logger=logger
         )
         mock_kafka_consumer_data = MockKafkaConsumer(data=data, msg_error=msg_error, sources=False)
+        offset_tracker = ew.OffsetTracker(kafka_consumer=mock_kafka_consumer_data, partition_batches=partition_lanes > 0) if pipeline_queue_size or partition_lanes else None
         data_client = ew_lib.DataClient(
-            kafka_consumer=mock_kafka_consumer_data,
+            kafka_consumer=offset_tracker or mock_kafka_consumer_data,
             filter_client=filter_client,
             kafka_msg_err_ignore=[3],
             logger=logger
         )
         influxdb_client = influxdb.InfluxDBClient(
             host="localhost",
-            port=8086,
+            port=influxdb_port,
             retries=3,
             timeout=5
         )
@@ -61,6 +67,10 @@ class TestInfluxDBWorker(unittest.TestCase):
             influxdb_client=influxdb_client,
             data_client=data_client,
             filter_client=filter_client,
+            offset_tracker=offset_tracker,
+            pipeline_queue_size=pipeline_queue_size,
+            point_builders=point_builders,
+            partition_lanes=partition_lanes
         )
         filter_client.start()
         while not mock_kafka_consumer_filter.empty():
@@ -69,8 +79,8 @@ class TestInfluxDBWorker(unittest.TestCase):
         filter_client.join()
         return export_worker, data_client, mock_kafka_consumer_data, influxdb_client
 
-    def _test_gen_points_batch(self, limit, results):
-        export_worker, data_client, mock_kafka_consumer, _ = self._init_export_worker()
+    def _test_gen_points_batch(self, limit, results, point_builders=None):
+        export_worker, data_client, mock_kafka_consumer, _ = self._init_export_worker(point_builders=point_builders)
         count = 0
         while not mock_kafka_consumer.empty():
             exports_batch, _ = data_client.get_exports_batch(timeout=5, limit=limit)
@@ -85,20 +95,368 @@ class TestInfluxDBWorker(unittest.TestCase):
     def test_gen_points_batch_l3(self):
         self._test_gen_points_batch(limit=3, results=gen_points_batch_results_l3)
 
+    def test_gen_points_batch_point_builders(self):
+        point_builders = ew.PointBuilders()
+        self._test_gen_points_batch(limit=2, results=gen_points_batch_results_l2, point_builders=point_builders)
+        self.assertIsNotNone(point_builders.get("export-1"))
+
     def test_write_points_batch(self):
-        export_worker, data_client, mock_kafka_consumer, influxdb_client = self._init_export_worker()
-        try:
-            influxdb_client.ping()
-        except Exception:
-            self.skipTest("influxdb not reachable")
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        export_worker, data_client, mock_kafka_consumer, influxdb_client = self._init_export_worker(influxdb_port=fake_influxdb.port)
+        count = 0
         while not mock_kafka_consumer.empty():
             exports_batch, _ = data_client.get_exports_batch(timeout=5, limit=2)
             if exports_batch:
-                export_worker._write_points_batch(points_batch=export_worker._gen_points_batch(exports_batch=exports_batch))
+                points_batch = export_worker._gen_points_batch(exports_batch=exports_batch)
+                count += sum(len(points) for batch in points_batch.values() for points in batch.values())
+                export_worker._write_points_batch(points_batch=points_batch)
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.points, count)
+        self.assertEqual(fake_influxdb.databases, {"db_1", "db_2"})
+
+    def test_offset_tracker(self):
+        mock_kafka_consumer = MockKafkaConsumer(data={"test": data})
+        offset_tracker = ew.OffsetTracker(kafka_consumer=mock_kafka_consumer)
+        while not mock_kafka_consumer.empty():
+            offset_tracker.consume(num_messages=1, timeout=1)
+            offsets = offset_tracker.pop_offsets()
+            self.assertEqual(len(offsets), 1)
+            offset_tracker.store_offsets(offsets=offsets)
+        self.assertEqual(offset_tracker.pop_offsets(), [])
+
+    def test_offset_tracker_partition_batches(self):
+        mock_kafka_consumer = MockKafkaConsumer(data={"test": data}, partitions=3)
+        offset_tracker = ew.OffsetTracker(kafka_consumer=mock_kafka_consumer, partition_batches=True)
+        consumed = {partition: list() for partition in range(3)}
+        while not mock_kafka_consumer.empty() or offset_tracker.buffered:
+            msgs = offset_tracker.consume(num_messages=4, timeout=1)
+            offsets = offset_tracker.pop_offsets()
+            self.assertEqual(len(set(msg.partition() for msg in msgs)), 1)
+            self.assertEqual(len(offsets), 1)
+            self.assertEqual(offsets[0].offset, msgs[-1].offset() + 1)
+            consumed[offsets[0].partition] += [msg.offset() for msg in msgs]
+        for partition in range(3):
+            self.assertEqual(consumed[partition], list(range(len(data[partition::3]))))
+        self.assertEqual(offset_tracker.consumed, len(data))
+
+    def test_offset_tracker_revoked(self):
+        mock_kafka_consumer = MockKafkaConsumer(data={"test": data}, partitions=2)
+        offset_tracker = ew.OffsetTracker(kafka_consumer=mock_kafka_consumer)
+        offset_tracker.consume(num_messages=2, timeout=1)
+        offsets = offset_tracker.pop_offsets()
+        self.assertEqual(sorted(tp.partition for tp in offsets), [0, 1])
+        mock_kafka_consumer.revoke(topic="test", partition=1)
+        offset_tracker.store_offsets(offsets=offsets)
+
+        class RevokingConsumer:
+            def assignment(self):
+                return [confluent_kafka.TopicPartition(topic="test", partition=0)]
+
+            def store_offsets(self, offsets):
+                raise confluent_kafka.KafkaException(confluent_kafka.KafkaError(confluent_kafka.KafkaError._STATE))
+
+        ew.OffsetTracker(kafka_consumer=RevokingConsumer()).store_offsets(offsets=offsets)
+
+    def test_offset_tracker_lag(self):
+        class LagConsumer:
+            def assignment(self):
+                return [confluent_kafka.TopicPartition(topic="test", partition=partition) for partition in range(3)]
+
+            def position(self, partitions):
+                return [confluent_kafka.TopicPartition(topic=tp.topic, partition=tp.partition, offset=(5, 7, -1001)[tp.partition]) for tp in partitions]
+
+            def get_watermark_offsets(self, partition, timeout=None, cached=False):
+                assert cached
+                return (0, (9, -1, 4)[partition.partition])
+
+        self.assertEqual(ew.OffsetTracker(kafka_consumer=LagConsumer()).get_lag(), {("test", 0): 4})
+
+    def test_writer_pool(self):
+        influxdb_clients = [influxdb.InfluxDBClient(host="localhost", port=8086) for _ in range(2)]
+        writer_pool = ew.WriterPool(influxdb_clients=influxdb_clients)
+        futures = [writer_pool.submit(lambda influxdb_client, num: (influxdb_client, num), num=num) for num in range(10)]
+        for num in range(10):
+            client, res = futures[num].result()
+            self.assertIn(client, influxdb_clients)
+            self.assertEqual(res, num)
+        writer_pool.close()
+
+    def test_write_points_bisect(self):
+        mock_influxdb_client = MockInfluxDBClient(poison=b"export-7")
+        dead_letter_sink = ew.DeadLetterSink()
+        export_worker = ew.ExportWorker(influxdb_client=mock_influxdb_client, data_client=None, filter_client=None, dead_letter_sink=dead_letter_sink)
+        points = [f"export-{num} val={num}i".encode() for num in range(16)]
+        export_worker._write_points(points=points, db_name="db_1", time_precision=None)
+        self.assertEqual(sorted(mock_influxdb_client.written), sorted(point for point in points if point != b"export-7 val=7i"))
+        self.assertLessEqual(mock_influxdb_client.requests, 1 + 2 * 4)
+        self.assertEqual(dead_letter_sink.counts, {"db_1": 1})
+
+    def test_write_points_bisect_server_error(self):
+        mock_influxdb_client = MockInfluxDBClient(errors=[influxdb.client.InfluxDBClientError("partial write: field type conflict", 400), influxdb.client.InfluxDBServerError("service unavailable")])
+        dead_letter_sink = ew.DeadLetterSink()
+        export_worker = ew.ExportWorker(influxdb_client=mock_influxdb_client, data_client=None, filter_client=None, dead_letter_sink=dead_letter_sink)
+        with self.assertRaises(ew.util.WritePointsError) as ctx:
+            export_worker._write_points(points=[f"export-{num} val={num}i".encode() for num in range(4)], db_name="db_1", time_precision=None)
+        self.assertIn("InfluxDBServerError", str(ctx.exception))
+        self.assertEqual(dead_letter_sink.counts, dict())
+
+    def _init_fake_influxdb_worker(self, **kwargs):
+        fake_influxdb = FakeInfluxDB(**kwargs)
+        fake_influxdb.start()
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        dead_letter_sink = ew.DeadLetterSink()
+        export_worker = ew.ExportWorker(influxdb_client=influxdb_client, data_client=None, filter_client=None, dead_letter_sink=dead_letter_sink)
+        return export_worker, fake_influxdb, influxdb_client, dead_letter_sink
+
+    def test_write_points_create_database(self):
+        export_worker, fake_influxdb, influxdb_client, _ = self._init_fake_influxdb_worker()
+        points = [f"export-1 val={num}i {num}".encode() for num in range(4)]
+        export_worker._write_points(points=points, db_name="db 1", time_precision=None)
+        export_worker._write_points(points=points, db_name="db 1", time_precision=None)
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.databases, {"db 1"})
+        self.assertEqual(fake_influxdb.written["db 1"], points + points)
+        self.assertEqual(fake_influxdb.requests, 3)
+
+    def test_write_points_field_type_conflict(self):
+        export_worker, fake_influxdb, influxdb_client, dead_letter_sink = self._init_fake_influxdb_worker()
+        fake_influxdb.databases.add("db_1")
+        export_worker._write_points(points=[b"export-7 val=1i"], db_name="db_1", time_precision=None)
+        points = [f"export-{num} val={num}i".encode() for num in range(16)]
+        points[7] = b"export-7 val=\"seven\""
+        export_worker._write_points(points=points, db_name="db_1", time_precision=None)
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(set(fake_influxdb.written["db_1"]), set(point for point in points if point != points[7]) | {b"export-7 val=1i"})
+        self.assertEqual(dead_letter_sink.counts, {"db_1": 1})
+
+    def test_write_points_too_large(self):
+        export_worker, fake_influxdb, influxdb_client, dead_letter_sink = self._init_fake_influxdb_worker(max_body_bytes=64)
+        fake_influxdb.databases.add("db_1")
+        points = [f"export-{num} val={num}i".encode() for num in range(8)] + [b"export-8 val=\"" + b"x" * 64 + b"\""]
+        export_worker._write_points(points=points, db_name="db_1", time_precision=None)
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(sorted(fake_influxdb.written["db_1"]), sorted(points[:8]))
+        self.assertEqual(dead_letter_sink.counts, {"db_1": 1})
+
+    def test_write_points_server_error(self):
+        export_worker, fake_influxdb, influxdb_client, _ = self._init_fake_influxdb_worker()
+        fake_influxdb.databases.add("db_1")
+        fake_influxdb.fail(code=503)
+        with self.assertRaises(ew.util.WritePointsError):
+            export_worker._write_points(points=[b"export-1 val=1i"], db_name="db_1", time_precision=None)
+        export_worker._write_points(points=[b"export-1 val=1i"], db_name="db_1", time_precision=None)
         influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.written["db_1"], [b"export-1 val=1i"])
 
-    def _test_run(self, filter_sync_err=False, msg_error=False):
-        export_worker, _, _, _ = self._init_export_worker(msg_error=msg_error)
+    def test_write_points_batch_spool(self):
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        fake_influxdb.databases.add("db_1")
+        fake_influxdb.fail(code=503)
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        spool_influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_spool = ew.WriteSpool(path=tmp_dir, min_backoff=0.01)
+            export_worker = ew.ExportWorker(influxdb_client=influxdb_client, data_client=None, filter_client=None, write_spool=write_spool, spool_influxdb_client=spool_influxdb_client)
+            export_worker._write_points_batch(points_batch={"db_1": {None: [b"export-1 val=1i 1"]}})
+            self.assertTrue(write_spool.pending)
+            export_worker._write_points_batch(points_batch={"db_1": {None: [b"export-1 val=2i 2"]}})
+            self.assertEqual(fake_influxdb.requests, 1)
+            write_spool.start(write=export_worker._drain_spool)
+            for _ in range(100):
+                if not write_spool.pending:
+                    break
+                time.sleep(0.05)
+            write_spool.close()
+        influxdb_client.close()
+        spool_influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.written["db_1"], [b"export-1 val=1i 1", b"export-1 val=2i 2"])
+
+    def test_drain_spool_rejected(self):
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        fake_influxdb.databases.add("db_1")
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        dead_letter_sink = ew.DeadLetterSink()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_spool = ew.WriteSpool(path=tmp_dir, min_backoff=0.01)
+            write_spool.put(lines=[b"export-1 val=1i 1"], db_name="db_1", time_precision=None)
+            write_spool.put(lines=[b"export-1 val=2i 2"], db_name="db_1", time_precision=None)
+            export_worker = ew.ExportWorker(influxdb_client=None, data_client=None, filter_client=None, dead_letter_sink=dead_letter_sink, write_spool=write_spool, spool_influxdb_client=influxdb_client)
+            fake_influxdb.fail(code=503)
+            fake_influxdb.fail(code=403)
+            write_spool.start(write=export_worker._drain_spool)
+            for _ in range(100):
+                if not write_spool.pending:
+                    break
+                time.sleep(0.05)
+            write_spool.close()
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.written["db_1"], [b"export-1 val=2i 2"])
+        self.assertEqual(dead_letter_sink.counts, {"db_1": 1})
+
+    def test_write_points_retry(self):
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        fake_influxdb.databases.update(("db_1", "db_2"))
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        retry_policies = ew.RetryPolicies(default=ew.RetryPolicy(retries=2, min_backoff=0.01), overrides={"db_2": {"retries": 0}})
+        export_worker = ew.ExportWorker(influxdb_client=influxdb_client, data_client=None, filter_client=None, retry_policies=retry_policies)
+        fake_influxdb.fail(code=503, count=2)
+        export_worker._write_points_batch(points_batch={"db_1": {None: [b"export-1 val=1i 1"]}})
+        fake_influxdb.fail(code=503)
+        with self.assertRaises(ew.util.WritePointsError):
+            export_worker._write_points_batch(points_batch={"db_2": {None: [b"export-2 val=1i 1"]}})
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.written, {"db_1": [b"export-1 val=1i 1"]})
+        self.assertEqual(fake_influxdb.requests, 4)
+
+    def test_is_transient(self):
+        for ex in (influxdb.exceptions.InfluxDBServerError("unavailable"), requests.exceptions.ConnectTimeout(), ConnectionRefusedError(), asyncio.TimeoutError(), asyncio.IncompleteReadError(b"", 10)):
+            self.assertTrue(ew.retry.is_transient(ex))
+        for ex in (influxdb.exceptions.InfluxDBClientError("bad request", 400), ValueError()):
+            self.assertFalse(ew.retry.is_transient(ex))
+
+    def test_write_points_circuit_breaker(self):
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        fake_influxdb.databases.update(("db_1", "db_2"))
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        circuit_breakers = ew.CircuitBreakers(failure_threshold=1, reset_timeout=0.2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            export_worker = ew.ExportWorker(influxdb_client=influxdb_client, data_client=None, filter_client=None, circuit_breakers=circuit_breakers, write_spool=ew.WriteSpool(path=tmp_dir), spool_influxdb_client=influxdb_client)
+            fake_influxdb.fail(code=503, db_name="db_2")
+            export_worker._write_points_batch(points_batch={"db_1": {None: [b"export-1 val=1i 1"]}, "db_2": {None: [b"export-2 val=1i 1"]}})
+            export_worker._write_points_batch(points_batch={"db_2": {"s": [b"export-2 val=2i 2"]}})
+            self.assertEqual(circuit_breakers.states, {"db_1": "closed", "db_2": "open"})
+            self.assertEqual(fake_influxdb.requests, 2)
+            time.sleep(0.2)
+            export_worker._write_points_batch(points_batch={"db_1": {None: [b"export-1 val=2i 2"]}})
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(circuit_breakers.states, {"db_1": "closed", "db_2": "closed"})
+        self.assertEqual(circuit_breakers.trips, {"db_2": 1})
+        self.assertEqual(fake_influxdb.written, {"db_1": [b"export-1 val=1i 1", b"export-1 val=2i 2"], "db_2": [b"export-2 val=1i 1", b"export-2 val=2i 2"]})
+
+    def test_circuit_breakers_require_write_spool(self):
+        with self.assertRaises(ValueError):
+            ew.ExportWorker(influxdb_client=None, data_client=None, filter_client=None, circuit_breakers=ew.CircuitBreakers())
+
+    def test_write_points_known_databases(self):
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        fake_influxdb.databases.add("db_1")
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        known_databases = ew.KnownDatabases(influxdb_client=influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1))
+        known_databases.load()
+        point_builders = ew.PointBuilders(known_databases=known_databases)
+        self.assertTrue(point_builders.validate_filter({"id": "export-2", "args": {"db_name": "db_2"}, "mappings": {"val:data": "val"}}))
+        export_worker = ew.ExportWorker(influxdb_client=influxdb_client, data_client=None, filter_client=None, known_databases=known_databases)
+        export_worker._write_points_batch(points_batch={"db_1": {None: [b"export-1 val=1i 1"]}, "db_2": {None: [b"export-2 val=1i 1"]}, "db_3": {None: [b"export-3 val=1i 1"]}})
+        fake_influxdb.databases.discard("db_3")
+        export_worker._write_points_batch(points_batch={"db_3": {None: [b"export-3 val=2i 2"]}})
+        known_databases.close()
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(fake_influxdb.requests, 5)
+        self.assertEqual([query for query in fake_influxdb.queries if query.startswith("CREATE")], ["CREATE DATABASE \"db_2\"", "CREATE DATABASE \"db_3\"", "CREATE DATABASE \"db_3\""])
+        self.assertEqual(fake_influxdb.written["db_3"], [b"export-3 val=1i 1", b"export-3 val=2i 2"])
+
+    def test_known_databases_try_ensure(self):
+        class FailingClient:
+            def __init__(self):
+                self.created = list()
+                self.event = threading.Event()
+
+            def create_database(self, dbname):
+                self.created.append(dbname)
+                self.event.wait()
+                raise influxdb.exceptions.InfluxDBServerError("unavailable")
+
+            def close(self):
+                pass
+
+        client = FailingClient()
+        known_databases = ew.KnownDatabases(influxdb_client=client, retry_interval=60)
+        known_databases.try_ensure(db_name="db_1")
+        known_databases.try_ensure(db_name="db_1")
+        client.event.set()
+        known_databases.close()
+        known_databases.try_ensure(db_name="db_1")
+        self.assertEqual(client.created, ["db_1"])
+        self.assertNotIn("db_1", known_databases)
+
+    def test_known_databases_ensure_concurrent(self):
+        class SlowClient:
+            def __init__(self):
+                self.created = list()
+                self.event = threading.Event()
+
+            def create_database(self, dbname):
+                self.created.append(dbname)
+                if dbname == "db_1":
+                    self.event.wait()
+
+        client = SlowClient()
+        known_databases = ew.KnownDatabases(influxdb_client=client)
+        threads = [threading.Thread(target=known_databases.ensure, kwargs={"db_name": "db_1"}) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while not client.created:
+            time.sleep(0.01)
+        known_databases.ensure(db_name="db_2")
+        self.assertIn("db_2", known_databases)
+        self.assertNotIn("db_1", known_databases)
+        client.event.set()
+        for thread in threads:
+            thread.join()
+        self.assertIn("db_1", known_databases)
+        self.assertEqual(sorted(client.created), ["db_1", "db_2"])
+
+    def test_write_points_batch_async_writer(self):
+        fake_influxdb = FakeInfluxDB()
+        fake_influxdb.start()
+        fake_influxdb.databases.add("db_1")
+        influxdb_client = influxdb.InfluxDBClient(host="localhost", port=fake_influxdb.port, retries=1)
+        async_writer = ew.AsyncWriter(host="localhost", port=fake_influxdb.port, max_in_flight=2)
+        dead_letter_sink = ew.DeadLetterSink()
+        export_worker = ew.ExportWorker(influxdb_client=influxdb_client, data_client=None, filter_client=None, max_request_points=4, dead_letter_sink=dead_letter_sink, async_writer=async_writer)
+        export_worker._write_points(points=[b"export-7 val=1i"], db_name="db_1", time_precision=None)
+        points = [f"export-{num} val={num}i".encode() for num in range(16)]
+        points[7] = b"export-7 val=\"seven\""
+        export_worker._write_points_batch(points_batch={"db_1": {None: points}, "db_2": {"s": points[:4]}})
+        fake_influxdb.fail(code=503)
+        with self.assertRaises(ew.util.WritePointsError):
+            export_worker._write_points_batch(points_batch={"db_1": {None: points[:1]}})
+        async_writer.close()
+        influxdb_client.close()
+        fake_influxdb.stop()
+        self.assertEqual(set(fake_influxdb.written["db_1"]), set(point for point in points if point != points[7]) | {b"export-7 val=1i"})
+        self.assertEqual(fake_influxdb.written["db_2"], points[:4])
+        self.assertEqual(fake_influxdb.databases, {"db_1", "db_2"})
+        self.assertEqual(dead_letter_sink.counts, {"db_1": 1})
+
+    def test_async_writer_timeout(self):
+        server = socket.socket()
+        server.bind(("localhost", 0))
+        server.listen(1)
+        async_writer = ew.AsyncWriter(host="localhost", port=server.getsockname()[1], timeout=0.1)
+        with self.assertRaises(asyncio.TimeoutError):
+            async_writer.run(async_writer.write_lines(lines=[b"export-1 val=1i"], database="db_1"))
+        async_writer.close()
+        server.close()
+
+    def _test_run(self, filter_sync_err=False, msg_error=False, pipeline_queue_size=0, partition_lanes=0):
+        export_worker, _, _, _ = self._init_export_worker(msg_error=msg_error, pipeline_queue_size=pipeline_queue_size, partition_lanes=partition_lanes)
         export_worker.set_filter_sync(err=filter_sync_err)
         export_worker.run()
         self.assertFalse(export_worker.is_alive())
@@ -109,6 +467,16 @@ class TestInfluxDBWorker(unittest.TestCase):
     def test_run_filter_sync_err(self):
         self._test_run(filter_sync_err=True)
 
+    def test_run_pipeline_message_exception(self):
+        self._test_run(msg_error=True, pipeline_queue_size=2)
+
+    def test_run_partition_lanes_message_exception(self):
+        self._test_run(msg_error=True, partition_lanes=2)
+
+    def test_window_aggregation_requires_offset_tracker(self):
+        with self.assertRaises(ValueError):
+            ew.ExportWorker(influxdb_client=None, data_client=None, filter_client=None, window_aggregation=True)
+
 
 if __name__ == '__main__':
     unittest.main()
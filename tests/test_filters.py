@@ -0,0 +1,49 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+
+from ._util import *
+import unittest
+import ew.filters
+import ew.builder
+import json
+
+
+class MockFilterConsumer:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def consume(self, num_messages=1, timeout=None):
+        msgs = self.messages[:num_messages]
+        del self.messages[:num_messages]
+        return msgs
+
+
+def gen_filter_msg(offset, method, export_id):
+    return MockKafkaMessage(value=json.dumps({"method": method, "payload": {"id": export_id}}).encode(), topic="filters", offset=offset)
+
+
+class TestFilterDeleteHook(unittest.TestCase):
+    def test_delete(self):
+        point_builders = ew.builder.PointBuilders()
+        for export_id in ("1", "2", "3"):
+            point_builders.put(export_id=export_id, export_args={"db_name": "db_1"})
+        tombstone = MockKafkaMessage(value=None, topic="filters", offset=2, key=b"3")
+        hook = ew.filters.FilterDeleteHook(kafka_consumer=MockFilterConsumer([gen_filter_msg(0, "put", "1"), gen_filter_msg(1, "delete", "2"), tombstone]), on_delete=point_builders.delete)
+        self.assertEqual(len(hook.consume(num_messages=10)), 3)
+        self.assertIsNotNone(point_builders.get("1"))
+        self.assertIsNone(point_builders.get("2"))
+        self.assertIsNone(point_builders.get("3"))
@@ -0,0 +1,87 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import influxdb.line_protocol
+import ew.util
+
+
+class TestLineProtocol(unittest.TestCase):
+    def test_escape(self):
+        self.assertEqual(ew.util.escape_key("a b,c=d\\"), "a\\ b\\,c\\=d\\\\")
+        self.assertEqual(ew.util.escape_tag_value("a\\"), "a\\\\")
+        self.assertEqual(ew.util.escape_tag_value(True), "True")
+
+    def test_encode_field_value(self):
+        self.assertEqual(ew.util.encode_field_value(1), "1i")
+        self.assertEqual(ew.util.encode_field_value(1.5), "1.5")
+        self.assertEqual(ew.util.encode_field_value(False), "False")
+        self.assertEqual(ew.util.encode_field_value("a \"b\""), "\"a \\\"b\\\"\"")
+        self.assertIsNone(ew.util.encode_field_value(None))
+
+    def test_convert_time(self):
+        self.assertEqual(ew.util.convert_time(time="2022-02-09T10:01:01.781Z", precision=None), 1644400861781000000)
+        self.assertEqual(ew.util.convert_time(time="2022-02-09T11:01:01.781+01:00", precision="ms"), 1644400861781)
+        self.assertEqual(ew.util.convert_time(time="Wed, 09 Feb 2022 10:01:01 GMT", precision="s"), 1644400861)
+        self.assertEqual(ew.util.convert_time(time=1644400861, precision="s"), 1644400861)
+        with self.assertRaises(ValueError):
+            ew.util.convert_time(time=1644400861.0, precision="s")
+
+    def test_batch_point_builder(self):
+        args = dict(export_id="export 1", cast_map={"val_b": ":integer", "id_c": ":number"}, time_key="time", time_precision="s")
+        rows = [
+            ({"val_b": "1", "val_a": None, "val_c": 2.0}, {"time": "2022-02-09T10:01:01Z", "id_b": "b,1", "id_a": ""}),
+            ({"val_b": "x"}, {"time": "2022-02-09T10:01:01Z"}),
+            ({"val_a": True}, {"time": "2022-02-09T10:01:02Z", "id_c": "1"}),
+            ({"val_a": "a"}, {"time": "x"}),
+            (dict(), {"time": 1644400863})
+        ]
+        points = ew.util.compile_batch_point_builder(**args)(rows)
+        self.assertEqual(len(points), len(rows))
+        self.assertEqual(points[0], b"export\\ 1,id_b=b\\,1 val_b=1i,val_c=2.0 1644400861")
+        self.assertIsInstance(points[1], ValueError)
+        self.assertEqual(points[2], b"export\\ 1,id_c=1.0 val_a=True 1644400862")
+        self.assertIsInstance(points[3], ValueError)
+        self.assertEqual(points[4], b"export\\ 1  1644400863")
+
+    def test_make_line_compat(self):
+        export_data = {"val a": "x \"y\"\\", "val_b": 1, "val_c": 1.5, "val_d": True, "val,e": "a\nb"}
+        for export_extra in ({"id": "a\\"}, {"id": "a b,c=d"}, {"id": "a\nb", "id=2": 1}, {"id": True, "id_2": 2.5}, {"id": ""}):
+            self.assertEqual(
+                ew.util.compile_batch_point_builder(export_id="export 1")([(export_data, export_extra)])[0],
+                influxdb.line_protocol.make_line(measurement="export 1", tags=export_extra, fields=export_data).encode()
+            )
+
+    def test_get_measurement(self):
+        self.assertEqual(ew.util.get_measurement(b"export\\ 1\\,a,id=1 val=1i"), "export\\ 1\\,a")
+        self.assertEqual(ew.util.get_measurement(b"export-1 val=1i"), "export-1")
+
+    def test_chunk_lines(self):
+        lines = [b"a v=1i", b"a v=10i", b"b v=100i", b"b v=1000i"]
+        self.assertEqual(list(ew.util.chunk_lines(lines=lines)), [lines])
+        self.assertEqual(list(ew.util.chunk_lines(lines=lines, max_lines=3)), [lines[:3], lines[3:]])
+        self.assertEqual(list(ew.util.chunk_lines(lines=lines, max_bytes=16)), [lines[:2], lines[2:3], lines[3:]])
+        self.assertEqual(list(ew.util.chunk_lines(lines=lines, max_bytes=1)), [[line] for line in lines])
+
+    def test_join_lines(self):
+        lines = [f"a v={num}i".encode() for num in range(10)]
+        for chunk_size in (1, 3, 10, 1024):
+            self.assertEqual(ew.util.join_lines(lines=lines, chunk_size=chunk_size), b"\n".join(lines) + b"\n")
+        self.assertEqual(ew.util.join_lines(lines=[]), b"")
+
+
+if __name__ == '__main__':
+    unittest.main()
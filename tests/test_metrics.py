@@ -0,0 +1,68 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import urllib.request
+import ew.metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_expose(self):
+        metrics = ew.metrics.Metrics()
+        counter = metrics.add(ew.metrics.Counter("test_total", "Test counter.", ("db_name", )))
+        histogram = metrics.add(ew.metrics.Histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0)))
+        gauge = metrics.add(ew.metrics.Gauge("test_lag", "Test gauge.", ("topic", ), callback=lambda: {("t\"1", ): 5}))
+        counter.inc(labels=("db_1", ))
+        counter.inc_many({("db_1", ): 2, ("db_2", ): 1})
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        text = metrics.expose()
+        self.assertIn("# TYPE test_total counter", text)
+        self.assertIn("test_total{db_name=\"db_1\"} 3", text)
+        self.assertIn("test_total{db_name=\"db_2\"} 1", text)
+        self.assertIn("test_seconds_bucket{le=\"0.1\"} 1", text)
+        self.assertIn("test_seconds_bucket{le=\"1.0\"} 2", text)
+        self.assertIn("test_seconds_bucket{le=\"+Inf\"} 3", text)
+        self.assertIn("test_seconds_count 3", text)
+        self.assertIn("test_lag{topic=\"t\\\"1\"} 5", text)
+
+    def test_server(self):
+        metrics = ew.metrics.ExportMetrics()
+        metrics.points.inc(labels=("db_1", ))
+        metrics.start(port=0, host="localhost")
+        try:
+            port = metrics._Metrics__server.server_address[1]
+            with urllib.request.urlopen(f"http://localhost:{port}/metrics") as resp:
+                self.assertIn("ew_points_generated_total{db_name=\"db_1\"} 1", resp.read().decode())
+        finally:
+            metrics.stop()
+
+    def test_route(self):
+        metrics = ew.metrics.Metrics()
+        metrics.add_route("/profile", lambda query: (202, query["seconds"][0].encode()))
+        metrics.start(port=0, host="localhost")
+        try:
+            port = metrics._Metrics__server.server_address[1]
+            with urllib.request.urlopen(f"http://localhost:{port}/profile?seconds=5") as resp:
+                self.assertEqual(resp.status, 202)
+                self.assertEqual(resp.read(), b"5")
+        finally:
+            metrics.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import tempfile
+import threading
+import time
+import os
+import ew.profiling
+import ew.metrics
+import ew.util
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stage_timer(self):
+        metrics = ew.metrics.Metrics()
+        profiler = ew.profiling.Profiler(sample_rate=1.0, metrics=metrics)
+        timer = profiler.start("gen")
+        build_points = ew.util.compile_batch_point_builder(export_id="export-1", time_key="time")
+        points = build_points([({"val": 1}, {"time": "2022-02-09T10:01:01.781Z"})], timer)
+        profiler.stop(timer)
+        self.assertEqual(points, [b"export-1 val=1i 1644400861781000000"])
+        self.assertEqual(set(timer.steps), {"encode", "timestamps", "lines"})
+        self.assertGreaterEqual(timer.total, sum(timer.steps.values()))
+        text = metrics.expose()
+        self.assertIn("ew_stage_seconds_count{stage=\"gen\",step=\"total\"} 1", text)
+        self.assertIn("ew_stage_seconds_count{stage=\"gen\",step=\"timestamps\"} 1", text)
+
+    def test_not_sampled(self):
+        profiler = ew.profiling.Profiler(sample_rate=0.0)
+        self.assertIsNone(profiler.start("gen"))
+        profiler.stop(None)
+
+    def test_dump(self):
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=busy_loop, name="busy-loop")
+        thread.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = ew.profiling.Profiler(dump_path=tmp_dir, dump_interval=0.005)
+            code, body = profiler.handle_request({"seconds": ["0.1"]})
+            self.assertEqual(code, 202)
+            self.assertEqual(profiler.handle_request({})[0], 409)
+            profiler.join()
+            stop.set()
+            thread.join()
+            path = body.decode().strip()
+            self.assertEqual(os.path.dirname(path), tmp_dir)
+            with open(path) as file:
+                lines = file.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any(line.startswith("busy-loop;") and "test_profiling.py:busy_loop" in line for line in lines))
+        for line in lines:
+            self.assertTrue(line.rsplit(" ", 1)[1].isdigit())
+        self.assertEqual(ew.profiling.Profiler().handle_request({"seconds": ["x"]})[0], 400)
+        self.assertEqual(ew.profiling.Profiler().handle_request({"seconds": ["nan"]})[0], 400)
+        self.assertEqual(ew.profiling.Profiler().handle_request({"seconds": ["-1"]})[0], 400)
+
+    def test_dump_max_seconds(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = ew.profiling.Profiler(dump_path=tmp_dir, dump_interval=0.005, max_dump_seconds=0.05)
+            start = time.monotonic()
+            self.assertEqual(profiler.handle_request({"seconds": ["3600"]})[0], 202)
+            profiler.join()
+            self.assertLess(time.monotonic() - start, 5)
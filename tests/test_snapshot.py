@@ -0,0 +1,80 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from ._util import *
+import unittest
+import tempfile
+import ew.snapshot
+import os
+
+
+class MockFilterConsumer:
+    def __init__(self, messages):
+        self.messages = messages
+        self.assigned = None
+        self.closed = False
+
+    def subscribe(self, topics, on_assign=None):
+        self.on_assign = on_assign
+
+    def assign(self, partitions):
+        self.assigned = [(tp.topic, tp.partition, tp.offset) for tp in partitions]
+
+    def consume(self, num_messages=1, timeout=None):
+        msgs = self.messages[:num_messages]
+        del self.messages[:num_messages]
+        return msgs
+
+    def close(self):
+        self.closed = True
+
+
+def gen_filter_msg(offset, method, export_id):
+    return MockKafkaMessage(value=json.dumps({"method": method, "payload": {"id": export_id}}).encode(), topic="filters", offset=offset)
+
+
+class TestFilterSnapshot(unittest.TestCase):
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "snapshot.json")
+            consumer = MockFilterConsumer([gen_filter_msg(0, "put", "1"), gen_filter_msg(1, "put", "2"), gen_filter_msg(2, "put", "1"), gen_filter_msg(3, "delete", "2")])
+            snapshot = ew.snapshot.FilterSnapshot(kafka_consumer=consumer, path=path)
+            snapshot.subscribe(["filters"])
+            self.assertIsNone(consumer.on_assign)
+            self.assertEqual(len(snapshot.consume(num_messages=10)), 4)
+            snapshot.close()
+            self.assertTrue(consumer.closed)
+            consumer = MockFilterConsumer([gen_filter_msg(4, "put", "3")])
+            snapshot = ew.snapshot.FilterSnapshot(kafka_consumer=consumer, path=path)
+            snapshot.subscribe(["filters"])
+            consumer.on_assign(consumer, [confluent_kafka.TopicPartition(topic="filters", partition=0), confluent_kafka.TopicPartition(topic="filters", partition=1)])
+            self.assertEqual(consumer.assigned, [("filters", 0, 4), ("filters", 1, confluent_kafka.OFFSET_BEGINNING)])
+            msgs = snapshot.consume(num_messages=10)
+            self.assertEqual([(msg.offset(), json.loads(msg.value())["method"]) for msg in msgs], [(2, "put")])
+            self.assertEqual([msg.offset() for msg in snapshot.consume(num_messages=10)], [4])
+
+    def test_snapshot_other_topic(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "snapshot.json")
+            snapshot = ew.snapshot.FilterSnapshot(kafka_consumer=MockFilterConsumer([gen_filter_msg(0, "put", "1")]), path=path)
+            snapshot.subscribe(["filters"])
+            snapshot.consume()
+            snapshot.close()
+            consumer = MockFilterConsumer([])
+            snapshot = ew.snapshot.FilterSnapshot(kafka_consumer=consumer, path=path)
+            snapshot.subscribe(["other"])
+            self.assertIsNone(consumer.on_assign)
+            self.assertEqual(snapshot.consume(num_messages=10), [])
@@ -0,0 +1,83 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from ._util import *
+import unittest
+import tempfile
+import ew
+import os
+
+
+class TestWriteSpool(unittest.TestCase):
+    def test_put_drain(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_spool = ew.WriteSpool(path=tmp_dir, segment_bytes=150, min_backoff=0.01, max_backoff=0.02)
+            self.assertFalse(write_spool.pending)
+            for num in range(4):
+                write_spool.put(lines=[f"export-{num} val={num}i".encode(), b"export-x val=1i"], db_name=f"db_{num % 2}", time_precision="s" if num % 2 else None)
+            self.assertTrue(write_spool.pending)
+            self.assertEqual(len(os.listdir(tmp_dir)), 2)
+            write_spool.close()
+            write_spool = ew.WriteSpool(path=tmp_dir, min_backoff=0.01, max_backoff=0.02)
+            self.assertTrue(write_spool.pending)
+            written = list()
+            failures = [2]
+
+            def write(lines, db_name, time_precision):
+                if failures[0]:
+                    failures[0] -= 1
+                    raise RuntimeError("unavailable")
+                written.append((lines, db_name, time_precision))
+
+            write_spool.start(write=write)
+            for _ in range(100):
+                if not write_spool.pending:
+                    break
+                time.sleep(0.05)
+            write_spool.close()
+            self.assertFalse(write_spool.pending)
+            self.assertEqual(write_spool.size, 0)
+            self.assertEqual(os.listdir(tmp_dir), [])
+            self.assertEqual(written, [([f"export-{num} val={num}i".encode(), b"export-x val=1i"], f"db_{num % 2}", "s" if num % 2 else None) for num in range(4)])
+
+    def test_full(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_spool = ew.WriteSpool(path=tmp_dir, max_bytes=100)
+            write_spool.put(lines=[b"export-1 val=1i"], db_name="db_1", time_precision=None)
+            with self.assertRaises(ew.SpoolFullError):
+                write_spool.put(lines=[b"export-1 val=1i"] * 10, db_name="db_1", time_precision=None)
+            write_spool.close()
+
+    def test_corrupt_segment(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_spool = ew.WriteSpool(path=tmp_dir)
+            write_spool.put(lines=[b"export-1 val=1i"], db_name="db_1", time_precision=None)
+            write_spool.put(lines=[b"export-2 val=2i"], db_name="db_1", time_precision=None)
+            write_spool.close()
+            path = os.path.join(tmp_dir, os.listdir(tmp_dir)[0])
+            with open(path, "r+b") as file:
+                file.seek(-2, os.SEEK_END)
+                file.write(b"xx")
+            written = list()
+            write_spool = ew.WriteSpool(path=tmp_dir)
+            write_spool.start(write=lambda lines, db_name, time_precision: written.append(lines))
+            for _ in range(100):
+                if not write_spool.pending:
+                    break
+                time.sleep(0.05)
+            write_spool.close()
+            self.assertEqual(written, [[b"export-1 val=1i"]])
+            self.assertFalse(write_spool.pending)
@@ -0,0 +1,50 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import util
+import sys
+import time
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_lazy_import(self):
+        sys.modules.pop("wave", None)
+        wave = util.lazy_import("wave")
+        self.assertNotIn("wave", sys.modules)
+        self.assertTrue(issubclass(wave.Error, Exception))
+        self.assertIn("wave", sys.modules)
+
+    def test_lazy_import_submodule(self):
+        xml = util.lazy_import("xml")
+        self.assertEqual(xml.dom.Node.ELEMENT_NODE, 1)
+
+    def test_preload(self):
+        sys.modules.pop("wave", None)
+        util.preload("wave", "missing_module_name").join()
+        self.assertIn("wave", sys.modules)
+
+
+class TestStartupProfile(unittest.TestCase):
+    def test_phases(self):
+        startup_profile = util.StartupProfile()
+        time.sleep(0.01)
+        startup_profile.mark("imports")
+        startup_profile.mark("config")
+        phases = startup_profile.phases
+        self.assertEqual([phase for phase, _ in phases], ["imports", "config"])
+        self.assertGreaterEqual(phases[0][1], 0.01)
+        self.assertAlmostEqual(startup_profile.total, sum(seconds for _, seconds in phases))
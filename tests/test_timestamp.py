@@ -0,0 +1,55 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import datetime
+import ew.util
+
+
+class TestTimestampParser(unittest.TestCase):
+    def _test_parser(self, fmt, timestamps):
+        parser = ew.util.get_timestamp_parser(fmt)
+        self.assertIs(parser, ew.util.get_timestamp_parser(fmt))
+        for timestamp in timestamps:
+            try:
+                expected = datetime.datetime.strptime(timestamp, fmt)
+            except ValueError:
+                with self.assertRaises(ValueError):
+                    parser(timestamp)
+                continue
+            time_obj = parser(timestamp)
+            self.assertEqual(time_obj.replace(tzinfo=time_obj.tzinfo or datetime.timezone.utc), expected.replace(tzinfo=expected.tzinfo or datetime.timezone.utc))
+
+    def test_iso_format(self):
+        self._test_parser("%Y-%m-%dT%H:%M:%S.%fZ", ("2022-02-09T10:01:01.781Z", "2022-02-09T10:01:01.781+01:00", "2022-02-09"))
+        self._test_parser("%Y-%m-%dT%H:%M:%S%z", ("2022-02-09T10:01:01+01:00", "2022-02-09T10:01:01Z", "2022-02-09T10:01:01", "2022-02-09T10:01:01+01"))
+        self._test_parser("%Y-%m-%dT%H:%M:%S", ("2022-02-09T10:01:01", "2022-02-09", "2022-02-09T10:01:01.5", "2022-02-09 10:01:01", "2022-2-9T10:01:01"))
+        self._test_parser("%Y-%m-%dT%H:%M:%S.%fZ", ("2022-02-09T10:01:01Z", "2022-02-09T10:01:01.1234567Z"))
+        self._test_parser("%Y-%m-%d %H:%M:%S.%f", ("2022-02-09 10:01:01.5", "2022-02-09T10:01:01.5", "2022-02-09 10:01:01"))
+
+    def test_regex_format(self):
+        self._test_parser("%A, %d-%b-%y %H:%M:%S UTC", ("Monday, 07-Mar-22 14:22:07 UTC", "monday,  07-MAR-70 14:22:07 utc", "Monday, 07-Mar-22 14:22:07"))
+        self._test_parser("%d.%m.%Y %H:%M:%S.%f %z", ("07.03.2022 14:22:07.5 -0130", "31.02.2022 14:22:07.5 +0000", "7.3.2022 4:2:7.123456 Z"))
+
+    def test_strptime_format(self):
+        self._test_parser("%I:%M %p", ("02:22 PM", "14:22 PM"))
+
+    def test_convert_timestamp(self):
+        self.assertEqual(ew.util.convert_timestamp(timestamp="Monday, 07-Mar-22 14:22:07 UTC", fmt="%A, %d-%b-%y %H:%M:%S UTC", precision="s"), 1646662927)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,8 @@
 
 from .config import *
 from .logger import *
+from .lazy import *
+from .startup import *
 import math
 
 
@@ -41,6 +41,8 @@ class KafkaFilterClientConfig(sevm.Config):
     sync_delay = 30
     time_format = None
     utc = True
+    snapshot_path = None
+    snapshot_interval = 60
 
 
 class InfluxDBConfig(sevm.Config):
@@ -50,6 +52,88 @@ class InfluxDBConfig(sevm.Config):
     password = None
     retries = 3
     timeout = 10
+    writers = 1
+    gzip_level = 0
+    max_request_bytes = 0
+    max_request_points = 0
+    cache_databases = False
+    async_writer = False
+    max_in_flight = 16
+
+
+class AdaptiveBatchConfig(sevm.Config):
+    enabled = False
+    min_limit = 100
+    max_limit = 50000
+    min_timeout = 0.1
+    max_timeout = 5.0
+    target_latency = 5.0
+
+
+class WriteBufferConfig(sevm.Config):
+    enabled = False
+    max_points = 5000
+    max_bytes = 0
+    max_linger = 1.0
+
+
+class SpoolConfig(sevm.Config):
+    path = None
+    max_bytes = 1073741824
+    segment_bytes = 67108864
+    min_backoff = 1.0
+    max_backoff = 60.0
+
+
+class WriteRetryConfig(sevm.Config):
+    max_retries = 0
+    min_backoff = 0.5
+    max_backoff = 10.0
+    overrides = None
+
+
+class CircuitBreakerConfig(sevm.Config):
+    enabled = False
+    failure_threshold = 5
+    reset_timeout = 30.0
+    max_parked_points = 100000
+
+
+class DeadLetterConfig(sevm.Config):
+    path = None
+    topic = None
+
+
+class MetricsConfig(sevm.Config):
+    enabled = False
+    port = 9100
+    export_labels = False
+
+
+class ProfilerConfig(sevm.Config):
+    enabled = False
+    sample_rate = 0.01
+    dump_path = "/tmp"
+    dump_seconds = 30
+    dump_interval = 0.01
+    max_dump_seconds = 300
+
+
+class PipelineConfig(sevm.Config):
+    enabled = False
+    queue_size = 2
+    partition_lanes = 0
+
+
+class TagCacheConfig(sevm.Config):
+    enabled = False
+    max_size = 100000
+
+
+class AggregationConfig(sevm.Config):
+    enabled = False
+    retention = 600.0
+    state_path = None
 
 
 class WatchdogConfig(sevm.Config):
@@ -59,12 +143,25 @@ class WatchdogConfig(sevm.Config):
 
 class Config(sevm.Config):
     logger_level = "warning"
+    processes = 1
+    startup_profile = False
     get_data_timeout = 5.0
     get_data_limit = 1000
+    adaptive_batch = AdaptiveBatchConfig
     kafka = KafkaConfig
     kafka_data_client = KafkaDataClientConfig
     kafka_data_consumer = KafkaDataConsumerConfig
     kafka_filter_client = KafkaFilterClientConfig
     kafka_filter_consumer_group_id = None
     influxdb = InfluxDBConfig
+    pipeline = PipelineConfig
+    tag_cache = TagCacheConfig
+    aggregation = AggregationConfig
+    write_buffer = WriteBufferConfig
+    spool = SpoolConfig
+    write_retry = WriteRetryConfig
+    circuit_breaker = CircuitBreakerConfig
+    dead_letter = DeadLetterConfig
+    metrics = MetricsConfig
+    profiler = ProfilerConfig
     watchdog = WatchdogConfig
@@ -0,0 +1,60 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("lazy_import", "preload")
+
+from .logger import logger
+import importlib
+import threading
+import typing
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self.__name = name
+        self.__module = None
+
+    def __load(self):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return self.__module
+
+    def __getattr__(self, item):
+        module = self.__load()
+        try:
+            return getattr(module, item)
+        except AttributeError:
+            return importlib.import_module(f"{self.__name}.{item}")
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name}'>"
+
+
+def lazy_import(name: str) -> typing.Any:
+    return LazyModule(name)
+
+
+def preload(*names: str) -> threading.Thread:
+    def load():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except Exception as ex:
+                logger.warning(f"preloading '{name}' failed: reason={ex}")
+
+    thread = threading.Thread(target=load, name="preload", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,57 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("StartupProfile", )
+
+import threading
+import typing
+import time
+
+
+class StartupProfile:
+    __log_msg_prefix = "startup profile"
+
+    def __init__(self, start: typing.Optional[float] = None, name: typing.Optional[str] = None):
+        self.__start = time.perf_counter() if start is None else start
+        self.__last = self.__start
+        self.__name = name
+        self.__phases: typing.List[typing.Tuple[str, float]] = list()
+        self.__reported = False
+        self.__lock = threading.Lock()
+
+    def mark(self, phase: str):
+        with self.__lock:
+            now = time.perf_counter()
+            self.__phases.append((phase, now - self.__last))
+            self.__last = now
+
+    @property
+    def phases(self) -> typing.List[typing.Tuple[str, float]]:
+        with self.__lock:
+            return list(self.__phases)
+
+    @property
+    def total(self) -> float:
+        with self.__lock:
+            return self.__last - self.__start
+
+    def report(self):
+        with self.__lock:
+            if self.__reported:
+                return
+            self.__reported = True
+        prefix = f"{StartupProfile.__log_msg_prefix} ({self.__name})" if self.__name else StartupProfile.__log_msg_prefix
+        print(f"{prefix}: " + " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in self.phases) + f" total={self.total:.3f}s")